@@ -0,0 +1,64 @@
+"""Dedup ratio and chunking throughput: fixed-size vs content-defined chunking.
+
+Builds a versioned dataset (each version is the previous one with a few
+random inserts and deletes) and chunks every version with both modes.
+
+    python benchmarks/bench_chunking.py --mb 8 --versions 5
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.chunker import Chunker
+from node.utils import generate_cid
+
+
+def make_versions(size, count, edits, seed=1):
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(size))
+    versions = [bytes(data)]
+    for _ in range(count - 1):
+        for _ in range(edits):
+            pos = rng.randrange(len(data))
+            if rng.random() < 0.5:
+                data[pos:pos] = rng.randbytes(rng.randint(1, 512))
+            else:
+                del data[pos:pos + rng.randint(1, 512)]
+        versions.append(bytes(data))
+    return versions
+
+
+def run(label, chunker, versions):
+    unique = {}
+    total = 0
+    start = time.perf_counter()
+    for data in versions:
+        for chunk in chunker.iter_chunks(io.BytesIO(data)):
+            unique[generate_cid(chunk)] = len(chunk)
+            total += len(chunk)
+    elapsed = time.perf_counter() - start
+    stored = sum(unique.values())
+    print(f"{label:<8} dedup ratio: {total / stored:5.2f}x   stored: {stored / 2**20:7.1f} MiB   "
+          f"throughput: {total / 2**20 / elapsed:7.1f} MB/s   chunks: {len(unique)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=int, default=8, help='Size of the first version')
+    parser.add_argument('--versions', type=int, default=5)
+    parser.add_argument('--edits', type=int, default=3, help='Random edits per version')
+    parser.add_argument('--chunk-size', type=int, default=262144)
+    args = parser.parse_args()
+
+    versions = make_versions(args.mb * 2**20, args.versions, args.edits)
+    run('fixed', Chunker(args.chunk_size), versions)
+    run('cdc', Chunker(args.chunk_size, mode='cdc'), versions)
+
+
+if __name__ == '__main__':
+    main()
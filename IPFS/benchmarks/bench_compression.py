@@ -0,0 +1,119 @@
+"""Blockstore compression: ratio, ingest and egress throughput, and CPU cost.
+
+Builds a mixed corpus of --mb MiB (log lines, JSON documents and random
+bytes standing in for media, in the --mix proportions), then for each
+compression setting uploads it into a fresh blockstore through
+Storage.open_upload and reads it back with Storage.retrieve_file. The chunk
+cache is off so egress reads (and inflates) every block from disk. Ratio is
+the on-disk size of the blocks over the raw size; CPU is process time per
+GiB, so it counts hashing and compression on every thread.
+
+    python benchmarks/bench_compression.py --mb 256 --levels 1 6
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.storage import Storage
+
+
+def make_corpus(size, mix, seed=1):
+    """size bytes of logs, JSON and random data, interleaved in 4 MiB runs"""
+    rng = random.Random(seed)
+    paths = ['/api/files', '/api/chunks', '/api/peers', '/dashboard', '/api/ping']
+
+    def logs(n):
+        lines = []
+        while n > 0:
+            line = (f"2025-06-{rng.randint(1, 30):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d} "
+                    f"INFO 10.0.{rng.randint(0, 9)}.{rng.randint(1, 254)} GET {rng.choice(paths)} "
+                    f"{rng.choice([200, 200, 200, 206, 304, 404])} {rng.randint(1, 900)}ms\n")
+            lines.append(line)
+            n -= len(line)
+        return ''.join(lines).encode()
+
+    def documents(n):
+        docs = []
+        while n > 0:
+            doc = json.dumps({'id': rng.getrandbits(48), 'owner': f"user{rng.randint(1, 500)}",
+                              'tags': rng.sample(['report', 'draft', 'public', 'shared', 'q3'], 2),
+                              'size': rng.randint(1, 10**7), 'public': rng.random() < 0.5})
+            docs.append(doc)
+            n -= len(doc) + 1
+        return '\n'.join(docs).encode()
+
+    def media(n):
+        return rng.randbytes(n)
+
+    kinds = [logs, documents, media]
+    run = 4 * 2**20
+    parts = []
+    for offset in range(0, size, run):
+        kind = rng.choices(kinds, weights=mix)[0]
+        parts.append(kind(run)[:min(run, size - offset)])
+    return b''.join(parts)
+
+
+def disk_usage(path):
+    return sum(entry.stat().st_size for shard in os.scandir(path) if shard.is_dir()
+               for entry in os.scandir(shard.path))
+
+
+def run(data, codec, level, args):
+    storage = Storage({
+        'storage_path': tempfile.mkdtemp(prefix='dshare-compress-'),
+        'chunk_size': args.chunk_size,
+        'chunking': {'hash_workers': args.workers},
+        'cache': {'policy': 'none'},
+        'compression': {'codec': codec, 'level': level},
+    })
+    view = memoryview(data)
+    with contextlib.redirect_stdout(io.StringIO()):
+        wall, cpu = time.perf_counter(), time.process_time()
+        upload = storage.open_upload('corpus.bin')
+        for offset in range(0, len(data), 1 << 20):
+            upload.write(view[offset:offset + (1 << 20)])
+        cid = upload.finish()
+        ingest = time.perf_counter() - wall, time.process_time() - cpu
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        read = sum(len(block) for block in storage.retrieve_file(cid)[0])
+        egress = time.perf_counter() - wall, time.process_time() - cpu
+    assert read == len(data)
+    if storage.chunker.hash_pool:
+        storage.chunker.hash_pool.shutdown()
+    return disk_usage(storage.blocks_path) / len(data), ingest, egress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=int, default=256)
+    parser.add_argument('--mix', type=float, nargs=3, default=[0.4, 0.2, 0.4],
+                        metavar=('LOGS', 'JSON', 'MEDIA'))
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 6])
+    parser.add_argument('--chunk-size', type=int, default=262144)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    data = make_corpus(args.mb * 2**20, args.mix)
+    gib = len(data) / 2**30
+    print(f"{args.mb} MiB corpus (logs/json/media {args.mix[0]:g}/{args.mix[1]:g}/{args.mix[2]:g}), "
+          f"{args.chunk_size // 1024} KiB chunks")
+    print(f"{'codec':<10}{'ratio':>8}{'ingest MB/s':>13}{'CPU s/GB':>10}{'egress MB/s':>13}{'CPU s/GB':>10}")
+    for codec, level in [('none', 0)] + [('zlib', level) for level in args.levels]:
+        ratio, (in_wall, in_cpu), (out_wall, out_cpu) = run(data, codec, level, args)
+        label = codec if codec == 'none' else f"{codec}-{level}"
+        print(f"{label:<10}{ratio:>8.3f}{len(data) / 2**20 / in_wall:>13.0f}{in_cpu / gib:>10.2f}"
+              f"{len(data) / 2**20 / out_wall:>13.0f}{out_cpu / gib:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Local multi-node DHT harness: provider lookup hops and latency vs asking every peer.
+
+Starts N full nodes in-process on localhost. Each node only knows a few random
+peers, files are announced from random nodes, and lookups are run from other
+random nodes.
+
+    python benchmarks/bench_dht.py --nodes 32 --files 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.api import API
+from node.network import Network
+from node.storage import Storage
+from node.utils import generate_cid
+
+
+def start_node(port, k):
+    config = {
+        'host': '0.0.0.0',
+        'port': port,
+        'storage_path': tempfile.mkdtemp(prefix='dshare-dht-'),
+        'chunk_size': 262144,
+        'peer_timeout': 3600,
+        'dht': {'k': k},
+    }
+    network = Network(config)
+    network.api_url = f"http://127.0.0.1:{port}"
+    storage = Storage(config, network)
+    api = API(config, storage, network)
+    server = make_server('127.0.0.1', port, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return network
+
+
+def link(network, other):
+    network.peers.upsert(other.api_url, id=other.node_id, name=other.node_name, last_seen=time.time())
+
+
+def legacy_lookup(network, peers, cid):
+    # The pre-DHT find_file_location: one /exists request per peer, in turn
+    found = []
+    for peer in peers:
+        try:
+            response = requests.get(f"{peer.api_url}/api/files/{cid}/exists", timeout=2)
+            if response.json().get('exists'):
+                found.append(peer.api_url)
+        except Exception:
+            continue
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=32)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--degree', type=int, default=3, help='Initial peers known by each node')
+    parser.add_argument('--k', type=int, default=20, help='Bucket size / replication of provider records')
+    parser.add_argument('--base-port', type=int, default=7100)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with contextlib.redirect_stdout(io.StringIO()):
+        nodes = [start_node(args.base_port + i, args.k) for i in range(args.nodes)]
+    for node in nodes:
+        for other in rng.sample([n for n in nodes if n is not node], args.degree):
+            link(node, other)
+            link(other, node)
+
+    # Let every node find its place in the keyspace
+    for node in nodes:
+        node.dht.lookup(generate_cid(node.node_id))
+
+    cids = [generate_cid(f"bench-file-{i}") for i in range(args.files)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for cid in cids:
+            rng.choice(nodes).dht.provide(cid)
+
+    hops, dht_latency, found = [], [], 0
+    for cid in cids:
+        node = rng.choice(nodes)
+        start = time.perf_counter()
+        _, providers, hop_count = node.dht.lookup(cid, find_providers=True)
+        dht_latency.append(time.perf_counter() - start)
+        hops.append(hop_count)
+        found += bool(providers)
+
+    legacy_latency = []
+    for cid in cids[:5]:
+        node = rng.choice(nodes)
+        start = time.perf_counter()
+        legacy_lookup(node, [n for n in nodes if n is not node], cid)
+        legacy_latency.append(time.perf_counter() - start)
+
+    print(f"nodes: {args.nodes}   lookups: {len(cids)}   found: {found}/{len(cids)}")
+    print(f"dht    hops mean/max: {statistics.mean(hops):.2f}/{max(hops)}   "
+          f"latency mean: {statistics.mean(dht_latency) * 1000:.1f} ms")
+    print(f"legacy requests: {args.nodes - 1}   "
+          f"latency mean: {statistics.mean(legacy_latency) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Discovery traffic simulation: subnet scan vs multicast announcements plus gossip.
+
+Event-driven model of N nodes on one /24, using the discovery intervals from
+config.json. A message is one HTTP request or one UDP datagram; the
+maintenance pings, identical in both modes, are left out. A handshake
+(connect_to_peer) costs 3 messages: ping, info and notify.
+
+    python benchmarks/bench_discovery.py --nodes 4 8 32 128 --duration 120
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.json')
+HANDSHAKE = 3
+HOSTS = 254
+
+
+class Simulation:
+    def __init__(self, nodes, settings, ports, stagger, loss, seed):
+        self.nodes = nodes
+        self.settings = settings
+        self.ports = ports
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.start_at = [self.rng.uniform(0, stagger) for _ in range(nodes)]
+        self.known = [set() for _ in range(nodes)]
+        self.messages = 0
+        self.converged_at = None
+        self.converged_messages = None
+        self._events = []
+
+    def schedule(self, when, action, node):
+        heapq.heappush(self._events, (when, self.rng.random(), action, node))
+
+    def connect(self, node, other, now):
+        # connect_to_peer plus the notify that makes the other side learn us
+        self.messages += HANDSHAKE
+        self.known[node].add(other)
+        self.known[other].add(node)
+
+    def up(self, node, now):
+        return now >= self.start_at[node]
+
+    def run(self, duration):
+        while self._events:
+            now, _, action, node = heapq.heappop(self._events)
+            if now > duration:
+                break
+            action(node, now)
+            if self.converged_at is None and all(len(k) == self.nodes - 1 for k in self.known):
+                self.converged_at = now
+                self.converged_messages = self.messages
+        return self
+
+
+class ScanSimulation(Simulation):
+    """Network._continuous_discovery with discovery.mode = scan"""
+
+    def start(self):
+        for node in range(self.nodes):
+            self.schedule(self.start_at[node], self.scan, node)
+        return self
+
+    def scan(self, node, now):
+        live = [other for other in range(self.nodes) if other != node and self.up(other, now)]
+        unknown = [other for other in live if other not in self.known[node]]
+        # Every address/port not already a peer gets probed
+        self.messages += HOSTS * len(self.ports) - len(self.known[node]) - len(unknown)
+        for other in unknown:
+            self.connect(node, other, now)
+        active = len(self.known[node])
+        if active < self.settings['aggressive_threshold']:
+            self.schedule(now + 2, self.scan, node)
+        elif active < self.settings['moderate_threshold']:
+            self.schedule(now + 10, self.scan, node)
+        else:
+            self.schedule(now + 30, self.check, node)
+
+    def check(self, node, now):
+        if len(self.known[node]) < self.settings['moderate_threshold']:
+            self.scan(node, now)
+        else:
+            self.schedule(now + 30, self.check, node)
+
+
+class GossipSimulation(Simulation):
+    """PeerGossip: multicast announce loop plus push-pull gossip loop"""
+
+    def start(self):
+        for node in range(self.nodes):
+            self.schedule(self.start_at[node], self.announce, node)
+            self.schedule(self.start_at[node], self.gossip, node)
+        return self
+
+    def announce(self, node, now):
+        self.messages += 1
+        for other in range(self.nodes):
+            if other == node or not self.up(other, now) or self.rng.random() < self.loss:
+                continue
+            if node not in self.known[other]:
+                self.connect(other, node, now)
+        self.schedule(now + self.settings['announce_interval'], self.announce, node)
+
+    def gossip(self, node, now):
+        peers = sorted(self.known[node])
+        for other in self.rng.sample(peers, min(self.settings['gossip_fanout'], len(peers))):
+            self.messages += 1
+            merged = (self.known[node] | self.known[other] | {node, other})
+            for side in (node, other):
+                for learned in merged - self.known[side] - {side}:
+                    self.connect(side, learned, now)
+        self.schedule(now + self.settings['gossip_interval'], self.gossip, node)
+
+
+def main():
+    with open(CONFIG_PATH) as f:
+        config = json.load(f)
+    settings = {
+        'aggressive_threshold': 3,
+        'moderate_threshold': 5,
+        'announce_interval': 5,
+        'gossip_interval': 2,
+        'gossip_fanout': 3,
+        **config.get('discovery', {})
+    }
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[4, 8, 32, 128])
+    parser.add_argument('--duration', type=float, default=120, help='Simulated seconds')
+    parser.add_argument('--stagger', type=float, default=5, help='Nodes start within this many seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='Multicast datagram loss rate')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    ports = config.get('scan_ports', [5000, 5001, 5002])
+
+    print(f"{args.duration:.0f} s simulated, scan_ports={ports}, multicast loss {args.loss:.0%}")
+    print(f"{'nodes':>6}{'mode':>8}{'converged s':>13}{'msgs to converge':>18}{'msgs total':>12}{'msgs/node/min':>15}")
+    for nodes in args.nodes:
+        for mode, cls in (('scan', ScanSimulation), ('gossip', GossipSimulation)):
+            sim = cls(nodes, settings, ports, args.stagger, args.loss, args.seed).start().run(args.duration)
+            converged = f"{sim.converged_at:.1f}" if sim.converged_at is not None else 'never'
+            to_converge = sim.converged_messages if sim.converged_messages is not None else '-'
+            per_node_minute = sim.messages / nodes / (args.duration / 60)
+            print(f"{nodes:>6}{mode:>8}{converged:>13}{to_converge:>18}{sim.messages:>12}{per_node_minute:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Erasure coding: storage overhead and encode / reconstruction throughput.
+
+For each k+m setting, encodes --groups groups of k random chunks (what an
+upload does per group) and then rebuilds every data shard of each group
+from the worst case of m lost data shards (what a reader does when peers
+are gone). Overhead is the bytes stored across peers per byte of file,
+next to the full-replication factors it replaces.
+
+    python benchmarks/bench_erasure.py --codes 4+2 6+3 10+4 --chunk-size 262144
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.erasure import ReedSolomon
+
+
+def bench(k, m, args):
+    coder = ReedSolomon(k, m)
+    groups = [[os.urandom(args.chunk_size) for _ in range(k)] for _ in range(args.groups)]
+    data_mb = args.groups * k * args.chunk_size / 2**20
+
+    start = time.perf_counter()
+    parity = [coder.encode(group) for group in groups]
+    encode = data_mb / (time.perf_counter() - start)
+
+    lost = list(range(min(m, k)))
+    start = time.perf_counter()
+    for group, extra in zip(groups, parity):
+        shards = dict(enumerate(group))
+        shards.update((k + i, shard) for i, shard in enumerate(extra))
+        for position in lost:
+            del shards[position]
+        rebuilt = coder.decode(shards, args.chunk_size, lost)
+        assert all(rebuilt[p] == group[p] for p in lost)
+    rebuilt_mb = args.groups * len(lost) * args.chunk_size / 2**20
+    rebuild = rebuilt_mb / (time.perf_counter() - start)
+    return (k + m) / k, encode, rebuild
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codes', nargs='+', default=['4+2', '6+3', '10+4'])
+    parser.add_argument('--chunk-size', type=int, default=262144)
+    parser.add_argument('--groups', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{args.chunk_size // 1024} KiB chunks, {args.groups} groups per code")
+    print(f"{'code':<8}{'overhead':>10}{'survives':>10}{'encode MB/s':>13}{'rebuild MB/s':>14}")
+    for code in args.codes:
+        k, m = (int(n) for n in code.split('+'))
+        overhead, encode, rebuild = bench(k, m, args)
+        print(f"{code:<8}{overhead:>9.2f}x{m:>6} lost{encode:>13.0f}{rebuild:>14.0f}")
+    for factor in (2, 3):
+        print(f"{f'copy x{factor}':<8}{factor:>9.2f}x{factor - 1:>6} lost{'-':>13}{'-':>14}")
+
+
+if __name__ == '__main__':
+    main()
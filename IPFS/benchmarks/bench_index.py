@@ -0,0 +1,73 @@
+"""Chunk-location write throughput as the index grows: JSON rewrite vs SQLite index.
+
+    python benchmarks/bench_index.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.index import LocationIndex
+from node.utils import generate_cid
+
+
+def json_update(path, root_cid, chunk_cids):
+    # The pre-index Storage._update_chunk_locations
+    with open(path, 'r') as f:
+        locations = json.load(f)
+    for cid in chunk_cids:
+        locations.setdefault(cid, [])
+        if root_cid not in locations[cid]:
+            locations[cid].append(root_cid)
+    with open(path, 'w') as f:
+        json.dump(locations, f)
+
+
+def fake_cids(count, salt):
+    return [generate_cid(f"{salt}-{i}") for i in range(count)]
+
+
+def bench_json(workdir, size, writes):
+    path = os.path.join(workdir, 'chunk_locations.json')
+    with open(path, 'w') as f:
+        json.dump({cid: ['root'] for cid in fake_cids(size, 'fill')}, f)
+    start = time.perf_counter()
+    for i in range(writes):
+        json_update(path, f'root-{i}', fake_cids(4, f'w{i}'))
+    return writes / (time.perf_counter() - start)
+
+
+def bench_sqlite(workdir, size, writes):
+    index = LocationIndex(os.path.join(workdir, 'index.db'))
+    index.add_chunk_locations('root', fake_cids(size, 'fill'))
+    start = time.perf_counter()
+    for i in range(writes):
+        index.add_chunk_locations(f'root-{i}', fake_cids(4, f'w{i}'))
+    return writes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--writes', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'index size':>12} {'json writes/s':>15} {'sqlite writes/s':>17}")
+    for size in args.sizes:
+        results = []
+        for bench in (bench_json, bench_sqlite):
+            workdir = tempfile.mkdtemp(prefix='dshare-bench-')
+            try:
+                results.append(bench(workdir, size, args.writes))
+            finally:
+                shutil.rmtree(workdir)
+        print(f"{size:>12} {results[0]:>15.1f} {results[1]:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Upload ingest throughput (chunk, hash, store) against the number of hash workers.
+
+Writes a --mb file of random data into a fresh blockstore through
+Storage.open_upload, in 1 MiB writes like a streamed request body, once per
+--workers value. Workers = 1 is the old serial path (everything on the
+uploading thread). The chunk cache is off so every run does the same work.
+
+    python benchmarks/bench_ingest.py --mb 256 --workers 1 2 4 8
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.storage import Storage
+
+
+def ingest(data, workers, args):
+    storage = Storage({
+        'storage_path': tempfile.mkdtemp(prefix='dshare-ingest-'),
+        'chunk_size': args.chunk_size,
+        'chunking': {'mode': args.mode, 'hash_workers': workers},
+        'cache': {'policy': 'none'},
+    })
+    view = memoryview(data)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        upload = storage.open_upload('ingest.bin')
+        for offset in range(0, len(data), 1 << 20):
+            upload.write(view[offset:offset + (1 << 20)])
+        cid = upload.finish()
+    elapsed = time.perf_counter() - start
+    if storage.chunker.hash_pool:
+        storage.chunker.hash_pool.shutdown()
+    return len(data) / 2**20 / elapsed, cid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=int, default=256)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=262144)
+    parser.add_argument('--mode', choices=['fixed', 'cdc'], default='fixed')
+    args = parser.parse_args()
+
+    data = os.urandom(args.mb * 2**20)
+    print(f"{args.mb} MiB upload, {args.mode} {args.chunk_size // 1024} KiB chunks, {os.cpu_count()} cores")
+    print(f"{'workers':<10}{'MB/s':>10}{'speedup':>10}")
+    baseline = cid = None
+    for workers in args.workers:
+        rate, root = ingest(data, workers, args)
+        assert cid is None or root == cid, "root CID depends on worker count"
+        cid = root
+        baseline = baseline or rate
+        print(f"{workers:<10}{rate:>10.0f}{rate / baseline:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
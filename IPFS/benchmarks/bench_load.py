@@ -0,0 +1,146 @@
+"""HTTP load test: requests/s for /api/ping, /api/files and chunk fetches.
+
+Each client is its own process with a keep-alive connection (re-opened when
+the server closes it), issuing requests back to back for --duration seconds.
+With --url it loads a running node; otherwise it starts main.py once per
+--servers entry on a fresh headless node, uploads a --file-mb file so there
+are chunks to fetch, and compares the servers.
+
+    python benchmarks/bench_load.py --servers dev gunicorn --clients 16
+    python benchmarks/bench_load.py --url http://10.0.0.5:5005
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def client(url, paths, duration, start_at):
+    """Request paths round-robin until the deadline; returns (ok, errors)"""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    ok = errors = 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + duration
+    index = 0
+    while time.time() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                ok += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+    conn.close()
+    return ok, errors
+
+
+def load(url, paths, clients, duration):
+    start_at = time.time() + 0.5
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(client, [(url, paths, duration, start_at)] * clients)
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return ok / duration, errors
+
+
+def prepare(url, file_mb):
+    """Make sure the node holds a file; returns (file cid, its chunk cids)"""
+    files = requests.get(f"{url}/api/files", timeout=10).json()['local_files']
+    if files:
+        cid = files[0]['cid']
+    else:
+        data = os.urandom(file_mb * 2**20)
+        response = requests.post(f"{url}/api/files", files={'file': ('load.bin', data)}, timeout=120)
+        response.raise_for_status()
+        cid = response.json()['cid']
+    manifest = requests.get(f"{url}/api/manifests/{cid}", timeout=10).json()
+    return cid, manifest['chunks']
+
+
+def start_node(server, port, workers):
+    with open(os.path.join(ROOT, 'config.json')) as f:
+        config = json.load(f)
+    workdir = tempfile.mkdtemp(prefix='dshare-load-')
+    config['storage_path'] = os.path.join(workdir, 'storage')
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    process = subprocess.Popen(
+        [sys.executable, 'main.py', '--config', config_path, '--port', str(port),
+         '--server', server, '--workers', str(workers), '--headless'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                pass
+            requests.get(f"{url}/api/ping", timeout=2).raise_for_status()
+            return process, url
+        except (OSError, requests.RequestException):
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{server} node on port {port} did not come up")
+
+
+def run(label, url, args):
+    _, chunks = prepare(url, args.file_mb)
+    workloads = (
+        ('/api/ping', ['/api/ping']),
+        ('/api/files', ['/api/files']),
+        ('chunks', [f"/api/chunks/{cid}" for cid in chunks]),
+    )
+    cells = []
+    for _, paths in workloads:
+        rate, errors = load(url, paths, args.clients, args.duration)
+        cells.append(f"{rate:.0f}" + (f" ({errors} err)" if errors else ''))
+    print(f"{label:<12}" + ''.join(f"{cell:>16}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Load this running node instead of starting one')
+    parser.add_argument('--servers', nargs='+', default=['dev', 'gunicorn'], choices=['dev', 'gunicorn'])
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per endpoint')
+    parser.add_argument('--file-mb', type=int, default=8)
+    parser.add_argument('--port', type=int, default=7600)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.duration:.0f}s per endpoint, requests/s")
+    print(f"{'server':<12}{'/api/ping':>16}{'/api/files':>16}{'chunks':>16}")
+    if args.url:
+        run('target', args.url.rstrip('/'), args)
+        return
+    for offset, server in enumerate(args.servers):
+        process, url = start_node(server, args.port + offset, args.workers)
+        try:
+            label = server if server == 'dev' else f"{server} x{args.workers}"
+            run(label, url, args)
+        finally:
+            process.terminate()
+            process.wait(10)
+
+
+if __name__ == '__main__':
+    main()
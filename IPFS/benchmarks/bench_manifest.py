@@ -0,0 +1,69 @@
+"""Root manifest size and the cost of seeking into a file, flat vs Merkle-tree manifests.
+
+Builds the manifest of a file of --chunks chunks (synthetic CIDs, nothing is
+chunked or written to disk) with ManifestBuilder, once flat (fanout larger
+than the file) and once per --fanout, then times opening the file and
+locating a byte near its end like a Range request would: parse the root and
+walk down to the chunk. Tree nodes are kept in a dict, so the times show the
+JSON and lookup work only, not disk reads.
+
+    python benchmarks/bench_manifest.py --chunks 1000 100000 1000000 --fanout 1024
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.dag import FileLayout, ManifestBuilder
+from node.utils import generate_cid
+
+
+def build(chunks, fanout, chunk_size):
+    nodes = {}
+    builder = ManifestBuilder(nodes.__setitem__, fanout)
+    for i in range(chunks):
+        builder.add(generate_cid(i.to_bytes(8, 'big')), chunk_size)
+    return builder.finish('bench.bin'), nodes
+
+
+def seek(root, nodes, offset, repeat):
+    """Seconds per open-and-locate, and how many tree nodes one locate loads"""
+    loaded = []
+
+    def load_node(cid):
+        loaded.append(cid)
+        return json.loads(nodes[cid])
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        del loaded[:]
+        layout = FileLayout.parse(root, load_node)
+        next(layout.spans(offset, offset + 1))
+    return (time.perf_counter() - start) / repeat, len(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--fanout', type=int, nargs='+', default=[1024])
+    parser.add_argument('--chunk-size', type=int, default=262144)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>10}{'file':>10}{'fanout':>10}{'root KB':>10}{'nodes':>8}{'seek ms':>10}{'loads':>7}")
+    for chunks in args.chunks:
+        size = chunks * args.chunk_size
+        # Files with no more chunks than the fanout get a flat manifest anyway
+        for fanout in [chunks] + [f for f in args.fanout if f < chunks]:
+            root, nodes = build(chunks, fanout, args.chunk_size)
+            seconds, loads = seek(root, nodes, size - 1, args.repeat)
+            label = 'flat' if fanout == chunks else fanout
+            print(f"{chunks:>10}{size / 2**30:>8.1f}GB{label:>10}{len(root) / 1024:>10.1f}"
+                  f"{len(nodes):>8}{seconds * 1000:>10.2f}{loads:>7}")
+
+
+if __name__ == '__main__':
+    main()
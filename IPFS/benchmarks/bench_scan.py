@@ -0,0 +1,160 @@
+"""Subnet discovery scan: thread-pool probes vs coroutines on the network loop.
+
+A stub peer listens on 0.0.0.0 in a child process, so every 127.0.0.x address
+answers like a DShare node after --delay seconds. Both scans probe the whole
+127.0.0.0/24 on that port and register every peer they find.
+
+    python benchmarks/bench_scan.py --delay 0.2 --threads 20
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.network import Network
+
+
+def run_stub_peer(port, delay):
+    async def handle(reader, writer):
+        request_line = await reader.readline()
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        if length:
+            await reader.readexactly(length)
+        path = request_line.split()[1].decode() if request_line else '/'
+        if path == '/api/ping':
+            await asyncio.sleep(delay)
+        body = json.dumps({'node_id': str(uuid.uuid4()), 'node_name': 'stub', 'status': 'ok'}).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, '0.0.0.0', port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def legacy_scan(network, base_ip, threads):
+    # The pre-asyncio _prioritized_scan: one blocking connect_to_peer per
+    # candidate on a thread pool
+    def _probe(peer_url):
+        try:
+            requests.get(f"{peer_url}/api/ping", timeout=2)
+            info = requests.get(f"{peer_url}/api/info", timeout=5).json()
+            network.peers.upsert(
+                peer_url,
+                id=info['node_id'],
+                name=info['node_name'],
+                last_seen=time.time(),
+                source='discovered'
+            )
+            network._save_peers()
+            requests.post(f"{peer_url}/api/peers/notify", json={'url': network.api_url}, timeout=3)
+        except requests.exceptions.RequestException:
+            pass
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for last_octet in range(1, 255):
+            for port in network.scan_ports:
+                executor.submit(_probe, f"http://{base_ip}.{last_octet}:{port}")
+
+
+def measure(label, scan):
+    peak_threads = threading.active_count()
+    done = threading.Event()
+
+    def _sample():
+        nonlocal peak_threads
+        while not done.is_set():
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=_sample, daemon=True)
+    sampler.start()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scan()
+    elapsed = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    done.set()
+    sampler.join()
+    return label, elapsed, peak_threads, peak_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=7400)
+    parser.add_argument('--delay', type=float, default=0.2, help='Stub peer ping latency in seconds')
+    parser.add_argument('--threads', type=int, default=20, help='Legacy scan_threads')
+    parser.add_argument('--max-in-flight', type=int, default=256)
+    args = parser.parse_args()
+
+    stub = multiprocessing.Process(target=run_stub_peer, args=(args.port, args.delay), daemon=True)
+    stub.start()
+    time.sleep(0.5)
+
+    def make_network():
+        config = {
+            'host': '0.0.0.0',
+            'port': args.port + 1,
+            'storage_path': tempfile.mkdtemp(prefix='dshare-scan-'),
+            'scan_ports': [args.port],
+            'discovery': {
+                'aggressive_threshold': 3,
+                'moderate_threshold': 5,
+                'max_in_flight': args.max_in_flight
+            },
+        }
+        network = Network(config)
+        network.core.start()
+        return network
+
+    legacy = make_network()
+    modern = make_network()
+    results = [
+        measure(f"thread pool ({args.threads})", lambda: legacy_scan(legacy, '127.0.0', args.threads)),
+        measure(
+            f"asyncio ({args.max_in_flight} in flight)",
+            lambda: modern.core.run(modern._prioritized_scan('127.0.0'))
+        ),
+    ]
+    found = [len(legacy.peers), len(modern.peers)]
+
+    print(f"Scanned 254 hosts, ping latency {args.delay * 1000:.0f} ms")
+    print(f"{'scan':<26}{'peers':>8}{'wall s':>10}{'threads':>10}{'peak KiB':>12}")
+    for (label, elapsed, threads, memory), peers in zip(results, found):
+        print(f"{label:<26}{peers:>8}{elapsed:>10.2f}{threads:>10}{memory / 1024:>12.0f}")
+
+    stub.terminate()
+
+
+if __name__ == '__main__':
+    main()
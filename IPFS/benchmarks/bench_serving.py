@@ -0,0 +1,127 @@
+"""Download throughput of a locally stored file: sendfile fast path vs the chunk generator.
+
+Serves one --mb file from a node in a child process (werkzeug, threaded),
+then downloads it with raw-socket client processes that discard the body.
+The chunk generator is measured with the chunk cache off (every chunk read
+from the page cache and copied through Python) and on (a warm cache holding
+the whole file, the best case for it), then against the sendfile path.
+Clients and server share the machine, so on few cores the wall-clock rate is
+capped by the clients; server CPU seconds per GB (from /proc, Linux only) is
+the figure the fast path is meant to cut.
+
+    python benchmarks/bench_serving.py --mb 256 --clients 1 8
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def serve(port, storage_path, sendfile, cache, ready):
+    import logging
+    from werkzeug.serving import make_server
+    from node.api import API
+    from node.network import Network
+    from node.storage import Storage
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    config = {
+        'host': '0.0.0.0',
+        'port': port,
+        'storage_path': storage_path,
+        'chunk_size': 262144,
+        'serving': {'sendfile': sendfile},
+        'cache': {'policy': cache, 'capacity_bytes': 2**31},
+    }
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = Network(config)
+        api = API(config, Storage(config, network), network)
+    server = make_server('127.0.0.1', port, api.app, threaded=True)
+    ready.set()
+    server.serve_forever()
+
+
+def fetch(port, cid, buf):
+    """GET the file and discard the body; returns bytes received"""
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        sock.sendall(f"GET /api/files/{cid} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+        total = 0
+        view = memoryview(buf)
+        while True:
+            n = sock.recv_into(view)
+            if not n:
+                return total
+            total += n
+
+
+def cpu_seconds(pid):
+    """User + system CPU time of a process, or None off Linux"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def client(port, cid, rounds):
+    buf = bytearray(1 << 20)
+    return sum(fetch(port, cid, buf) for _ in range(rounds))
+
+
+def run(port, cid, clients, rounds, size, server_pid):
+    cpu_before = cpu_seconds(server_pid)
+    with multiprocessing.Pool(clients) as pool:
+        start = time.perf_counter()
+        results = pool.starmap(client, [(port, cid, rounds)] * clients)
+        elapsed = time.perf_counter() - start
+    assert all(r >= size * rounds for r in results), "short download"
+    total = sum(results)
+    cpu = cpu_seconds(server_pid)
+    cpu_per_gb = (cpu - cpu_before) / (total / 1e9) if cpu is not None else float('nan')
+    return total / elapsed / 1e9, cpu_per_gb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=int, default=256)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--rounds', type=int, default=3, help='Downloads per client')
+    parser.add_argument('--port', type=int, default=7500)
+    args = parser.parse_args()
+
+    from node.storage import Storage
+    storage_path = tempfile.mkdtemp(prefix='dshare-serving-')
+    size = args.mb * 2**20
+    storage = Storage({'storage_path': storage_path, 'chunk_size': 262144})
+    with contextlib.redirect_stdout(io.StringIO()):
+        upload = storage.open_upload('media.bin')
+        block = os.urandom(1 << 20)
+        for _ in range(args.mb):
+            upload.write(block)
+        cid = upload.finish()
+
+    print(f"{args.mb} MiB file, {args.rounds} downloads per client: GB/s, server CPU s/GB")
+    print(f"{'mode':<12}" + ''.join(f"{f'{n} client(s)':>20}" for n in args.clients))
+    modes = (('generator', False, 'none'), ('gen+cache', False, 'lru'), ('sendfile', True, 'none'))
+    for offset, (label, sendfile, cache) in enumerate(modes):
+        port = args.port + offset
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(port, storage_path, sendfile, cache, ready), daemon=True)
+        server.start()
+        ready.wait()
+        run(port, cid, 1, 1, size, server.pid)  # warm the page cache (and chunk cache)
+        results = [run(port, cid, clients, args.rounds, size, server.pid) for clients in args.clients]
+        print(f"{label:<12}" + ''.join(f"{f'{rate:.2f} / {cpu:.3f}':>20}" for rate, cpu in results))
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Compare chunk replication cost: legacy latin1-in-JSON vs raw binary PUT vs batched frames.
+
+Runs the node API in-process with Flask's test client and reports bytes on the
+wire and CPU seconds, both scaled to one GiB replicated.
+
+    python benchmarks/bench_transfer.py --mb 64
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from node.api import API
+from node.network import Network
+from node.storage import Storage
+from node.transfer import encode_frames, FRAME_CONTENT_TYPE
+from node.utils import generate_cid
+
+GIB = 1024 ** 3
+
+
+def make_node(chunk_size):
+    path = tempfile.mkdtemp(prefix='dshare-bench-')
+    config = {'host': '0.0.0.0', 'port': 0, 'storage_path': path, 'chunk_size': chunk_size}
+    network = Network(config)
+    storage = Storage(config, network)
+    return API(config, storage, network).app.test_client(), path
+
+
+def run(label, chunks, send):
+    client, path = make_node(len(chunks[0][1]))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.process_time()
+            wire = send(client, chunks)
+            cpu = time.process_time() - start
+    finally:
+        shutil.rmtree(path)
+    total = sum(len(d) for _, d in chunks)
+    scale = GIB / total
+    print(f"{label:<10} wire/GiB: {wire * scale / 2**20:9.1f} MiB   cpu/GiB: {cpu * scale:7.2f} s")
+
+
+def send_legacy(client, chunks):
+    wire = 0
+    for cid, data in chunks:
+        body = json.dumps({'cid': cid, 'data': data.decode('latin1')})
+        wire += len(body)
+        client.post('/api/chunks', data=body, content_type='application/json')
+    return wire
+
+
+def send_raw(client, chunks):
+    wire = 0
+    for cid, data in chunks:
+        wire += len(data)
+        client.put(f'/api/chunks/{cid}', data=data, content_type='application/octet-stream')
+    return wire
+
+
+def send_batched(client, chunks, batch_size=16):
+    wire = 0
+    for i in range(0, len(chunks), batch_size):
+        body = encode_frames(chunks[i:i + batch_size])
+        wire += len(body)
+        client.post('/api/chunks/batch', data=body, content_type=FRAME_CONTENT_TYPE)
+    return wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=int, default=64, help='Data volume to replicate')
+    parser.add_argument('--chunk-size', type=int, default=262144)
+    args = parser.parse_args()
+
+    count = args.mb * 2**20 // args.chunk_size
+    chunks = []
+    for _ in range(count):
+        data = os.urandom(args.chunk_size)
+        chunks.append((generate_cid(data), data))
+
+    run('legacy', chunks, send_legacy)
+    run('raw-put', chunks, send_raw)
+    run('batched', chunks, send_batched)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ import time
 from node.storage import Storage
 from node.network import Network
 from node.api import API
+from node.server import run_gunicorn
 
 def load_config(config_path):
     
@@ -16,6 +17,9 @@ def main():
     parser = argparse.ArgumentParser(description='IPFS Clone Node')
     parser.add_argument('--config', default='config.json', help='Path to config file')
     parser.add_argument('--port', type=int, help='Port to run the node on')
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], help='HTTP server (overrides serving.server)')
+    parser.add_argument('--workers', type=int, help='Worker processes for the gunicorn server')
+    parser.add_argument('--headless', action='store_true', help="Don't draw the node dashboard in the terminal")
     args = parser.parse_args()
     
     config = load_config(args.config)
@@ -23,6 +27,20 @@ def main():
     # Override port if specified
     if args.port:
         config['port'] = args.port
+    serving = config.setdefault('serving', {})
+    if args.server:
+        serving['server'] = args.server
+    if args.workers:
+        serving['workers'] = args.workers
+    if args.headless:
+        serving['headless'] = True
+
+    if serving.get('server', 'dev') == 'gunicorn':
+        # Each worker process builds its own node objects; there is no
+        # single process to draw the dashboard from, so this mode is headless
+        print(f"Starting {serving.get('workers', 4)} gunicorn workers on port {config['port']}")
+        run_gunicorn(config)
+        return
     
     # Initialize components
     network = Network(config)
@@ -31,6 +49,8 @@ def main():
     
     # Start network services
     network.start()
+    storage.replication.start()
+    storage.scrubber.start()
     
     # Start API server
     print(f"\nStarting node {network.node_name} on {network.api_url}")
@@ -57,18 +77,19 @@ def main():
             print("-" * 60)
             
             # Peer data
-            for url, info in network.peers.items():
-                status = 'ACTIVE' if time.time() - info.get('last_seen', 0) < 60 else 'INACTIVE'
-                uptime = time.time() - info.get('first_seen', time.time())
-                last_seen = time.time() - info.get('last_seen', 0)
+            for peer in network.peers.records():
+                status = 'ACTIVE' if time.time() - peer.last_seen < 60 else 'INACTIVE'
+                uptime = time.time() - peer.first_seen
+                last_seen = time.time() - peer.last_seen
                 
-                print(f"{url:<30} {info.get('name','unknown'):<20} "
+                print(f"{peer.url:<30} {peer.name or 'unknown':<20} "
                       f"{status:<10} {uptime:.1f}s {'':<5} {last_seen:.1f}s ago")
             
             time.sleep(5)  # Refresh every 5 seconds
     
     # Start the display thread
-    threading.Thread(target=display_node_info, args=(network,), daemon=True).start()
+    if not serving.get('headless', False):
+        threading.Thread(target=display_node_info, args=(network,), daemon=True).start()
     api.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,24 @@
+import argparse
+import json
+from node.storage import Storage
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Move a flat block store into the sharded layout and build the manifest catalogue. '
+                    'Safe to run against the storage of a live node.'
+    )
+    parser.add_argument('--config', default='config.json', help='Path to config file')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    # Migrate here, in the foreground, rather than on Storage's background thread
+    storage = Storage(config, migrate=False)
+    moved = storage.migrate(background=False)
+    print(f"Done, {moved} blocks moved, {len(storage.get_all_files())} files catalogued")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import threading
+from urllib.parse import urlsplit
+
+
+class AsyncHTTPError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncNetworkCore:
+    """A single asyncio event loop, on its own thread, for the Network subsystem.
+
+    Peer discovery, maintenance pings and other fan-out work run here as
+    coroutines, so thousands of probes can be in flight with one thread and a
+    semaphore bounding concurrency. Synchronous callers use run() or submit().
+    One idle keep-alive connection is kept per peer for up to idle_timeout
+    seconds, so heartbeats and gossip don't reconnect every round.
+    """
+
+    def __init__(self, max_in_flight=256, idle_timeout=30):
+        self.max_in_flight = max_in_flight
+        # Seconds a kept-alive connection may sit unused before it is closed
+        self.idle_timeout = idle_timeout
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+        self._semaphore = None
+        self._idle = {}  # (scheme, host, port) -> (reader, writer, expiry handle)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        ready = threading.Event()
+
+        def _run():
+            asyncio.set_event_loop(self.loop)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=_run, name='network-loop', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def submit(self, coro):
+        """Schedule coro on the loop from any thread; returns a concurrent Future"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run coro on the loop and block until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    async def bounded_gather(self, coros):
+        """Await coros concurrently, at most max_in_flight at a time.
+
+        Exceptions are returned in place of results, like
+        gather(return_exceptions=True).
+        """
+        async def _limited(coro):
+            async with self._semaphore:
+                return await coro
+
+        return await asyncio.gather(*(_limited(c) for c in coros), return_exceptions=True)
+
+    async def request(self, method, url, body=None, headers=None, timeout=5, max_body=1024 * 1024):
+        """Minimal HTTP/1.1 client on asyncio streams for small JSON exchanges.
+
+        Returns (status, headers, body). Connections are kept alive and reused
+        (see _connect / _release) unless the server closes them. Bulk
+        transfers should use Network.http instead.
+        """
+        parts = urlsplit(url)
+        host = parts.hostname
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, host, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += f"?{parts.query}"
+
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {parts.netloc}",
+            "Accept: application/json",
+        ]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode('latin1') + (body or b'')
+
+        async def _exchange(reader, writer):
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError(f"{url} closed the connection")
+            try:
+                version, status = status_line.split()[:2]
+                status = int(status)
+            except ValueError:
+                raise AsyncHTTPError(f"Bad status line from {url}: {status_line!r}")
+
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin1').partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+
+            connection = response_headers.get('connection', '').lower()
+            reusable = connection == 'keep-alive' if version == b'HTTP/1.0' else connection != 'close'
+            if method == 'HEAD':
+                data = b''
+            elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+                data = await self._read_chunked(reader, max_body)
+            elif 'content-length' in response_headers:
+                length = int(response_headers['content-length'])
+                if length > max_body:
+                    raise AsyncHTTPError(f"Response from {url} too large")
+                data = await reader.readexactly(length)
+            else:
+                # Delimited by the server closing the connection
+                data = await reader.read(max_body)
+                reusable = False
+            return (status, response_headers, data), reusable
+
+        async def _attempt():
+            reader, writer, reused = await self._connect(key)
+            reusable = False
+            try:
+                result, reusable = await _exchange(reader, writer)
+                return result
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # The peer dropped an idle connection; try once on a fresh one
+                writer.close()
+                reader, writer, _ = await self._connect(key, fresh=True)
+                result, reusable = await _exchange(reader, writer)
+                return result
+            finally:
+                if reusable:
+                    self._release(key, reader, writer)
+                else:
+                    writer.close()
+
+        return await asyncio.wait_for(_attempt(), timeout)
+
+    async def _connect(self, key, fresh=False):
+        """(reader, writer, reused): the idle connection to key if any, else a new one"""
+        idle = None if fresh else self._idle.pop(key, None)
+        if idle is not None:
+            reader, writer, expiry = idle
+            expiry.cancel()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(host, port, ssl=scheme == 'https' or None)
+        return reader, writer, False
+
+    def _release(self, key, reader, writer):
+        """Keep a finished connection for the next request to the same peer"""
+        if key in self._idle:
+            writer.close()  # One idle connection per peer is enough
+            return
+        expiry = self.loop.call_later(self.idle_timeout, self._expire, key, writer)
+        self._idle[key] = (reader, writer, expiry)
+
+    def _expire(self, key, writer):
+        idle = self._idle.get(key)
+        if idle is not None and idle[1] is writer:
+            del self._idle[key]
+        writer.close()
+
+    async def _read_chunked(self, reader, max_body):
+        data = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                return bytes(data)
+            data += await reader.readexactly(size)
+            await reader.readline()
+            if len(data) > max_body:
+                raise AsyncHTTPError("Chunked response too large")
+
+    async def get_json(self, url, timeout=5):
+        """GET url and decode a JSON body; raises AsyncHTTPError on non-200"""
+        status, _, data = await self.request('GET', url, timeout=timeout)
+        if status != 200:
+            raise AsyncHTTPError(f"GET {url} returned {status}", status)
+        return json.loads(data.decode('utf-8'))
+
+    async def post_json(self, url, payload, timeout=5):
+        body = json.dumps(payload).encode('utf-8')
+        status, _, data = await self.request(
+            'POST', url, body=body, headers={'Content-Type': 'application/json'}, timeout=timeout
+        )
+        if status != 200:
+            raise AsyncHTTPError(f"POST {url} returned {status}", status)
+        return json.loads(data.decode('utf-8')) if data else None
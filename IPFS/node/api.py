@@ -1,26 +1,54 @@
 import datetime
-import json
-import threading
 import time
 import os
-from flask import Flask, Response, redirect, request, jsonify, send_file
-from threading import Thread
-
-import requests
-from .storage import Storage
-from .network import Network
-from .utils import generate_cid
-from flask import Flask
+from functools import partial
+from itertools import chain
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.formparser import MultiPartParser
+
+from .storage import IntegrityError
+from .utils import is_cid
+from .dag import FileLayout
+from .fastpath import ChunkFileStream, client_socket
+from .transfer import iter_frames, FLAGGED_CONTENT_TYPE, FLAG_PACKED
+from .compression import CONTENT_ENCODING
+from .downloader import SwarmDownloader
+
+
+class UploadParser(MultiPartParser):
+    """Multipart parser that streams the first 'file' part into a ChunkedUpload.
+
+    Other file parts are spooled the usual way and ignored.
+    """
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+        self.upload = None
+
+    def start_file_streaming(self, event, total_content_length):
+        if event.name != 'file' or self.upload is not None:
+            return super().start_file_streaming(event, total_content_length)
+        self.upload = self.storage.open_upload(os.path.basename(event.filename or 'unknown'))
+        return self.upload
 
-from flask import Flask
-from flask_cors import CORS
 
 class API:
     def __init__(self, config, storage, network):
         self.config = config
         self.storage = storage
         self.network = network
+        self.downloader = SwarmDownloader(
+            storage,
+            network,
+            max_workers=config.get('download_workers', 8),
+            window=config.get('download_window', 32)
+        )
+        # Send local files straight from the chunk files (see fastpath.py)
+        self.sendfile = config.get('serving', {}).get('sendfile', True)
+        # Keep announcing the files we already hold
+        self.network.dht.provided.update(self.storage.index.get_files_at(self.network.api_url))
         self.app = Flask(__name__)
         CORS(self.app)  # ✅ Apply CORS to the correct app instance
         self._setup_routes()
@@ -67,14 +95,54 @@ class API:
         @self.app.route('/api/peers', methods=['GET'])
         def list_peers():
             peers = []
-            for url, info in self.network.peers.items():
+            for peer in self.network.peers.records():
                 peers.append({
-                    'url': url,
-                    'info': info,
-                    'status': 'active' if time.time() - info.get('last_seen', 0) < 60 else 'inactive'
+                    'url': peer.url,
+                    'info': peer.to_dict(),
+                    'status': 'active' if time.time() - peer.last_seen < 60 else 'inactive'
                 })
             return jsonify(peers)
 
+        @self.app.route('/api/peers/gossip', methods=['POST'])
+        def gossip_peers():
+            """Push-pull peer list exchange used by LAN discovery"""
+            try:
+                return jsonify(self.network.gossip.handle_exchange(request.get_json()))
+            except Exception as e:
+                return jsonify({'error': str(e)}), 400
+
+        @self.app.route('/api/peers/heartbeat', methods=['POST'])
+        def peer_heartbeat():
+            """Heartbeat push carrying the sender's membership counters"""
+            try:
+                return jsonify(self.network.membership.handle_heartbeat(request.get_json()))
+            except Exception as e:
+                return jsonify({'error': str(e)}), 400
+
+        @self.app.route('/api/cache/stats', methods=['GET'])
+        def cache_stats():
+            """Hit/miss counters of the in-memory chunk cache"""
+            return jsonify(self.storage.cache.stats())
+
+        @self.app.route('/api/scrub', methods=['GET'])
+        def scrub_status():
+            """Progress of the blockstore scrubber and what it has found"""
+            return jsonify(self.storage.scrubber.stats())
+
+        @self.app.route('/api/scrub', methods=['POST'])
+        def scrub_now():
+            """Start a scrub pass without waiting for the interval"""
+            if not self.storage.scrubber.enabled:
+                return jsonify({'error': 'Scrubbing is disabled'}), 400
+            self.storage.scrubber.start()
+            self.storage.scrubber.trigger()
+            return jsonify({'status': 'started'})
+
+        @self.app.route('/api/http/stats', methods=['GET'])
+        def http_stats():
+            """Connection reuse across the pooled peer sessions"""
+            return jsonify(self.network.http.stats())
+
         @self.app.route('/api/peers/notify', methods=['POST'])
         def notify_peer():
             try:
@@ -83,11 +151,12 @@ class API:
                 peer_info = data['info']
                 
                 # Force update even if peer exists
-                self.network.peers[peer_url] = {
-                    **peer_info,
-                    'last_seen': time.time(),
-                    'force_active': True  # New flag
-                }
+                self.network.peers.upsert(
+                    peer_url,
+                    id=peer_info.get('id'),
+                    name=peer_info.get('name'),
+                    last_seen=time.time()
+                )
                 return jsonify({'status': 'ok'})
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
@@ -95,20 +164,20 @@ class API:
                     
         @self.app.route('/api/files', methods=['POST'])
         def upload_file():
+            # Parse the multipart body ourselves so the file part streams
+            # straight into the chunker instead of a temp file
+            parser = UploadParser(self.storage)
             try:
-                if 'file' not in request.files:
+                boundary = request.mimetype_params.get('boundary', '').encode('latin1')
+                if request.mimetype != 'multipart/form-data' or not boundary:
                     return jsonify({'error': 'No file provided'}), 400
-                file = request.files['file']
-                filename = file.filename
-                temp_path = os.path.join(self.storage.storage_path, f"{filename}")
-                file.save(temp_path)
-
-                # Store file and get CID
-                root_cid = self.storage.store_file(temp_path)
+                _, files = parser.parse(request.stream, boundary, request.content_length)
+                if parser.upload is None:
+                    return jsonify({'error': 'No file provided'}), 400
+                filename = files['file'].filename
 
-                # Propagate file availability to peers
-                if hasattr(self.storage, 'network') and self.storage.network:
-                    self.storage.network.propagate_file_availability(root_cid)
+                # Store the last chunk and manifest and get the CID
+                root_cid = parser.upload.finish()
 
                 return jsonify({
                     'cid': root_cid,
@@ -118,74 +187,102 @@ class API:
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
             finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+                # Drop the chunks of an upload that didn't finish
+                if parser.upload is not None:
+                    parser.upload.abort()
                             
             
         @self.app.route('/api/files/<cid>', methods=['GET'])
         def download_file(cid):
             """Download file with failback to other peers"""
             try:
-                # First try to serve locally
-                if self.storage.has_chunk(cid):
-                    chunk_generator, original_filename = self.storage.retrieve_file(cid)
-                    return Response(
-                        chunk_generator,
-                        mimetype='application/octet-stream',
-                        headers={
-                            'Content-Disposition': f'attachment; filename="{original_filename}"'
-                        }
+                active = self.network.get_active_peers()
+                # Serve locally if we hold the whole file; a node with just the
+                # manifest swarms the chunks below like any other reader
+                if self.storage.holds_file(cid):
+                    layout = self.storage.open_file(cid, self.downloader.node_loader(active))
+                    # Anything we lost since (e.g. quarantined by the scrubber) is
+                    # fetched from its holders when the stream gets to it
+                    fetch_missing = partial(self.downloader.fetch_located, peers=active, root_cid=cid,
+                                            recover=self.downloader.recovery(layout.manifest, active))
+                    return self._file_response(
+                        cid,
+                        layout,
+                        lambda start, end: self.storage.read_extents(layout.extents(start, end), fetch_missing),
+                        fetch_missing=fetch_missing
                     )
-                
-                # If not found locally, try to fetch from peers
-                locations = self.network.find_file_location(cid)
-                if locations:
-                    # Try each peer until we get the file
-                    for peer_url in locations:
-                        try:
-                            response = requests.get(
-                                f"{peer_url}/api/files/{cid}",
-                                stream=True,
-                                timeout=10
-                            )
-                            if response.status_code == 200:
-                                # Stream the response back to client while also storing
-                                def generate():
-                                    temp_chunks = []
-                                    for chunk in response.iter_content(chunk_size=8192):
-                                        if chunk:
-                                            temp_chunks.append(chunk)
-                                            yield chunk
-                                    
-                                    # After streaming to client, store the file
-                                    temp_path = os.path.join(self.storage.storage_path, f"temp_{cid}")
-                                    with open(temp_path, 'wb') as f:
-                                        for c in temp_chunks:
-                                            f.write(c)
-                                    self.storage.store_file(temp_path)
-                                    os.remove(temp_path)
-                                
-                                filename = response.headers.get('Content-Disposition', '').split('filename=')[-1].strip('"')
-                                return Response(
-                                    generate(),
-                                    mimetype='application/octet-stream',
-                                    headers={
-                                        'Content-Disposition': f'attachment; filename="{filename}"'
-                                    }
-                                )
-                        except Exception:
-                            continue
-                
+
+                # Not stored locally, swarm the chunks from every peer that has them
+                manifest_data = self.downloader.fetch_manifest(cid, active)
+                if manifest_data is not None:
+                    layout = FileLayout.parse(manifest_data, self.downloader.node_loader(active))
+                    return self._file_response(
+                        cid,
+                        layout,
+                        lambda start, end: self.downloader.download(
+                            cid, manifest_data, layout.extents(start, end), active,
+                            register=(start, end) == (0, layout.size))
+                    )
+
+                # Otherwise stream it from a node the DHT says has it
+                for peer_url in self.network.find_file_location(cid):
+                    peer_manifest = self.downloader.fetch_manifest(cid, [peer_url])
+                    if peer_manifest is None:
+                        continue
+                    layout = FileLayout.parse(peer_manifest, self.downloader.node_loader([peer_url]))
+                    return self._file_response(
+                        cid,
+                        layout,
+                        partial(self.downloader.stream_from_peer, cid, peer_manifest, layout, peer_url)
+                    )
+
                 return jsonify({'error': 'File not found'}), 404
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
 
+        @self.app.route('/api/files/<cid>/announce', methods=['POST'])
+        def announce_file(cid):
+            """Publish a provider record for a file held here (follower workers send theirs to the primary)"""
+            if not self.storage.holds_file(cid):
+                return jsonify({'error': 'File not found'}), 404
+            self.network.announce_file(cid)
+            return jsonify({'status': 'ok'})
+
         @self.app.route('/api/files/<cid>/exists', methods=['GET'])
         def file_exists(cid):
             """Check if file exists locally"""
             exists = self.storage.has_chunk(cid)
             return jsonify({'exists': exists, 'cid': cid})
 
+        @self.app.route('/api/replication', methods=['GET'])
+        def replication_summary():
+            """Count of replication jobs by status"""
+            if not self.storage.replication:
+                return jsonify({})
+            return jsonify(self.storage.replication.summary())
+
+        @self.app.route('/api/replication/<cid>', methods=['GET'])
+        def replication_status(cid):
+            """Per-peer replication state of a chunk or file"""
+            if not self.storage.replication:
+                return jsonify({'cid': cid, 'jobs': []})
+            return jsonify({'cid': cid, 'jobs': self.storage.replication.status(cid)})
+
+        @self.app.route('/api/dht/<method>', methods=['POST'])
+        def dht_rpc(method):
+            """Kademlia RPCs: find_node, find_providers, add_provider"""
+            handlers = {
+                'find_node': self.network.dht.handle_find_node,
+                'find_providers': self.network.dht.handle_find_providers,
+                'add_provider': self.network.dht.handle_add_provider,
+            }
+            if method not in handlers:
+                return jsonify({'error': f'Unknown DHT method {method}'}), 404
+            try:
+                return jsonify(handlers[method](request.get_json()))
+            except Exception as e:
+                return jsonify({'error': str(e)}), 400
+
         @self.app.route('/api/files/availability', methods=['POST'])
         def file_availability():
             """Notify that a peer has this file"""
@@ -194,6 +291,7 @@ class API:
                 cid = data['cid']
                 peer_url = data['url']
                 self.storage.update_file_location(cid, peer_url)
+                self.network.dht.add_provider(cid, peer_url)
                 return jsonify({'status': 'ok'})
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
@@ -207,12 +305,11 @@ class API:
                 cid = data['cid']
                 chunk_data = data['data'].encode('latin1') if isinstance(data['data'], str) else data['data']
 
-                chunk_path = os.path.join(self.storage.storage_path, cid)
-                if not os.path.exists(chunk_path):
-                    with open(chunk_path, 'wb') as f:
-                        f.write(chunk_data)
+                if self.storage.store_chunk(cid, chunk_data):
                     print(f"Saved new chunk: {cid[:8]}...")
                 return jsonify({'status': 'ok'})
+            except IntegrityError as e:
+                return jsonify({'error': str(e)}), 400
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
 
@@ -223,27 +320,112 @@ class API:
                 cid = data['cid']
                 manifest_data = data['data'].encode('latin1') if isinstance(data['data'], str) else data['data']
 
-                manifest_path = os.path.join(self.storage.storage_path, cid)
-                if not os.path.exists(manifest_path):
-                    with open(manifest_path, 'wb') as f:
-                        f.write(manifest_data)
+                if self.storage.store_manifest(cid, manifest_data):
                     print(f"Saved new manifest: {cid[:8]}...")
                 return jsonify({'status': 'ok'})
+            except ValueError as e:
+                # Not a manifest, or not the one cid names
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/chunks/<cid>', methods=['GET', 'HEAD'])
+        def get_chunk(cid):
+            """Serve a locally stored chunk; HEAD doubles as an existence check"""
+            if not is_cid(cid) or not self.storage.has_chunk(cid):
+                return jsonify({'error': 'Chunk not found'}), 404
+            # Blocks stored compressed go out as is to peers that take deflate
+            # (requests does), everything else through the chunk cache
+            deflate = CONTENT_ENCODING in request.accept_encodings
+            if request.method == 'HEAD':
+                # Length of what a GET with these headers would send
+                size = self.storage.stored_size(cid)
+                if size is not None and size[1] and not deflate:
+                    size = self.storage.chunk_length(cid), False
+                if size is None or size[0] is None:
+                    return jsonify({'error': 'Chunk not found'}), 404
+                headers = {'Content-Length': str(size[0])}
+                if size[1]:
+                    headers.update({'Content-Encoding': CONTENT_ENCODING, 'Vary': 'Accept-Encoding'})
+                return Response(mimetype='application/octet-stream', headers=headers)
+            stored = self.storage.read_stored(cid) if deflate else None
+            if stored is not None and stored[1]:
+                return Response(stored[0], mimetype='application/octet-stream', headers={
+                    'Content-Encoding': CONTENT_ENCODING,
+                    'Vary': 'Accept-Encoding'
+                })
+            data = stored[0] if stored is not None else self.storage.read_chunk(cid)
+            if data is None:
+                return jsonify({'error': 'Chunk not found'}), 404
+            return Response(data, mimetype='application/octet-stream')
+
+        @self.app.route('/api/chunks/missing', methods=['POST'])
+        def missing_chunks():
+            """Given {"cids": [...]}, return the ones this node does not have"""
+            try:
+                cids = request.get_json()['cids']
+                # accept_packed: compressed blocks may be sent as flagged frames
+                return jsonify({'missing': self.storage.missing_chunks(cids), 'accept_packed': True})
+            except Exception as e:
+                return jsonify({'error': str(e)}), 400
+
+        @self.app.route('/api/chunks/<cid>', methods=['PUT'])
+        def put_chunk(cid):
+            """Receive a raw chunk body and stream it straight to disk"""
+            try:
+                if self.storage.store_chunk_stream(cid, self._iter_request_body()):
+                    print(f"Saved new chunk: {cid[:8]}...")
+                return jsonify({'status': 'ok'})
+            except IntegrityError as e:
+                return jsonify({'error': str(e)}), 400
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
 
-        @self.app.route('/api/manifests/<cid>', methods=['GET'])
+        @self.app.route('/api/chunks/batch', methods=['POST'])
+        def receive_chunk_batch():
+            """Receive several chunks encoded as binary frames (see transfer.py)"""
+            try:
+                stored = rejected = 0
+                flagged = request.mimetype == FLAGGED_CONTENT_TYPE
+                for cid, length, reader, flags in iter_frames(request.stream, flagged=flagged):
+                    try:
+                        if self.storage.store_chunk_stream(cid, iter(reader, b''),
+                                                           packed=bool(flags & FLAG_PACKED)):
+                            stored += 1
+                    except IntegrityError as e:
+                        print(f"Rejected batch chunk: {e}")
+                        rejected += 1
+                if stored:
+                    print(f"Saved {stored} new chunks from batch")
+                return jsonify({'status': 'ok', 'stored': stored, 'rejected': rejected})
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/manifests/<cid>', methods=['PUT'])
+        def put_manifest(cid):
+            try:
+                if self.storage.store_manifest_stream(cid, self._iter_request_body()):
+                    print(f"Saved new manifest: {cid[:8]}...")
+                return jsonify({'status': 'ok'})
+            except ValueError as e:
+                # Not a manifest, or not the one cid names
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/manifests/<cid>', methods=['GET', 'HEAD'])
         def get_manifest(cid):
             try:
-                manifest_path = os.path.join(self.storage.storage_path, cid)
-                if os.path.exists(manifest_path):
-                    with open(manifest_path, 'rb') as f:
-                        return f.read(), 200, {'Content-Type': 'application/octet-stream'}
+                manifest_data = self.storage.read_chunk(cid)
+                if manifest_data is not None:
+                    return manifest_data, 200, {'Content-Type': 'application/octet-stream'}
+                elif request.method == 'HEAD':
+                    # Existence probe only, don't go fetching from peers
+                    return jsonify({'error': 'Manifest not found'}), 404
                 else:
                     manifest_data = self.network.get_manifest_from_peers(cid)
                     if manifest_data:
-                        with open(manifest_path, 'wb') as f:
-                            f.write(manifest_data)
+                        self.storage.store_manifest(cid, manifest_data)
                         return manifest_data, 200, {'Content-Type': 'application/octet-stream'}
                     return jsonify({'error': 'Manifest not found'}), 404
             except Exception as e:
@@ -252,17 +434,17 @@ class API:
             @self.app.route('/api/peers/detailed', methods=['GET'])
             def detailed_peers():
                 peers = []
-                for url, info in self.network.peers.items():
+                for peer in self.network.peers.records():
                     peers.append({
-                        'url': url,
-                        'node_id': info.get('id'),
-                        'node_name': info.get('name'),
-                        'first_seen': datetime.fromtimestamp(info.get('first_seen', 0)).isoformat(),
-                        'last_seen': datetime.fromtimestamp(info.get('last_seen', 0)).isoformat(),
-                        'status': 'active' if time.time() - info.get('last_seen', 0) < 60 else 'inactive',
-                        'connection_duration': time.time() - info.get('first_seen', time.time()),
-                        'chunks_shared': info.get('chunks_shared', 0),  # You'd need to track this
-                        'manifests_shared': info.get('manifests_shared', 0)  # You'd need to track this
+                        'url': peer.url,
+                        'node_id': peer.id,
+                        'node_name': peer.name,
+                        'first_seen': datetime.fromtimestamp(peer.first_seen).isoformat(),
+                        'last_seen': datetime.fromtimestamp(peer.last_seen).isoformat(),
+                        'status': 'active' if time.time() - peer.last_seen < 60 else 'inactive',
+                        'connection_duration': time.time() - peer.first_seen,
+                        'chunks_shared': 0,  # You'd need to track this
+                        'manifests_shared': 0  # You'd need to track this
                     })
                 return jsonify(sorted(peers, key=lambda x: x['last_seen'], reverse=True))
             
@@ -272,12 +454,12 @@ class API:
         def dashboard():
             # Get peer information
             peers = []
-            for url, info in self.network.peers.items():
+            for peer in self.network.peers.records():
                 peers.append({
-                    'url': url,
-                    'name': info.get('name'),
-                    'status': 'active' if time.time() - info.get('last_seen', 0) < 60 else 'inactive',
-                    'last_seen': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info.get('last_seen', 0)))
+                    'url': peer.url,
+                    'name': peer.name,
+                    'status': 'active' if time.time() - peer.last_seen < 60 else 'inactive',
+                    'last_seen': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(peer.last_seen))
                 })
             
             # Get local node info
@@ -330,6 +512,68 @@ class API:
             </body>
             </html>
             """
+    def _file_response(self, cid, layout, fetch, fetch_missing=None):
+        """Stream a file, honouring a single-range Range header.
+
+        fetch(start, end) must yield bytes [start, end) of the file described
+        by layout (a FileLayout); without known sizes the whole file is sent
+        and ranges are ignored. The root CID is a strong ETag since the content
+        can never change. fetch_missing marks a locally stored file, which is
+        sent from the chunk files directly; it is called to pull in any chunk
+        that isn't stored here. The first block of fetch() is produced before
+        the response starts, so a file that can't be sourced at all fails
+        with an error status; a later failure cuts the response short of its
+        Content-Length.
+        """
+        etag = f'"{cid}"'
+        headers = {
+            'Content-Disposition': f'attachment; filename="{layout.filename}"',
+            'ETag': etag,
+            'Cache-Control': 'public, max-age=31536000, immutable'
+        }
+        # Weak comparison, as RFC 7232 asks for If-None-Match; handles lists and *
+        if request.if_none_match.contains_weak(cid):
+            return Response(status=304, headers=headers)
+        total = layout.size
+        if total is None:
+            return Response(self._primed(fetch(0, None)), mimetype='application/octet-stream', headers=headers)
+
+        headers['Accept-Ranges'] = 'bytes'
+        byte_range = request.range
+        if_range = request.headers.get('If-Range')
+        if byte_range is None or len(byte_range.ranges) != 1 or (if_range and if_range != etag):
+            start, end, status = 0, total, 200
+        else:
+            start, end = byte_range.ranges[0]
+            if start < 0:
+                # Suffix range; one longer than the file means all of it (RFC 7233 2.1)
+                start, end = max(total + start, 0), total
+            end = total if end is None else min(end, total)
+            if start >= end:
+                headers['Content-Range'] = f'bytes */{total}'
+                return Response(status=416, headers=headers)
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{total}'
+        headers['Content-Length'] = str(end - start)
+
+        if self.sendfile and fetch_missing is not None:
+            body = ChunkFileStream(self.storage, layout.extents(start, end),
+                                   client_socket(request.environ), fetch_missing=fetch_missing)
+        else:
+            body = self._primed(fetch(start, end))
+        return Response(body, status=status, mimetype='application/octet-stream', headers=headers)
+
+    @staticmethod
+    def _primed(blocks):
+        """blocks with its first item already produced (errors surface here, not mid-response)"""
+        blocks = iter(blocks)
+        first = next(blocks, None)
+        return blocks if first is None else chain([first], blocks)
+
+    def _iter_request_body(self, block_size=65536):
+        """Yield the raw request body in blocks without buffering it all"""
+        return iter(lambda: request.stream.read(block_size), b'')
+
     def run(self):
         self.app.run(
             host='0.0.0.0',
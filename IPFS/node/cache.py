@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict
+
+
+class ChunkCache:
+    """Bounded in-memory cache of chunk bytes, keyed by CID.
+
+    Chunks are immutable, so entries never go stale; they only need evicting.
+    Subclasses decide what to evict. Capacity is in bytes of cached data.
+    """
+
+    def __init__(self, capacity_bytes, max_item_bytes=None):
+        self.capacity = capacity_bytes
+        self.max_item_bytes = max_item_bytes or capacity_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the cache described by config['cache'], or NullCache if disabled"""
+        settings = config.get('cache', {})
+        capacity = settings.get('capacity_bytes', 256 * 1024 * 1024)
+        policy = settings.get('policy', 'lru')
+        if not capacity or policy == 'none':
+            return NullCache()
+        policies = {'lru': LRUCache, 'arc': ARCCache}
+        if policy not in policies:
+            raise ValueError(f"Unknown cache policy: {policy}")
+        return policies[policy](capacity, settings.get('max_item_bytes'))
+
+    def get(self, cid):
+        with self._lock:
+            data = self._get(cid)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return data
+
+    def put(self, cid, data):
+        if len(data) > self.max_item_bytes:
+            return
+        with self._lock:
+            self._put(cid, data)
+
+    def discard(self, cid):
+        with self._lock:
+            self._discard(cid)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'policy': self.policy,
+                'capacity_bytes': self.capacity,
+                'bytes': self.size,
+                'entries': self._entries(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+class NullCache(ChunkCache):
+    """Caching switched off; every lookup is a miss"""
+
+    policy = 'none'
+
+    def __init__(self):
+        super().__init__(0)
+
+    def _get(self, cid):
+        return None
+
+    def put(self, cid, data):
+        pass
+
+    def _discard(self, cid):
+        pass
+
+    def _entries(self):
+        return 0
+
+
+class LRUCache(ChunkCache):
+    """Evicts the least recently used chunk first"""
+
+    policy = 'lru'
+
+    def __init__(self, capacity_bytes, max_item_bytes=None):
+        super().__init__(capacity_bytes, max_item_bytes)
+        self._items = OrderedDict()
+
+    def _get(self, cid):
+        data = self._items.get(cid)
+        if data is not None:
+            self._items.move_to_end(cid)
+        return data
+
+    def _put(self, cid, data):
+        if cid in self._items:
+            self._items.move_to_end(cid)
+            return
+        self._items[cid] = data
+        self.size += len(data)
+        while self.size > self.capacity:
+            _, old = self._items.popitem(last=False)
+            self.size -= len(old)
+            self.evictions += 1
+
+    def _discard(self, cid):
+        data = self._items.pop(cid, None)
+        if data is not None:
+            self.size -= len(data)
+
+    def _entries(self):
+        return len(self._items)
+
+
+class ARCCache(ChunkCache):
+    """Adaptive Replacement Cache (Megiddo & Modha), sized in bytes.
+
+    t1 holds chunks seen once recently, t2 chunks seen at least twice. b1 and
+    b2 remember the CIDs (not the data) recently evicted from each. A hit in a
+    ghost list shifts the target size p of t1, so a one-off scan through many
+    chunks can't flush the frequently requested ones.
+    """
+
+    policy = 'arc'
+
+    def __init__(self, capacity_bytes, max_item_bytes=None):
+        super().__init__(capacity_bytes, max_item_bytes)
+        self.p = 0
+        self._t1, self._t2 = OrderedDict(), OrderedDict()
+        self._b1, self._b2 = OrderedDict(), OrderedDict()  # cid -> size
+        self._t1_bytes = self._t2_bytes = self._b1_bytes = self._b2_bytes = 0
+
+    def _get(self, cid):
+        data = self._t1.pop(cid, None)
+        if data is not None:
+            self._t1_bytes -= len(data)
+            self._t2[cid] = data
+            self._t2_bytes += len(data)
+            return data
+        data = self._t2.get(cid)
+        if data is not None:
+            self._t2.move_to_end(cid)
+        return data
+
+    def _put(self, cid, data):
+        if cid in self._t1 or cid in self._t2:
+            return
+        size = len(data)
+        if cid in self._b1:
+            # Evicted from t1 too early: give recency more room
+            self.p = min(self.capacity, self.p + max(self._b2_bytes / max(self._b1_bytes, 1), 1) * size)
+            self._b1_bytes -= self._b1.pop(cid)
+            self._t2[cid] = data
+            self._t2_bytes += size
+            self._make_room(in_b2=False)
+        elif cid in self._b2:
+            # Evicted from t2 too early: give frequency more room
+            self.p = max(0, self.p - max(self._b1_bytes / max(self._b2_bytes, 1), 1) * size)
+            self._b2_bytes -= self._b2.pop(cid)
+            self._t2[cid] = data
+            self._t2_bytes += size
+            self._make_room(in_b2=True)
+        else:
+            self._t1[cid] = data
+            self._t1_bytes += size
+            self._make_room(in_b2=False)
+        self.size = self._t1_bytes + self._t2_bytes
+        self._trim_ghosts()
+
+    def _make_room(self, in_b2):
+        while self._t1_bytes + self._t2_bytes > self.capacity:
+            if self._t1 and (self._t1_bytes > self.p or (in_b2 and self._t1_bytes >= self.p) or not self._t2):
+                cid, data = self._t1.popitem(last=False)
+                self._t1_bytes -= len(data)
+                self._b1[cid] = len(data)
+                self._b1_bytes += len(data)
+            else:
+                cid, data = self._t2.popitem(last=False)
+                self._t2_bytes -= len(data)
+                self._b2[cid] = len(data)
+                self._b2_bytes += len(data)
+            self.evictions += 1
+
+    def _trim_ghosts(self):
+        while self._b1 and self._t1_bytes + self._b1_bytes > self.capacity:
+            self._b1_bytes -= self._b1.popitem(last=False)[1]
+        while self._b2 and self.size + self._b1_bytes + self._b2_bytes > 2 * self.capacity:
+            self._b2_bytes -= self._b2.popitem(last=False)[1]
+
+    def _discard(self, cid):
+        for items, attr in ((self._t1, '_t1_bytes'), (self._t2, '_t2_bytes')):
+            data = items.pop(cid, None)
+            if data is not None:
+                setattr(self, attr, getattr(self, attr) - len(data))
+        self.size = self._t1_bytes + self._t2_bytes
+
+    def _entries(self):
+        return len(self._t1) + len(self._t2)
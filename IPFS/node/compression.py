@@ -0,0 +1,88 @@
+import zlib
+
+# A block stored compressed is written as <cid>.z instead of <cid>, so the
+# flag lives in the file name and uncompressed blocks are untouched (and
+# still go out through sendfile). zlib data is what HTTP calls "deflate".
+PACKED_SUFFIX = '.z'
+CONTENT_ENCODING = 'deflate'
+
+
+def is_packed(path):
+    return path.endswith(PACKED_SUFFIX)
+
+
+def unpack(data):
+    return zlib.decompress(data)
+
+
+class BlockCodec:
+    """Optional zlib compression of blocks in the blockstore.
+
+    CIDs are always computed over the uncompressed bytes. A block is only
+    kept compressed if that saves at least min_saving of its size, so media
+    and other already-compressed data is stored (and served) as is. Such
+    blocks are usually spotted from their first probe_size bytes, without
+    compressing the rest.
+    """
+
+    CODECS = ('none', 'zlib')
+
+    def __init__(self, codec='none', level=1, min_saving=0.1, probe_size=16384):
+        if codec not in self.CODECS:
+            raise ValueError(f"Unknown compression codec: {codec}")
+        self.enabled = codec != 'none'
+        self.level = level
+        self.min_saving = min_saving
+        self.probe_size = probe_size
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('compression', {})
+        return cls(
+            settings.get('codec', 'none'),
+            level=settings.get('level', 1),
+            min_saving=settings.get('min_saving', 0.1),
+            probe_size=settings.get('probe_size', 16384)
+        )
+
+    def packer(self):
+        """A Packer for one block, or None if compression is off"""
+        return Packer(self.level, self.min_saving, self.probe_size) if self.enabled else None
+
+
+class Packer:
+    """Compresses one block fed in pieces; finish() says whether it was worth it"""
+
+    def __init__(self, level, min_saving, probe_size=0):
+        self.min_saving = min_saving
+        self.probe_size = probe_size
+        self._compressor = zlib.compressobj(level)
+        self._parts = []
+        self._raw = 0
+        self._packed = 0
+        self._hopeless = False
+
+    def update(self, data):
+        if self._hopeless:
+            return
+        if self._raw == 0 and len(data) >= 2 * self.probe_size > 0:
+            # The head of the block compresses about as well as the rest
+            probe = zlib.compress(data[:self.probe_size], 1)
+            if len(probe) > self.probe_size * (1 - self.min_saving / 2):
+                self._hopeless = True
+                return
+        self._raw += len(data)
+        part = self._compressor.compress(data)
+        if part:
+            self._parts.append(part)
+            self._packed += len(part)
+
+    def finish(self):
+        """The compressed block, or None if it doesn't shrink by min_saving"""
+        if self._hopeless:
+            return None
+        tail = self._compressor.flush()
+        if self._packed + len(tail) > self._raw * (1 - self.min_saving):
+            return None
+        self._parts.append(tail)
+        return b''.join(self._parts)
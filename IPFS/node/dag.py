@@ -0,0 +1,170 @@
+import json
+from bisect import bisect_right
+from itertools import accumulate
+
+from .utils import generate_cid
+
+# Tree nodes are written with 'links' first, like flat manifests with
+# 'chunks' first, so the layout migration can spot both by their prefix
+TREE_PREFIX = b'{"links"'
+
+
+class ManifestBuilder:
+    """Builds a file's manifest from its chunks, one chunk at a time.
+
+    Files with up to fanout chunks get the flat manifest older nodes read:
+    {"chunks": [...], "sizes": [...], "filename": ...}. Bigger files get a
+    Merkle tree: each internal node lists up to fanout child CIDs with the
+    number of file bytes under each ({"links", "sizes", "depth"}), and is
+    stored as a block through store_node(cid, data). The root adds "size"
+    and "filename". Only one pending node per level is held in memory, and
+    the same chunks always give the same tree, so identical files still
+    share a root CID.
+    """
+
+    def __init__(self, store_node, fanout=1024):
+        if fanout < 2:
+            raise ValueError("Manifest fanout must be at least 2")
+        self.store_node = store_node
+        self.fanout = fanout
+        self._levels = [[]]  # per level: pending (cid, size) entries
+
+    def add(self, cid, size):
+        self._push(0, (cid, size))
+
+    def _push(self, level, entry):
+        if level == len(self._levels):
+            self._levels.append([])
+        if len(self._levels[level]) == self.fanout:
+            self._push(level + 1, self._seal(level))
+        self._levels[level].append(entry)
+
+    def _seal(self, level):
+        """Turn the pending entries of level into a stored node; returns its entry"""
+        entries = self._levels[level]
+        self._levels[level] = []
+        node = json.dumps({
+            'links': [cid for cid, _ in entries],
+            'sizes': [size for _, size in entries],
+            'depth': level + 1
+        }).encode('utf-8')
+        cid = generate_cid(node)
+        self.store_node(cid, node)
+        return cid, sum(size for _, size in entries)
+
+    def finish(self, filename, extra=None):
+        """Seal the remaining levels and return the root manifest bytes.
+
+        extra holds optional root fields (like "parity"), written after the
+        required ones.
+        """
+        level = 0
+        while level < len(self._levels) - 1:  # Sealing can add a level on top
+            if self._levels[level]:
+                self._push(level + 1, self._seal(level))
+            level += 1
+        top = len(self._levels) - 1
+        entries = self._levels[top]
+        if top == 0:
+            root = {
+                'chunks': [cid for cid, _ in entries],
+                'sizes': [size for _, size in entries],
+                'filename': filename
+            }
+        else:
+            root = {
+                'links': [cid for cid, _ in entries],
+                'sizes': [size for _, size in entries],
+                'depth': top + 1,
+                'size': sum(size for _, size in entries),
+                'filename': filename
+            }
+        root.update(extra or {})
+        return json.dumps(root).encode('utf-8')
+
+
+class FileLayout:
+    """Read-side view of a root manifest, flat or tree.
+
+    load_node(cid) returns the parsed JSON of an internal tree node; it is
+    only called for the subtrees a read actually touches, so the first byte
+    of any range costs one node per level however large the file is. size is
+    None for old flat manifests that carry no chunk sizes; those can only be
+    read whole.
+    """
+
+    def __init__(self, manifest, load_node=None):
+        self.manifest = manifest
+        self.load_node = load_node
+        self.filename = manifest.get('filename', 'unknown')
+        self.is_tree = 'links' in manifest
+        if self.is_tree:
+            self.size = manifest['size']
+        elif 'sizes' in manifest:
+            self.size = sum(manifest['sizes'])
+        else:
+            self.size = None
+
+    @classmethod
+    def parse(cls, manifest_data, load_node=None):
+        return cls(json.loads(manifest_data.decode('utf-8')), load_node)
+
+    def spans(self, start=0, end=None):
+        """Yield (cid, file offset, size) of each chunk overlapping bytes [start, end)"""
+        if self.size is None:
+            for cid in self.manifest['chunks']:
+                yield cid, None, None
+            return
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return
+        if self.is_tree:
+            yield from self._walk(self.manifest, 0, start, end)
+        else:
+            yield from self._spans(self.manifest['chunks'], self.manifest['sizes'], 0, start, end)
+
+    @staticmethod
+    def _spans(cids, sizes, base, start, end):
+        offsets = list(accumulate(sizes, initial=base))
+        first = max(bisect_right(offsets, start) - 1, 0)
+        for i in range(first, len(cids)):
+            if offsets[i] >= end:
+                break
+            yield cids[i], offsets[i], sizes[i]
+
+    def _walk(self, node, base, start, end):
+        for cid, offset, size in self._spans(node['links'], node['sizes'], base, start, end):
+            if node['depth'] == 1:
+                yield cid, offset, size
+            else:
+                yield from self._walk(self.load_node(cid), offset, start, end)
+
+    def extents(self, start=0, end=None):
+        """Yield (cid, offset, length): the parts of chunks that make up bytes [start, end).
+
+        length is None (the whole chunk) when chunk sizes are unknown.
+        """
+        end = self.size if end is None else end
+        for cid, offset, size in self.spans(start, end):
+            if size is None:
+                yield cid, 0, None
+                continue
+            lo = max(start - offset, 0)
+            hi = min(end - offset, size)
+            yield cid, lo, hi - lo
+
+    def chunk_cids(self):
+        return (cid for cid, _, _ in self.spans())
+
+    def blocks(self):
+        """Yield every block the file is made of: internal tree nodes and chunks"""
+        if self.is_tree:
+            yield from self._blocks(self.manifest)
+        else:
+            yield from self.manifest['chunks']
+
+    def _blocks(self, node):
+        for cid in node['links']:
+            yield cid
+            if node['depth'] > 1:
+                yield from self._blocks(self.load_node(cid))
@@ -0,0 +1,244 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+KEY_BITS = 256
+
+
+def node_key(node_id):
+    """Position of a node (UUID string) in the 256-bit keyspace"""
+    return int(hashlib.sha256(node_id.encode('utf-8')).hexdigest(), 16)
+
+
+def cid_key(cid):
+    """CIDs are already SHA-256 hex digests"""
+    return int(cid, 16)
+
+
+class RoutingTable:
+    """Kademlia k-buckets keyed by XOR distance from our own key"""
+
+    def __init__(self, own_key, k=20, is_alive=None):
+        self.own_key = own_key
+        self.k = k
+        self.is_alive = is_alive or (lambda url: False)
+        self.buckets = [OrderedDict() for _ in range(KEY_BITS)]
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        distance = self.own_key ^ key
+        if distance == 0:
+            return None
+        return self.buckets[distance.bit_length() - 1]
+
+    def add(self, node_id, url):
+        key = node_key(node_id)
+        with self._lock:
+            bucket = self._bucket(key)
+            if bucket is None:
+                return
+            if node_id in bucket:
+                bucket.move_to_end(node_id)
+                bucket[node_id] = (key, url)
+                return
+            if len(bucket) >= self.k:
+                # Kademlia keeps long-lived contacts; only evict a dead one
+                oldest_id, (_, oldest_url) = next(iter(bucket.items()))
+                if self.is_alive(oldest_url):
+                    return
+                del bucket[oldest_id]
+            bucket[node_id] = (key, url)
+
+    def remove(self, node_id):
+        with self._lock:
+            bucket = self._bucket(node_key(node_id))
+            if bucket is not None:
+                bucket.pop(node_id, None)
+
+    def closest(self, key, count):
+        """Return up to count (node_id, url) contacts nearest to key"""
+        with self._lock:
+            contacts = [
+                (entry_key ^ key, node_id, url)
+                for bucket in self.buckets
+                for node_id, (entry_key, url) in bucket.items()
+            ]
+        contacts.sort()
+        return [(node_id, url) for _, node_id, url in contacts[:count]]
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+
+class DHT:
+    """Kademlia-style DHT for provider records (which nodes serve a CID).
+
+    Node positions come from the existing node_id UUIDs. RPCs are plain JSON
+    POSTs to /api/dht/<method>, handled by the handle_* methods below.
+    """
+
+    def __init__(self, network, config):
+        self.network = network
+        settings = config.get('dht', {})
+        self.k = settings.get('k', 20)
+        self.alpha = settings.get('alpha', 3)
+        self.rpc_timeout = settings.get('rpc_timeout', 2)
+        self.provider_ttl = settings.get('provider_ttl', 24 * 3600)
+        self.republish_interval = settings.get('republish_interval', 3600)
+
+        self.own_key = node_key(network.node_id)
+        self.table = RoutingTable(
+            self.own_key,
+            self.k,
+            is_alive=lambda url: url in network.get_active_peers()
+        )
+        self.providers = {}  # cid -> {provider_url: expires}
+        self.provided = set()  # CIDs this node announces
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._republish_loop, daemon=True).start()
+
+    def contact(self):
+        return {'node_id': self.network.node_id, 'url': self.network.api_url}
+
+    def observe(self, contact):
+        """Add a node we heard from to the routing table"""
+        if contact and contact.get('node_id') and contact['node_id'] != self.network.node_id:
+            self.table.add(contact['node_id'], contact['url'])
+
+    def sync_peers(self):
+        """Seed the routing table from the peers Network already knows"""
+        for peer in self.network.peers.records():
+            if peer.id:
+                self.table.add(peer.id, peer.url)
+
+    # --- RPC handlers -----------------------------------------------------
+
+    def handle_find_node(self, payload):
+        self.observe(payload.get('sender'))
+        return {'nodes': self._closest_contacts(int(payload['key'], 16))}
+
+    def handle_find_providers(self, payload):
+        self.observe(payload.get('sender'))
+        cid = payload['key']
+        return {
+            'providers': self.local_providers(cid),
+            'nodes': self._closest_contacts(cid_key(cid))
+        }
+
+    def handle_add_provider(self, payload):
+        sender = payload.get('sender') or {}
+        self.observe(sender)
+        self.add_provider(payload['key'], sender.get('url') or payload['provider'])
+        return {'status': 'ok'}
+
+    # --- Local provider records ------------------------------------------
+
+    def add_provider(self, cid, provider_url):
+        with self._lock:
+            self.providers.setdefault(cid, {})[provider_url] = time.time() + self.provider_ttl
+
+    def local_providers(self, cid):
+        now = time.time()
+        with self._lock:
+            records = self.providers.get(cid, {})
+            return [url for url, expires in records.items() if expires > now]
+
+    def _closest_contacts(self, key):
+        return [
+            {'node_id': node_id, 'url': url}
+            for node_id, url in self.table.closest(key, self.k)
+        ]
+
+    # --- Iterative lookups ------------------------------------------------
+
+    def _rpc(self, url, method, payload):
+        payload = {**payload, 'sender': self.contact()}
+        response = self.network.http.post(f"{url}/api/dht/{method}", json=payload, timeout=self.rpc_timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def lookup(self, key_hex, find_providers=False):
+        """Iterative Kademlia lookup towards key_hex.
+
+        Returns (closest contacts, providers found, hops), where hops is the
+        number of sequential query rounds.
+        """
+        self.sync_peers()
+        key = int(key_hex, 16)
+        shortlist = {node_id: url for node_id, url in self.table.closest(key, self.k)}
+        queried = set()
+        providers = set(self.local_providers(key_hex)) if find_providers else set()
+        method = 'find_providers' if find_providers else 'find_node'
+        hops = 0
+
+        def distance(node_id):
+            return node_key(node_id) ^ key
+
+        with ThreadPoolExecutor(max_workers=self.alpha) as executor:
+            while True:
+                nearest = sorted(shortlist, key=distance)[:self.k]
+                candidates = [n for n in nearest if n not in queried][:self.alpha]
+                if not candidates:
+                    break
+                hops += 1
+                queried.update(candidates)
+
+                def _query(node_id):
+                    try:
+                        return node_id, self._rpc(shortlist[node_id], method, {'key': key_hex})
+                    except Exception:
+                        return node_id, None
+
+                for node_id, result in executor.map(_query, candidates):
+                    if result is None:
+                        shortlist.pop(node_id, None)
+                        self.table.remove(node_id)
+                        continue
+                    self.table.add(node_id, shortlist[node_id])
+                    for contact in result.get('nodes', []):
+                        if contact['node_id'] != self.network.node_id:
+                            shortlist.setdefault(contact['node_id'], contact['url'])
+                    providers.update(result.get('providers', []))
+
+                if find_providers and providers:
+                    break
+
+        nearest = sorted(shortlist, key=distance)[:self.k]
+        return [(node_id, shortlist[node_id]) for node_id in nearest], sorted(providers), hops
+
+    def provide(self, cid):
+        """Announce that this node serves cid to the k nodes closest to it"""
+        self.provided.add(cid)
+        self.add_provider(cid, self.network.api_url)
+        nodes, _, _ = self.lookup(cid)
+        for node_id, url in nodes:
+            try:
+                self._rpc(url, 'add_provider', {'key': cid, 'provider': self.network.api_url})
+            except Exception as e:
+                print(f"Failed to publish provider record to {url}: {e}")
+
+    def find_providers(self, cid):
+        """Return URLs of nodes that announced cid"""
+        _, providers, _ = self.lookup(cid, find_providers=True)
+        return [url for url in providers if url != self.network.api_url]
+
+    def _republish_loop(self):
+        while True:
+            time.sleep(self.republish_interval)
+            now = time.time()
+            with self._lock:
+                for cid in list(self.providers):
+                    self.providers[cid] = {
+                        url: expires for url, expires in self.providers[cid].items() if expires > now
+                    }
+                    if not self.providers[cid]:
+                        del self.providers[cid]
+            for cid in list(self.provided):
+                try:
+                    self.provide(cid)
+                except Exception as e:
+                    print(f"Failed to republish {cid[:8]}: {e}")
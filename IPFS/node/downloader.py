@@ -0,0 +1,295 @@
+import json
+import threading
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from .erasure import ParityIndex
+from .utils import generate_cid
+
+
+class SwarmDownloader:
+    """Fetch a file's chunks from several peers in parallel.
+
+    Chunks are scheduled rarest-first within a sliding window, each one goes to
+    the holder with the lowest latency-weighted load, and every chunk is
+    re-hashed against its CID before it is yielded or stored. Which peers hold
+    what is asked a batch at a time as the download advances, so nothing
+    about the whole file needs to be known up front. Chunks of erasure-coded
+    files that no peer can supply are rebuilt from the rest of their group.
+    """
+
+    def __init__(self, storage, network, max_workers=8, window=32, max_attempts=3, locate_batch=256):
+        self.storage = storage
+        self.network = network
+        self.max_workers = max_workers
+        self.window = window
+        self.max_attempts = max_attempts
+        self.locate_batch = locate_batch
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def fetch_manifest(self, root_cid, peers=None):
+        """Return verified manifest bytes for root_cid, from disk or from peers"""
+        manifest_data = self.storage.read_chunk(root_cid)
+        if manifest_data is None:
+            manifest_data = self.network.get_manifest_from_peers(root_cid, peers)
+            if manifest_data is None or generate_cid(manifest_data) != root_cid:
+                return None
+        return manifest_data
+
+    def node_loader(self, peers):
+        """load_node for a FileLayout: tree nodes from disk, else from their holders (verified, then kept)"""
+        return lambda cid: json.loads(self.fetch_located(cid, peers).decode('utf-8'))
+
+    def fetch_located(self, cid, peers, recover=None, root_cid=None):
+        """fetch_chunk from the peers that say they hold cid (and DHT providers of root_cid)"""
+        if root_cid is None:
+            holders = self._holders([cid], peers)
+        else:
+            holders = self._locate(root_cid, [cid], peers)
+        return self.fetch_chunk(cid, holders.get(cid, []), recover)
+
+    def recovery(self, manifest, peers):
+        """recover(cid) for chunks of an erasure-coded file, or None for other files"""
+        index_cid = manifest.get('parity')
+        if index_cid is None:
+            return None
+        return _Recovery(self, index_cid, peers)
+
+    def locate_chunks(self, chunk_cids, peers):
+        """Map each chunk we lack to the peers holding it (one round trip per peer).
+
+        Returns None if some chunk isn't held by any reachable peer.
+        """
+        holders = self._holders(chunk_cids, peers)
+        if any(not peer_list for peer_list in holders.values()):
+            return None
+        return holders
+
+    def _check_batch(self, root_cid, holders, recover):
+        """Raise FileNotFoundError if a located batch has chunks nobody can supply.
+
+        Chunks of an erasure-coded file (recover given) may have no holder
+        as long as enough of their group is reachable to rebuild them.
+        """
+        unheld = [cid for cid, peer_list in holders.items() if not peer_list]
+        if unheld and (recover is None or not recover.recoverable(unheld)):
+            raise FileNotFoundError(f"{len(unheld)} chunks of {root_cid} are not held by any reachable peer")
+
+    def _holders(self, chunk_cids, peers):
+        needed = [cid for cid in dict.fromkeys(chunk_cids) if not self.storage.has_chunk(cid)]
+        holders = {cid: [] for cid in needed}
+        if not needed:
+            return holders
+
+        def _query(peer_url):
+            try:
+                return peer_url, set(self.network.query_missing_chunks(peer_url, needed))
+            except Exception as e:
+                print(f"Availability query to {peer_url} failed: {e}")
+                return peer_url, None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for peer_url, missing in executor.map(_query, peers):
+                if missing is None:
+                    continue
+                for cid in needed:
+                    if cid not in missing:
+                        holders[cid].append(peer_url)
+        return holders
+
+    def _locate(self, root_cid, chunk_cids, peers):
+        """Holders of the chunks we lack, asking the DHT for more peers if needed.
+
+        Adds providers to peers in place, so later batches ask them too.
+        Chunks nobody has map to an empty list.
+        """
+        holders = self._holders(chunk_cids, peers)
+        if all(holders.values()):
+            return holders
+        extra = [url for url in self.network.find_file_location(root_cid) if url not in peers]
+        if not extra:
+            return holders
+        peers.extend(extra)
+        return self._holders(chunk_cids, peers)
+
+    def download(self, root_cid, manifest_data, extents, peers, register=False, recover=None):
+        """Generator yielding the bytes of extents (cid, offset, length), in order.
+
+        Chunks already on disk are read locally; the rest are fetched from
+        peers, verified and stored. Holders are looked up locate_batch
+        extents at a time as the download advances, and a batch with a chunk
+        nobody can supply raises FileNotFoundError before any of it is
+        yielded. With register=True (the extents cover the whole file) the
+        manifest is registered locally once the last chunk is through, so
+        later requests are served from disk.
+        """
+        extents = iter(extents)
+        peers = list(peers)
+        if recover is None:
+            recover = self.recovery(json.loads(manifest_data.decode('utf-8')), peers)
+        pending = deque()
+        inflight = deque()
+        holders = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while True:
+                # Top the window back up in half-window batches, rarest first
+                if len(inflight) <= self.window // 2:
+                    batch = []
+                    while len(inflight) + len(batch) < self.window:
+                        if not pending:
+                            more = list(islice(extents, self.locate_batch))
+                            if not more:
+                                break
+                            located = self._locate(root_cid, [e[0] for e in more], peers)
+                            self._check_batch(root_cid, located, recover)
+                            holders.update(located)
+                            pending.extend(more)
+                        batch.append(pending.popleft())
+                    futures = {}
+                    for i in sorted(range(len(batch)), key=lambda i: len(holders.get(batch[i][0], ()))):
+                        cid = batch[i][0]
+                        futures[i] = executor.submit(self.fetch_chunk, cid, holders.get(cid, []), recover)
+                    inflight.extend((batch[i], futures[i]) for i in range(len(batch)))
+                if not inflight:
+                    break
+
+                (cid, offset, length), future = inflight.popleft()
+                data = future.result()
+                holders.pop(cid, None)
+                if length is None or (offset == 0 and length == len(data)):
+                    yield data
+                else:
+                    yield data[offset:offset + length]
+        finally:
+            for _, future in inflight:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        if register:
+            self.storage.register_manifest(root_cid, manifest_data)
+
+    def stream_from_peer(self, root_cid, manifest_data, layout, peer_url, start=0, end=None):
+        """Generator yielding bytes [start, end) of the file, cut from one peer's file stream.
+
+        The response is split at the chunk boundaries from the manifest; each
+        chunk is verified and stored as soon as its last byte arrives, so
+        memory stays around one chunk. Like download(), the manifest is
+        registered (not propagated) only when the whole file came through.
+        Manifests without sizes fall back to fetching the chunks one by one.
+        """
+        whole = start == 0 and end in (None, layout.size)
+        if layout.size is None:
+            for cid in layout.chunk_cids():
+                yield self.fetch_chunk(cid, [peer_url])
+        else:
+            spans = layout.spans(start, end)
+            first = next(spans, None)
+            if first is not None:
+                end = layout.size if end is None else end
+                headers = {} if whole else {'Range': f"bytes={first[1]}-"}
+                with self.network.http.get(f"{peer_url}/api/files/{root_cid}",
+                                           headers=headers, stream=True, timeout=10) as response:
+                    if response.status_code not in (200, 206):
+                        raise FileNotFoundError(f"{peer_url} answered {response.status_code} for {root_cid}")
+                    # A peer that ignores Range sends the file from the top
+                    skip = first[1] if headers and response.status_code == 200 else 0
+                    blocks = response.iter_content(chunk_size=65536)
+                    buffer = bytearray()
+                    for cid, offset, size in chain([first], spans):
+                        while len(buffer) < skip + size:
+                            block = next(blocks, None)
+                            if block is None:
+                                raise IOError(f"{peer_url} ended the stream of {root_cid[:8]} early")
+                            buffer += block
+                        if skip:
+                            del buffer[:skip]
+                            skip = 0
+                        data = bytes(buffer[:size])
+                        del buffer[:size]
+                        if generate_cid(data) != cid:
+                            raise IOError(f"Chunk {cid[:8]} from {peer_url} failed verification")
+                        self.storage.store_chunk(cid, data, verified=True)
+                        lo = max(start - offset, 0)
+                        hi = min(end - offset, size)
+                        yield data if (lo, hi) == (0, size) else data[lo:hi]
+
+        if whole:
+            self.storage.register_manifest(root_cid, manifest_data)
+
+    def _peer_cost(self, peer_url):
+        peer = self.network.peers.get(peer_url)
+        latency = (peer and peer.latency) or 1.0
+        return latency * (self._inflight.get(peer_url, 0) + 1)
+
+    def fetch_chunk(self, cid, holders, recover=None):
+        """Return the verified bytes of block cid, from disk or from one of holders.
+
+        If no holder can supply it, recover(cid) is the last resort.
+        """
+        data = self.storage.read_chunk(cid)
+        if data is not None:
+            return data
+
+        tried = set()
+        for _ in range(min(self.max_attempts, len(holders))):
+            with self._lock:
+                candidates = [p for p in holders if p not in tried]
+                if not candidates:
+                    break
+                peer_url = min(candidates, key=self._peer_cost)
+                self._inflight[peer_url] = self._inflight.get(peer_url, 0) + 1
+            tried.add(peer_url)
+            try:
+                response = self.network.http.get(f"{peer_url}/api/chunks/{cid}", timeout=10)
+                if response.status_code != 200:
+                    continue
+                data = response.content
+                if generate_cid(data) != cid:
+                    print(f"Chunk {cid[:8]} from {peer_url} failed verification")
+                    continue
+                self.storage.store_chunk(cid, data, verified=True)
+                return data
+            except requests.exceptions.RequestException:
+                continue
+            finally:
+                with self._lock:
+                    self._inflight[peer_url] -= 1
+        if recover is not None:
+            return recover(cid)
+        raise FileNotFoundError(f"Chunk {cid} not available from any peer")
+
+
+class _Recovery:
+    """recover(cid) for one erasure-coded file: rebuilds a chunk from the rest of its group"""
+
+    def __init__(self, downloader, index_cid, peers):
+        self.downloader = downloader
+        self.index_cid = index_cid
+        self.peers = peers
+        self._parity = None
+
+    def parity(self):
+        if self._parity is None:
+            self._parity = ParityIndex.parse(self.downloader.fetch_located(self.index_cid, self.peers))
+        return self._parity
+
+    def recoverable(self, cids):
+        """True if enough shards (on disk or at peers) are left to rebuild every chunk in cids"""
+        try:
+            parity = self.parity()
+        except FileNotFoundError:
+            return False
+        shards = parity.shard_cids(cids)
+        # Shards we have locally don't appear in holders
+        holders = self.downloader._holders(shards, self.peers)
+        return parity.recoverable(cids, {cid for cid in shards if holders.get(cid, True)})
+
+    def __call__(self, cid):
+        # Each shard sits on one peer, so find it before asking
+        data = self.parity().recover(cid, lambda shard: self.downloader.fetch_located(shard, self.peers))
+        self.downloader.storage.store_chunk(cid, data, verified=True)
+        print(f"Rebuilt chunk {cid[:8]} from parity")
+        return data
@@ -0,0 +1,234 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from .utils import generate_cid
+
+# GF(2^8) arithmetic with the usual 0x11d polynomial
+_EXP = [0] * 510
+_LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    _EXP[_i] = _EXP[_i + 255] = _x
+    _LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11d
+
+
+def _mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _inv(a):
+    return _EXP[255 - _LOG[a]]
+
+
+@lru_cache(maxsize=256)
+def _mul_table(c):
+    """bytes.translate table that multiplies every byte by c"""
+    return bytes(_mul(c, b) for b in range(256))
+
+
+def _combine(coefficients, shards, length):
+    """sum(c * shard) over GF(2^8), byte-wise, for equal-length shards.
+
+    Multiplication is a bytes.translate and addition an XOR of the shards as
+    big integers, so the per-byte work happens in C.
+    """
+    acc = 0
+    for c, shard in zip(coefficients, shards):
+        if c:
+            acc ^= int.from_bytes(shard if c == 1 else shard.translate(_mul_table(c)), 'little')
+    return acc.to_bytes(length, 'little')
+
+
+def _invert(matrix):
+    """Inverse of a square matrix over GF(2^8) (Gauss-Jordan)"""
+    n = len(matrix)
+    rows = [list(row) + [int(i == j) for j in range(n)] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = next(r for r in range(col, n) if rows[r][col])
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        scale = _inv(rows[col][col])
+        rows[col] = [_mul(scale, v) for v in rows[col]]
+        for r in range(n):
+            if r != col and rows[r][col]:
+                factor = rows[r][col]
+                rows[r] = [v ^ _mul(factor, p) for v, p in zip(rows[r], rows[col])]
+    return [row[n:] for row in rows]
+
+
+class ReedSolomon:
+    """Systematic Reed-Solomon code with k data and m parity shards.
+
+    Shards 0..k-1 are the data itself and k..k+m-1 the parity, from a Cauchy
+    matrix, so any k of the k + m shards give back the data.
+    """
+
+    def __init__(self, k, m):
+        if k < 1 or m < 1 or k + m > 256:
+            raise ValueError("Reed-Solomon needs k >= 1, m >= 1 and k + m <= 256")
+        self.k = k
+        self.m = m
+        self.parity_rows = [[_inv((k + i) ^ j) for j in range(k)] for i in range(m)]
+
+    def _row(self, position):
+        if position < self.k:
+            return [int(j == position) for j in range(self.k)]
+        return self.parity_rows[position - self.k]
+
+    def encode(self, shards):
+        """The m parity shards of k data shards (shorter ones are zero-padded)"""
+        length = max(len(shard) for shard in shards)
+        shards = [shard.ljust(length, b'\0') for shard in shards]
+        return [_combine(row, shards, length) for row in self.parity_rows]
+
+    def decode(self, present, length, wanted):
+        """Rebuild data shards from any k shards.
+
+        present maps shard positions to their bytes (data shards may be
+        shorter than length, they are zero-padded); returns {position: bytes}
+        for each data position in wanted, padded to length.
+        """
+        positions = sorted(present)[:self.k]
+        if len(positions) < self.k:
+            raise ValueError(f"Need {self.k} shards to decode, have {len(positions)}")
+        shards = [present[p].ljust(length, b'\0') for p in positions]
+        inverse = _invert([self._row(p) for p in positions])
+        return {w: _combine(inverse[w], shards, length) for w in wanted}
+
+
+class ParityBuilder:
+    """Adds erasure-coded parity to an upload, k chunks at a time.
+
+    Chunks are grouped in file order; each full group (and the last, shorter
+    one) gets m parity blocks, stored through store_block(cid, data). on_group
+    is called with each finished group record:
+    {"chunks": [...], "sizes": [...], "parity": [...]}. finish() returns the
+    parity index, stored as its own block and referenced from the root
+    manifest as "parity".
+    """
+
+    def __init__(self, coder, store_block, on_group=None):
+        self.coder = coder
+        self.store_block = store_block
+        self.on_group = on_group
+        self.groups = []
+        self._pending = []
+
+    def add(self, cid, data):
+        self._pending.append((cid, data))
+        if len(self._pending) == self.coder.k:
+            self._seal()
+
+    def _seal(self):
+        chunks, self._pending = self._pending, []
+        parity_cids = []
+        for parity in self.coder.encode([data for _, data in chunks]):
+            cid = generate_cid(parity)
+            self.store_block(cid, parity)
+            parity_cids.append(cid)
+        group = {
+            'chunks': [cid for cid, _ in chunks],
+            'sizes': [len(data) for _, data in chunks],
+            'parity': parity_cids
+        }
+        self.groups.append(group)
+        if self.on_group:
+            self.on_group(group)
+
+    def finish(self):
+        if self._pending:
+            self._seal()
+        return json.dumps({'k': self.coder.k, 'm': self.coder.m, 'groups': self.groups}).encode('utf-8')
+
+
+def group_shards(group, k):
+    """(position, cid) of every shard of a group; positions past the data are parity"""
+    shards = list(enumerate(group['chunks']))
+    shards += [(k + i, cid) for i, cid in enumerate(group['parity'])]
+    return shards
+
+
+class ParityIndex:
+    """Read side of a parity index: rebuilds chunks nobody can supply"""
+
+    def __init__(self, index):
+        self.coder = ReedSolomon(index['k'], index['m'])
+        self.groups = index['groups']
+        self._by_chunk = None
+
+    @classmethod
+    def parse(cls, data):
+        return cls(json.loads(data.decode('utf-8')))
+
+    def group_of(self, cid):
+        """(group, position) of a data chunk, or None"""
+        if self._by_chunk is None:
+            self._by_chunk = {}
+            for group in self.groups:
+                for position, chunk_cid in enumerate(group['chunks']):
+                    self._by_chunk.setdefault(chunk_cid, (group, position))
+        return self._by_chunk.get(cid)
+
+    def shard_cids(self, cids):
+        """Every shard of the groups the chunks in cids belong to"""
+        shards = set()
+        for cid in cids:
+            found = self.group_of(cid)
+            if found is not None:
+                shards.update(c for _, c in group_shards(found[0], self.coder.k))
+        return shards
+
+    def recoverable(self, cids, available):
+        """True if every chunk in cids has k shards of its group in available (a set of cids)"""
+        k = self.coder.k
+        for cid in cids:
+            found = self.group_of(cid)
+            if found is None:
+                return False
+            group = found[0]
+            present = k - len(group['chunks']) + sum(1 for _, c in group_shards(group, k) if c in available)
+            if present < k:
+                return False
+        return True
+
+    def recover(self, cid, fetch_block):
+        """Rebuild chunk cid from k other shards of its group.
+
+        fetch_block(cid) returns verified block bytes or raises
+        FileNotFoundError. Shards are fetched k at a time in parallel, data
+        shards first, until k have arrived.
+        """
+        found = self.group_of(cid)
+        if found is None:
+            raise FileNotFoundError(f"Chunk {cid} is not in the parity index")
+        group, target = found
+        k = self.coder.k
+        # A short last group is padded with empty data shards
+        present = {position: b'' for position in range(len(group['chunks']), k)}
+        candidates = [(p, c) for p, c in group_shards(group, k) if p != target and c != cid]
+
+        def _fetch(shard):
+            try:
+                return fetch_block(shard[1])
+            except FileNotFoundError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=k) as pool:
+            while len(present) < k and candidates:
+                batch, candidates = candidates[:k - len(present)], candidates[k - len(present):]
+                for (position, _), data in zip(batch, pool.map(_fetch, batch)):
+                    if data is not None:
+                        present[position] = data
+        if len(present) < k:
+            raise FileNotFoundError(f"Chunk {cid} lost: only {len(present)} of {k} shards of its group left")
+
+        length = max(group['sizes'])
+        data = self.coder.decode(present, length, [target])[target][:group['sizes'][target]]
+        if generate_cid(data) != cid:
+            raise IOError(f"Chunk {cid[:8]} rebuilt from parity does not match its CID")
+        return data
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import random
+import socket
+import struct
+
+
+class MulticastProtocol(asyncio.DatagramProtocol):
+    def __init__(self, gossip):
+        self.gossip = gossip
+
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data.decode('utf-8'))
+        except ValueError:
+            return
+        if message.get('type') == 'announce':
+            self.gossip.learn(message.get('node_id'), message.get('url'))
+
+
+class PeerGossip:
+    """LAN discovery by UDP multicast announcements plus push-pull peer list gossip.
+
+    Every node multicasts a small announcement every announce_interval, and
+    every gossip_interval swaps its list of active peers with a few random
+    peers over POST /api/peers/gossip. New URLs learned either way are checked
+    with connect_to_peer before they are added, so traffic grows with the
+    number of peers rather than the size of the subnet.
+    """
+
+    def __init__(self, network, config):
+        self.network = network
+        settings = config.get('discovery', {})
+        self.group = settings.get('multicast_group', '239.255.44.53')
+        self.multicast_port = settings.get('multicast_port', 5454)
+        self.announce_interval = settings.get('announce_interval', 5)
+        self.gossip_interval = settings.get('gossip_interval', 2)
+        self.fanout = settings.get('gossip_fanout', 3)
+        self._transport = None
+        self._pending = set()
+
+    def start(self):
+        self.network.core.submit(self._announce_loop())
+        # Heartbeats already carry the member list, so skip the separate rounds
+        if not self.network.membership.enabled:
+            self.network.core.submit(self._gossip_loop())
+
+    def digest(self):
+        """This node plus every active peer, as sent in gossip exchanges"""
+        entries = [{'url': self.network.api_url, 'id': self.network.node_id}]
+        for url in self.network.get_active_peers():
+            peer = self.network.peers.get(url)
+            entries.append({'url': url, 'id': peer.id if peer else None})
+        return entries
+
+    def learn(self, node_id, url):
+        """Connect to a peer we heard about, unless it is us or already known"""
+        if not url or url == self.network.api_url or node_id == self.network.node_id:
+            return
+        if url in self.network.peers or url in self._pending:
+            return
+        self._pending.add(url)
+        self.network.core.submit(self._connect(url))
+
+    async def _connect(self, url):
+        try:
+            await self.network.connect_to_peer_async(url, quiet=True)
+        finally:
+            self._pending.discard(url)
+
+    def handle_exchange(self, payload):
+        """Server side of a gossip round: merge the sender's list, return ours"""
+        sender = payload.get('sender') or {}
+        if not self.network.peers.touch(sender.get('url')):
+            self.learn(sender.get('id'), sender.get('url'))
+        for entry in payload.get('peers', []):
+            self.learn(entry.get('id'), entry.get('url'))
+        return {'peers': self.digest()}
+
+    # --- Multicast announcements ------------------------------------------
+
+    def _open_multicast(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('', self.multicast_port))
+        membership = struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton('0.0.0.0'))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        # Stay on the LAN, and hear other nodes on this host too
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        sock.setblocking(False)
+        return sock
+
+    async def _announce_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: MulticastProtocol(self), sock=self._open_multicast()
+            )
+        except OSError as e:
+            print(f"Multicast discovery unavailable, using gossip only: {e}")
+            return
+
+        announcement = json.dumps({
+            'type': 'announce',
+            'node_id': self.network.node_id,
+            'url': self.network.api_url
+        }).encode('utf-8')
+        while True:
+            try:
+                self._transport.sendto(announcement, (self.group, self.multicast_port))
+            except OSError as e:
+                print(f"Multicast announcement failed: {e}")
+            await asyncio.sleep(self.announce_interval)
+
+    # --- Gossip rounds ----------------------------------------------------
+
+    async def _gossip_loop(self):
+        while True:
+            active = self.network.get_active_peers()
+            targets = random.sample(active, min(self.fanout, len(active)))
+            await self.network.core.bounded_gather(self._exchange(url) for url in targets)
+            await asyncio.sleep(self.gossip_interval)
+
+    async def _exchange(self, peer_url):
+        """Push our peer list to peer_url and merge the list it sends back"""
+        payload = {
+            'sender': {'url': self.network.api_url, 'id': self.network.node_id},
+            'peers': self.digest()
+        }
+        try:
+            response = await self.network.core.post_json(f"{peer_url}/api/peers/gossip", payload, timeout=3)
+        except Exception as e:
+            print(f"Gossip with {peer_url} failed: {e!r}")
+            return
+        for entry in (response or {}).get('peers', []):
+            self.learn(entry.get('id'), entry.get('url'))
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PeerSessions:
+    """Keep-alive HTTP sessions, one per peer, shared by everything that talks to peers.
+
+    Each peer gets a requests.Session with its own connection pool, so repeated
+    calls reuse a few sockets instead of doing a TCP handshake every time. The
+    number of cached sessions is bounded (least recently used is closed first)
+    so subnet scans don't pile up pools for hosts that never answer.
+    """
+
+    def __init__(self, config):
+        settings = config.get('http', {})
+        self.pool_maxsize = settings.get('pool_maxsize', 8)
+        self.max_peers = settings.get('max_peers', 256)
+        self.timeout = (settings.get('connect_timeout', 3), settings.get('read_timeout', 10))
+        self._sessions = OrderedDict()
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def _peer_key(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, url):
+        """Return the pooled session for the peer that url points at"""
+        key = self._peer_key(url)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                return session
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._sessions[key] = session
+            while len(self._sessions) > self.max_peers:
+                old_key, old = self._sessions.popitem(last=False)
+                self._requests.pop(old_key, None)
+                old.close()
+            return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.session(url)
+        key = self._peer_key(url)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+        return session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def stats(self):
+        """Requests vs new connections per peer, to see how well sockets are reused"""
+        with self._lock:
+            sessions = list(self._sessions.items())
+            requests_made = dict(self._requests)
+
+        peers = {}
+        for key, session in sessions:
+            # Every pool in this session's manager belongs to the same peer
+            pools = session.get_adapter(key).poolmanager.pools
+            connections = sum(pools[pool_key].num_connections for pool_key in pools.keys())
+            count = requests_made.get(key, 0)
+            peers[key] = {
+                'requests': count,
+                'connections': connections,
+                'reuse_ratio': 1 - connections / count if count else 0.0
+            }
+        total_requests = sum(p['requests'] for p in peers.values())
+        total_connections = sum(p['connections'] for p in peers.values())
+        return {
+            'requests': total_requests,
+            'connections': total_connections,
+            'reuse_ratio': 1 - total_connections / total_requests if total_requests else 0.0,
+            'peers': peers
+        }
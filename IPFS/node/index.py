@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """Base for the node's SQLite (WAL mode) databases.
+
+    Each thread gets its own connection, and batch() groups writes into a
+    transaction. SYNCHRONOUS is the sync level: NORMAL can lose the last
+    commits (never corrupt the database) on power loss.
+    """
+
+    SCHEMA = ()
+    SYNCHRONOUS = 'NORMAL'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.SYNCHRONOUS}')
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def batch(self):
+        """Group several updates into one transaction (nesting is allowed)"""
+        conn = self._conn()
+        if self._local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+        self._local.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('ROLLBACK')
+            raise
+        else:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('COMMIT')
+
+
+class LocationIndex(SQLiteStore):
+    """Index of file and chunk locations plus the manifest catalogue.
+
+    Replaces file_locations.json / chunk_locations.json. Writes are single-row
+    upserts, so cost does not grow with the size of the index.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS file_locations (
+            cid TEXT NOT NULL,
+            peer_url TEXT NOT NULL,
+            PRIMARY KEY (cid, peer_url)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chunk_locations (
+            chunk_cid TEXT NOT NULL,
+            root_cid TEXT NOT NULL,
+            PRIMARY KEY (chunk_cid, root_cid)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS manifests (
+            cid TEXT PRIMARY KEY,
+            filename TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS erasure_shards (
+            cid TEXT PRIMARY KEY,
+            group_key TEXT NOT NULL,
+            position INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    )
+
+    def add_file_location(self, cid, peer_url):
+        self.add_file_locations([(cid, peer_url)])
+
+    def add_file_locations(self, pairs):
+        """Record (cid, peer_url) pairs"""
+        with self.batch():
+            self._conn().executemany(
+                'INSERT OR IGNORE INTO file_locations (cid, peer_url) VALUES (?, ?)',
+                pairs
+            )
+
+    def get_file_locations(self, cid):
+        rows = self._conn().execute(
+            'SELECT peer_url FROM file_locations WHERE cid = ?', (cid,)
+        )
+        return [row[0] for row in rows]
+
+    def get_files_at(self, peer_url):
+        """Return the CIDs recorded as held by peer_url"""
+        rows = self._conn().execute(
+            'SELECT cid FROM file_locations WHERE peer_url = ?', (peer_url,)
+        )
+        return [row[0] for row in rows]
+
+    def add_chunk_locations(self, root_cid, chunk_cids):
+        """Record that each chunk in chunk_cids belongs to root_cid"""
+        with self.batch():
+            self._conn().executemany(
+                'INSERT OR IGNORE INTO chunk_locations (chunk_cid, root_cid) VALUES (?, ?)',
+                ((cid, root_cid) for cid in chunk_cids)
+            )
+
+    def get_chunk_roots(self, chunk_cid):
+        """Return the root CIDs of files that contain chunk_cid"""
+        rows = self._conn().execute(
+            'SELECT root_cid FROM chunk_locations WHERE chunk_cid = ?', (chunk_cid,)
+        )
+        return [row[0] for row in rows]
+
+    def add_shards(self, group_key, shards):
+        """Record the (position, cid) shards of an erasure-coded group.
+
+        A block already in another group keeps its first placement.
+        """
+        with self.batch():
+            self._conn().executemany(
+                'INSERT OR IGNORE INTO erasure_shards (cid, group_key, position) VALUES (?, ?, ?)',
+                ((cid, group_key, position) for position, cid in shards)
+            )
+
+    def get_shard(self, cid):
+        """(group_key, position) if cid is a shard of an erasure-coded group, else None"""
+        return self._conn().execute(
+            'SELECT group_key, position FROM erasure_shards WHERE cid = ?', (cid,)
+        ).fetchone()
+
+    def add_manifest(self, cid, filename):
+        """Add a manifest to the file catalogue"""
+        self._conn().execute(
+            'INSERT OR REPLACE INTO manifests (cid, filename) VALUES (?, ?)',
+            (cid, filename)
+        )
+
+    def list_manifests(self):
+        """Return (cid, filename) for every catalogued manifest"""
+        return self._conn().execute('SELECT cid, filename FROM manifests').fetchall()
+
+    def migrate_json(self, file_locations_path, chunk_locations_path):
+        """One-time import of the old JSON indexes.
+
+        Each file is renamed to <name>.migrated afterwards so it is not
+        imported again.
+        """
+        with self.batch():
+            if os.path.exists(file_locations_path):
+                with open(file_locations_path, 'r') as f:
+                    locations = json.load(f)
+                self.add_file_locations(
+                    (cid, url) for cid, urls in locations.items() for url in urls
+                )
+            if os.path.exists(chunk_locations_path):
+                with open(chunk_locations_path, 'r') as f:
+                    locations = json.load(f)
+                self._conn().executemany(
+                    'INSERT OR IGNORE INTO chunk_locations (chunk_cid, root_cid) VALUES (?, ?)',
+                    ((cid, root) for cid, roots in locations.items() for root in roots)
+                )
+
+        for path in (file_locations_path, chunk_locations_path):
+            if os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+                print(f"Migrated {os.path.basename(path)} into the location index")
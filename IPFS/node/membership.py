@@ -0,0 +1,171 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+
+from .aio import AsyncHTTPError
+
+
+class PhiAccrualDetector:
+    """Phi accrual failure detector over heartbeat inter-arrival times.
+
+    phi is -log10 of the probability that a heartbeat this late would still
+    arrive, assuming normally distributed intervals. phi 8 means roughly a
+    one-in-10^8 chance that the peer is actually alive.
+    """
+
+    def __init__(self, window=100, min_std=0.5):
+        self.intervals = deque(maxlen=window)
+        self.min_std = min_std
+        self.last = None
+
+    def heartbeat(self, now):
+        if self.last is not None:
+            self.intervals.append(now - self.last)
+        self.last = now
+
+    def phi(self, now):
+        if self.last is None or not self.intervals:
+            return 0.0
+        mean = sum(self.intervals) / len(self.intervals)
+        variance = sum((i - mean) ** 2 for i in self.intervals) / len(self.intervals)
+        std = max(math.sqrt(variance), self.min_std)
+        y = (now - self.last - mean) / std
+        # Logistic approximation of the normal CDF, as used by Cassandra/Akka:
+        # phi = -log10(e / (1 + e)) with e = exp(-x), rearranged so e can't
+        # underflow for a long-silent peer or overflow right after a heartbeat
+        x = y * (1.5976 + 0.070566 * y * y)
+        if y > 0:
+            return x / math.log(10) + math.log10(1.0 + math.exp(-x))
+        return math.log10(1.0 + math.exp(x))
+
+
+class Membership:
+    """Push-based liveness: gossip-style heartbeats with a phi accrual detector.
+
+    Each node bumps its own heartbeat counter every heartbeat_interval and
+    pushes its table of (incarnation, heartbeat) counters to heartbeat_fanout
+    random peers, which answer with theirs. A peer counts as seen whenever its
+    counter goes up, whoever relayed it, so the cluster sends O(N) messages per
+    interval rather than every node pinging every other. Unknown members in a
+    table are handed to discovery, and peers whose phi passes phi_threshold are
+    dropped. Nodes that don't serve /api/peers/heartbeat are pinged directly.
+    """
+
+    # Weight of a new sample in the smoothed RTT, as in TCP's SRTT
+    RTT_GAIN = 0.125
+
+    def __init__(self, network, config):
+        self.network = network
+        settings = config.get('liveness', {})
+        self.enabled = settings.get('mode', 'heartbeat') == 'heartbeat'
+        self.interval = settings.get('heartbeat_interval', 1)
+        self.fanout = settings.get('heartbeat_fanout', 3)
+        self.phi_threshold = settings.get('phi_threshold', 8)
+        self.min_std = settings.get('min_std', 0.5)
+        self.incarnation = time.time()
+        self.heartbeat = 0
+        self.counters = {}  # url -> (incarnation, heartbeat), kept after removal as a tombstone
+        self.detectors = {}
+        self.legacy = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.network.core.submit(self._heartbeat_loop())
+
+    def table(self):
+        """Counters for this node and every live member"""
+        entries = {}
+        with self._lock:
+            counters = list(self.counters.items())
+        for url, (incarnation, heartbeat) in counters:
+            peer = self.network.peers.get(url)
+            if peer is not None:
+                entries[url] = {'id': peer.id, 'incarnation': incarnation, 'heartbeat': heartbeat}
+        entries[self.network.api_url] = {
+            'id': self.network.node_id,
+            'incarnation': self.incarnation,
+            'heartbeat': self.heartbeat
+        }
+        return entries
+
+    def merge(self, table):
+        """Take newer counters from a peer's table; hand unknown members to discovery"""
+        now = time.time()
+        for url, entry in (table or {}).items():
+            if url == self.network.api_url:
+                continue
+            counter = (entry.get('incarnation', 0), entry.get('heartbeat', 0))
+            with self._lock:
+                if counter <= self.counters.get(url, (0, 0)):
+                    continue
+                self.counters[url] = counter
+                detector = self.detectors.setdefault(url, PhiAccrualDetector(min_std=self.min_std))
+                detector.heartbeat(now)
+            if not self.network.peers.touch(url):
+                self.network.gossip.learn(entry.get('id'), url)
+
+    def handle_heartbeat(self, payload):
+        """Server side of a heartbeat push: merge the sender's table, return ours"""
+        self.merge(payload.get('members'))
+        return {'members': self.table()}
+
+    def _suspected(self, peer, now):
+        with self._lock:
+            detector = self.detectors.get(peer.url)
+        if detector is None or not detector.intervals:
+            # Fewer than two heartbeats (legacy peer, just connected or gone
+            # right after its first one), so phi has nothing to go on
+            return now - peer.last_seen > self.network.peer_timeout
+        return detector.phi(now) > self.phi_threshold
+
+    def sweep(self):
+        """Drop peers the detector has given up on; returns their URLs"""
+        now = time.time()
+        dead = [peer.url for peer in self.network.peers.records() if self._suspected(peer, now)]
+        for url in dead:
+            self.network.peers.remove(url)
+            with self._lock:
+                self.detectors.pop(url, None)
+            self.legacy.discard(url)
+        return dead
+
+    async def _heartbeat_loop(self):
+        while True:
+            self.heartbeat += 1
+            peers = [url for url in self.network.get_active_peers() if url not in self.legacy]
+            targets = random.sample(peers, min(self.fanout, len(peers)))
+            await self.network.core.bounded_gather(
+                [self._push(url) for url in targets]
+                + [self.network._check_peer_status(url) for url in list(self.legacy)]
+            )
+            dead = self.sweep()
+            if dead:
+                print(f"Peers failed: {', '.join(dead)}")
+            self.network._save_peers()
+            await asyncio.sleep(self.interval)
+
+    async def _push(self, peer_url):
+        payload = {'sender': self.network.api_url, 'members': self.table()}
+        start = time.time()
+        try:
+            response = await self.network.core.post_json(
+                f"{peer_url}/api/peers/heartbeat", payload, timeout=self.interval * 2
+            )
+        except AsyncHTTPError as e:
+            if e.status == 404:
+                self.legacy.add(peer_url)
+            return
+        except Exception:
+            return
+        self.network.peers.touch(peer_url, latency=self._smoothed_rtt(peer_url, time.time() - start))
+        self.merge((response or {}).get('members'))
+
+    def _smoothed_rtt(self, peer_url, rtt):
+        """Fold one heartbeat round trip into the peer's latency estimate"""
+        peer = self.network.peers.get(peer_url)
+        if peer is None or not peer.latency:
+            return rtt
+        return peer.latency + self.RTT_GAIN * (rtt - peer.latency)
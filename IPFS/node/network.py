@@ -1,3 +1,4 @@
+import asyncio
 import threading
 import time
 import requests
@@ -6,15 +7,22 @@ import platform
 import json
 import os
 import socket
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from .transfer import encode_frames, encode_flagged_frames, FRAME_CONTENT_TYPE, FLAGGED_CONTENT_TYPE, FLAG_PACKED
+from .compression import unpack
+from .dht import DHT
+from .http import PeerSessions
+from .aio import AsyncNetworkCore, AsyncHTTPError
+from .gossip import PeerGossip
+from .membership import Membership
+from .peers import PeerTable, PeerRecord, url_ip
 
 class Network:
     def __init__(self, config):
         self.config = config
-        self.node_id = str(uuid.uuid4())
+        # Worker processes of one node share the id they are handed in config
+        self.node_id = config.get('node_id') or str(uuid.uuid4())
         self.node_name = self._generate_node_name()
-        self.peers = {}
         self.bootstrap_nodes = config.get('bootstrap_nodes', [])
         self.host = config['host']
         self.port = config['port']
@@ -28,13 +36,23 @@ class Network:
         self.peer_timeout = config.get('peer_timeout', 15)  # Seconds before marking inactive
         self.peer_check_interval = config.get('peer_check_interval', 5)  # Check frequency
         self.max_retries = config.get('max_retries', 2)  # Retry attempts
+        self.peers = PeerTable(self.peer_timeout)
         self.discovery_config = config.get('discovery', {
             'aggressive_threshold': 3,
             'moderate_threshold': 5,
-            'scan_threads': 20
+            'max_in_flight': 256
         })
         
         self._load_peers()
+        self._saved_membership = self.peers.membership()
+        self.http = PeerSessions(config)
+        self.core = AsyncNetworkCore(
+            self.discovery_config.get('max_in_flight', 256),
+            self.discovery_config.get('keepalive_timeout', 30)
+        )
+        self.dht = DHT(self, config)
+        self.gossip = PeerGossip(self, config)
+        self.membership = Membership(self, config)
         
     def _generate_node_name(self):
         hostname = platform.node() or "unknown-host"
@@ -44,32 +62,36 @@ class Network:
         try:
             if os.path.exists(self.peers_file):
                 with open(self.peers_file, 'r') as f:
-                    self.peers = json.load(f)
-
-                # Clean up invalid entries
-                self.peers = {
-                    url: info for url, info in self.peers.items()
-                    if url != self.api_url  # Remove self-reference
-                    and not url.startswith('http://0.0.0.0')  # Remove 0.0.0.0
-                    and not any(  # Remove duplicates with different URLs
-                        u != url and u.split('//')[-1].split(':')[0] == url.split('//')[-1].split(':')[0]
-                        for u in self.peers
-                    )
-                }
+                    saved = json.load(f)
+
+                for url, info in saved.items():
+                    if url != self.api_url and not url.startswith('http://0.0.0.0'):
+                        self.peers.upsert(url, **{k: v for k, v in info.items() if k in PeerRecord.FIELDS})
+
+                # Clean up duplicates with different URLs on the same host
+                duplicates = [r.url for r in self.peers.records() if len(self.peers.by_ip(r.ip)) > 1]
+                for url in duplicates:
+                    self.peers.remove(url)
         except Exception as e:
             print(f"Error loading peers: {e}")
-            self.peers = {}
+            self.peers = PeerTable(self.peer_timeout)
             
     def _save_peers(self):
+        """Persist peers.json, but only when the set of members has changed"""
+        membership = self.peers.membership()
+        if membership == self._saved_membership:
+            return
         try:
             with open(self.peers_file, 'w') as f:
-                json.dump(self.peers, f)
+                json.dump(self.peers.to_json(), f)
+            self._saved_membership = membership
         except Exception as e:
             print(f"Error saving peers: {e}")
         
     def start(self):
         # Wait for API server to start
         time.sleep(2)
+        self.core.start()
         
         # Connect to bootstrap nodes first
         for node in self.bootstrap_nodes:
@@ -78,166 +100,138 @@ class Network:
                     node = node.replace('https://', 'http://')
                 self.connect_to_peer(node)
             
-        # Then try saved peers
-        for peer_url in list(self.peers.keys()):
-            self.connect_to_peer(peer_url)
+        # Then try saved peers, all at once
+        saved = self.peers.urls()
+        self.core.run(self.core.bounded_gather(self.connect_to_peer_async(url) for url in saved))
             
-        # Start background discovery
-        threading.Thread(
-            target=self._continuous_discovery,
-            daemon=True
-        ).start()
-        
-        # Start maintenance thread
-        threading.Thread(
-            target=self._peer_maintenance,
-            daemon=True
-        ).start()
+        # Discovery and maintenance run as coroutines on the network loop.
+        # Subnet scanning is opt-in; multicast plus gossip is the default.
+        if self.discovery_config.get('mode', 'gossip') == 'scan':
+            self.core.submit(self._continuous_discovery())
+        else:
+            self.gossip.start()
+        # Liveness: pushed heartbeats by default, or the per-peer ping loop
+        if self.membership.enabled:
+            self.membership.start()
+        else:
+            self.core.submit(self._peer_maintenance())
+
+        self.dht.start()
         
-    def _continuous_discovery(self):
+    async def _continuous_discovery(self):
         """Hybrid discovery with prioritized scanning"""
         while True:
-            active_count = sum(1 for p in self.peers.values() 
-                          if time.time() - p.get('last_seen', 0) < self.peer_timeout)
+            active_count = len(self.get_active_peers())
             
-            # Discovery modes based on peer count
-            if active_count < self.discovery_config['aggressive_threshold']:
-                self._prioritized_scan()
-                time.sleep(2)
-            elif active_count < self.discovery_config['moderate_threshold']:
-                self._prioritized_scan()
-                time.sleep(10)
-            else:
-                time.sleep(30)
+            try:
+                # Discovery modes based on peer count
+                if active_count < self.discovery_config['aggressive_threshold']:
+                    await self._prioritized_scan()
+                    await asyncio.sleep(2)
+                elif active_count < self.discovery_config['moderate_threshold']:
+                    await self._prioritized_scan()
+                    await asyncio.sleep(10)
+                else:
+                    await asyncio.sleep(30)
+            except Exception as e:
+                print(f"Discovery cycle failed: {e}")
+                await asyncio.sleep(5)
     
-    def _prioritized_scan(self):
-        """Scan nearby IPs first for faster discovery"""
-        local_ip = self._get_local_ip()
-        if not local_ip:
-            return
-            
-        base_octets = local_ip.split('.')[:3]
-        base_ip = '.'.join(base_octets)
+    async def _prioritized_scan(self, base_ip=None):
+        """Probe every host of the local /24 on each scan port, concurrently.
+
+        All probes are coroutines on the network loop, bounded by
+        discovery.max_in_flight, instead of a thread per probe.
+        """
+        if base_ip is None:
+            local_ip = self._get_local_ip()
+            if not local_ip:
+                return
+            base_ip = '.'.join(local_ip.split('.')[:3])
         
-        # Scan sequence: same subnet first, then nearby subnets
-        scan_sequence = [
-            *range(1, 255),  # Local subnet
-            *range(1, 255)   # Nearby subnets (could be expanded)
+        candidates = [
+            f"http://{base_ip}.{last_octet}:{port}"
+            for last_octet in range(1, 255)
+            for port in self.scan_ports
         ]
-        
-        with ThreadPoolExecutor(max_workers=self.discovery_config['scan_threads']) as executor:
-            for last_octet in scan_sequence:
-                ip = f"{base_ip}.{last_octet}"
-                for port in self.scan_ports:
-                    executor.submit(self._probe_peer, ip, port)
+        known = len(self.peers)
+        await self.core.bounded_gather(self._probe_peer(url) for url in candidates)
+        # One write for the whole scan rather than one per peer found
+        if len(self.peers) != known:
+            self._save_peers()
     
-    def _probe_peer(self, ip, port):
+    async def _probe_peer(self, peer_url):
         """Probe a potential peer"""
-        peer_url = f"http://{ip}:{port}"
         if peer_url not in self.peers and peer_url != self.api_url:
-            self.connect_to_peer(peer_url)
+            await self.connect_to_peer_async(peer_url, quiet=True, save=False)
     
-    def _peer_maintenance(self):
+    async def _peer_maintenance(self):
         """Enhanced peer maintenance with faster failure detection"""
         while True:
-            dead_peers = []
-            
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = {
-                    executor.submit(self._check_peer_status, url, info): url
-                    for url, info in self.peers.items()
-                }
-                
-                for future in as_completed(futures):
-                    url = futures[future]
-                    try:
-                        is_active = future.result()
-                        if not is_active:
-                            dead_peers.append(url)
-                    except Exception:
-                        dead_peers.append(url)
+            urls = self.peers.urls()
+            results = await self.core.bounded_gather(
+                self._check_peer_status(url) for url in urls
+            )
+            dead_peers = [url for url, ok in zip(urls, results) if ok is not True]
             
             # Remove dead peers
             for url in dead_peers:
-                if url in self.peers:
-                    del self.peers[url]
+                self.peers.remove(url)
             self._save_peers()
             
-            time.sleep(self.peer_check_interval)
+            await asyncio.sleep(self.peer_check_interval)
     
-    def _check_peer_status(self, url, info):
+    async def _check_peer_status(self, url):
         """Check individual peer status with timeout and retries"""
         for attempt in range(self.max_retries):
             try:
                 start = time.time()
-                response = requests.get(
+                await self.core.get_json(
                     f"{url}/api/ping", 
                     timeout=self.peer_timeout/self.max_retries
                 )
-                if response.status_code == 200:
-                    self.peers[url]['last_seen'] = time.time()
-                    self.peers[url]['latency'] = time.time() - start
-                    return True
-            except requests.exceptions.RequestException:
+                self.peers.touch(url, latency=time.time() - start)
+                return True
+            except (OSError, asyncio.TimeoutError, AsyncHTTPError, ValueError):
                 continue
         return False
-    def _continuous_discovery(self):
-        """Hybrid discovery with prioritized scanning"""
-        while True:
-            active_count = sum(1 for p in self.peers.values() 
-                          if time.time() - p.get('last_seen', 0) < self.peer_timeout)
-            
-            # Discovery modes based on peer count
-            if active_count < self.discovery_config['aggressive_threshold']:
-                self._prioritized_scan()
-                time.sleep(2)
-            elif active_count < self.discovery_config['moderate_threshold']:
-                self._prioritized_scan()
-                time.sleep(10)
-            else:
-                time.sleep(30)
+
     def connect_to_peer(self, peer_url):
         """Enhanced peer connection with fast-fail"""
+        return self.core.run(self.connect_to_peer_async(peer_url))
+
+    async def connect_to_peer_async(self, peer_url, quiet=False, save=True):
+        """Ping peer_url, fetch its info and add it to our peer table"""
         try:
             # First do a quick ping check
-            ping_response = requests.get(
-                f"{peer_url}/api/ping",
-                timeout=2  
-            )
-            if ping_response.status_code != 200:
-                return False
+            await self.core.get_json(f"{peer_url}/api/ping", timeout=2)
                 
             # Then get full info if ping succeeded
-            response = requests.get(
-                f"{peer_url}/api/info",
-                timeout=5
-            )
+            info = await self.core.get_json(f"{peer_url}/api/info", timeout=5)
 
-            if response.status_code == 200:
-                info = response.json()
-
-                # Ensure we're not connecting to ourselves
-                if info['node_id'] == self.node_id:
-                    return False
-
-                # Store the peer information
-                self.peers[peer_url] = {
-                    'id': info['node_id'],
-                    'name': info['node_name'],
-                    'last_seen': time.time(),
-                    'first_seen': self.peers.get(peer_url, {}).get('first_seen', time.time()),
-                    'source': 'manual' if peer_url in self.bootstrap_nodes else 'discovered',
-                    'ip': self._extract_ip_from_url(peer_url),
-                    'latency': None
-                }
+            # Ensure we're not connecting to ourselves
+            if info['node_id'] == self.node_id:
+                return False
+
+            # Store the peer information
+            self.peers.upsert(
+                peer_url,
+                id=info['node_id'],
+                name=info['node_name'],
+                last_seen=time.time(),
+                source='manual' if peer_url in self.bootstrap_nodes else 'discovered',
+                latency=None
+            )
+            if save:
                 self._save_peers()
 
-                # Notify peer about us
-                self._notify_peer_of_our_existence(peer_url)
-                return True
+            # Notify peer about us
+            await self._notify_peer_of_our_existence(peer_url)
+            return True
 
-        except requests.exceptions.RequestException as e:
-            print(f"Connection to {peer_url} failed: {e}")
+        except (OSError, asyncio.TimeoutError, AsyncHTTPError, ValueError, KeyError) as e:
+            if not quiet:
+                print(f"Connection to {peer_url} failed: {e!r}")
             return False
 
     def _normalize_peer_url(self, url):
@@ -275,27 +269,21 @@ class Network:
         if not target_ip:
             return None
 
-        for existing_url in self.peers:
-            existing_ip = self._extract_ip_from_url(existing_url)
-            if existing_ip == target_ip:
-                return existing_url
-        return None
+        existing = self.peers.by_ip(target_ip)
+        return existing[0] if existing else None
 
     def _extract_ip_from_url(self, url):
         """Extract just the IP/hostname from URL"""
-        try:
-            return url.split('://')[1].split(':')[0]
-        except:
-            return None
+        return url_ip(url)
 
-    def _notify_peer_of_our_existence(self, peer_url):
+    async def _notify_peer_of_our_existence(self, peer_url):
         """Handles peer notification with retries"""
         max_retries = 2
         for attempt in range(max_retries):
             try:
-                requests.post(
+                await self.core.post_json(
                     f"{peer_url}/api/peers/notify",
-                    json={
+                    {
                         'url': self.api_url,
                         'info': {
                             'id': self.node_id,
@@ -308,20 +296,7 @@ class Network:
                 break
             except Exception as e:
                 if attempt == max_retries - 1:
-                    print(f"Peer notification to {peer_url} failed: {e}")
-
-    def _fetch_and_process_peer_list(self, peer_url):
-        """Fetch and process peer list with safeguards"""
-        try:
-            response = requests.get(f"{peer_url}/api/peers", timeout=5)
-            if response.status_code == 200:
-                for peer in response.json():
-                    if peer['url'] != self.api_url:
-                        # Prevent infinite recursion by limiting depth
-                        if len(self.peers) < 20:  
-                            self.connect_to_peer(peer['url'])
-        except Exception as e:
-            print(f"Failed to process peer list from {peer_url}: {e}")
+                    print(f"Peer notification to {peer_url} failed: {e!r}")
 
     def _get_local_ip(self):
         """Get primary local IP address"""
@@ -335,106 +310,100 @@ class Network:
             print(f"Error getting local IP: {e}")
             return None
             
-    def propagate_chunk(self, cid, data):
-        """Send chunk to all active peers in parallel"""
-        active_peers = [
-            url for url, info in self.peers.items()
-            if time.time() - info.get('last_seen', 0) < self.peer_timeout
-            and url != self.api_url  # Don't send to ourselves
-        ]
+    def get_active_peers(self):
+        """URLs of peers seen within peer_timeout"""
+        return [url for url in self.peers.active() if url != self.api_url]
 
-        def _send_chunk(peer_url):
-            try:
-                # Skip if peer already has it
-                response = requests.head(
-                    f"{peer_url}/api/chunks/{cid}",
-                    timeout=2
-                )
-                if response.status_code == 200:
-                    return True
-
-                encoded_data = data.decode('latin1') if isinstance(data, bytes) else data
-                requests.post(
-                    f"{peer_url}/api/chunks",
-                    json={
-                        'cid': cid,
-                        'data': encoded_data
-                    },
-                    timeout=10
-                )
-                print(f"Propagated chunk {cid[:8]} to {peer_url}")
-                return True
-            except Exception as e:
-                print(f"Failed to propagate chunk to {peer_url}: {str(e)}")
-                return False
+    def _put_raw(self, peer_url, kind, cid, data):
+        """PUT raw bytes to a peer, falling back to the legacy JSON endpoint"""
+        response = self.http.put(
+            f"{peer_url}/api/{kind}/{cid}",
+            data=data,
+            headers={'Content-Type': 'application/octet-stream'},
+            timeout=10
+        )
+        if response.status_code in (404, 405):
+            # Older peer without the binary endpoint
+            response = self.http.post(
+                f"{peer_url}/api/{kind}",
+                json={'cid': cid, 'data': data.decode('latin1')},
+                timeout=10
+            )
+        response.raise_for_status()
 
-        # Use thread pool for parallel propagation
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(_send_chunk, peer_url) for peer_url in active_peers]
-            for future in as_completed(futures):
-                future.result()  # Just wait for completion, we don't need the results
-
-    def propagate_manifest(self, cid, data):
-        """Send manifest to all active peers in parallel"""
-        active_peers = [
-            url for url, info in self.peers.items()
-            if time.time() - info.get('last_seen', 0) < self.peer_timeout
-            and url != self.api_url  # Don't send to ourselves
-        ]
+    def query_missing_chunks(self, peer_url, cids):
+        """Ask a peer which of cids it lacks, in one round trip"""
+        return self._query_missing(peer_url, cids)['missing']
 
-        def _send_manifest(peer_url):
-            try:
-                # Skip if peer already has it
-                response = requests.head(
-                    f"{peer_url}/api/manifests/{cid}",
-                    timeout=2
-                )
-                if response.status_code == 200:
-                    return True
-
-                encoded_data = data.decode('latin1') if isinstance(data, bytes) else data
-                requests.post(
-                    f"{peer_url}/api/manifests",
-                    json={
-                        'cid': cid,
-                        'data': encoded_data
-                    },
-                    timeout=10
-                )
-                print(f"Propagated manifest {cid[:8]} to {peer_url}")
-                return True
-            except Exception as e:
-                print(f"Failed to propagate manifest to {peer_url}: {str(e)}")
-                return False
+    def _query_missing(self, peer_url, cids):
+        response = self.http.post(
+            f"{peer_url}/api/chunks/missing",
+            json={'cids': cids},
+            timeout=5
+        )
+        if response.status_code in (404, 405):
+            # Older peer without the bulk endpoint, assume it has nothing
+            return {'missing': list(cids)}
+        response.raise_for_status()
+        return response.json()
 
-        # Use thread pool for parallel propagation
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(_send_manifest, peer_url) for peer_url in active_peers]
-            for future in as_completed(futures):
-                future.result()  # Just wait for completion
-                
-    def get_chunk_from_peers(self, cid):
-        """Fetch chunk from first available peer"""
-        for peer_url, peer_info in self.peers.items():
-            if time.time() - peer_info.get('last_seen', 0) > self.peer_timeout:
-                continue
-                
-            try:
-                response = requests.get(f"{peer_url}/api/chunks/{cid}", timeout=5)
-                if response.status_code == 200:
-                    return response.content
-            except requests.exceptions.RequestException:
-                continue
-        return None
-        
-    def get_manifest_from_peers(self, cid):
-        """Fetch manifest from first available peer"""
-        for peer_url, peer_info in self.peers.items():
-            if time.time() - peer_info.get('last_seen', 0) > self.peer_timeout:
-                continue
-                
+    def send_chunks(self, peer_url, chunks):
+        """Send the chunks the peer is missing as one binary frame body.
+
+        chunks are (cid, data) pairs, or (cid, data, packed) with packed=True
+        for zlib-compressed data (see Storage.read_stored). Compressed chunks
+        go out as they are to peers that accept them and are inflated for
+        older ones. Returns the number of chunks actually sent; raises on
+        failure.
+        """
+        chunks = [chunk if len(chunk) == 3 else (*chunk, False) for chunk in chunks]
+        reply = self._query_missing(peer_url, [cid for cid, _, _ in chunks])
+        missing = set(reply['missing'])
+        to_send = [chunk for chunk in chunks if chunk[0] in missing]
+        if not to_send:
+            return 0
+
+        if reply.get('accept_packed') and any(packed for _, _, packed in to_send):
+            body = encode_flagged_frames(
+                (cid, data, FLAG_PACKED if packed else 0) for cid, data, packed in to_send)
+            content_type = FLAGGED_CONTENT_TYPE
+        else:
+            to_send = [(cid, unpack(data) if packed else data, False) for cid, data, packed in to_send]
+            body = encode_frames((cid, data) for cid, data, _ in to_send)
+            content_type = FRAME_CONTENT_TYPE
+        response = self.http.post(
+            f"{peer_url}/api/chunks/batch",
+            data=body,
+            headers={'Content-Type': content_type},
+            timeout=30
+        )
+        if response.status_code in (404, 405):
+            # Older peer, send one at a time instead
+            for cid, data, packed in to_send:
+                self._put_raw(peer_url, 'chunks', cid, unpack(data) if packed else data)
+        else:
+            response.raise_for_status()
+            rejected = response.json().get('rejected', 0)
+            if rejected:
+                raise IOError(f"{peer_url} rejected {rejected} chunk(s) that failed verification")
+        return len(to_send)
+
+    def send_manifest(self, peer_url, cid, data):
+        """Send a manifest unless the peer already has it; raises on failure"""
+        response = self.http.head(
+            f"{peer_url}/api/manifests/{cid}",
+            timeout=2
+        )
+        if response.status_code == 200:
+            return False
+        self._put_raw(peer_url, 'manifests', cid, data)
+        return True
+
+    def get_manifest_from_peers(self, cid, peers=None):
+        """Fetch manifest from the first of peers (default: active peers) that has it"""
+        for peer_url in (self.get_active_peers() if peers is None else peers):
             try:
-                response = requests.get(f"{peer_url}/api/manifests/{cid}", timeout=5)
+                response = self.http.get(f"{peer_url}/api/manifests/{cid}", timeout=5)
                 if response.status_code == 200:
                     return response.content
             except requests.exceptions.RequestException:
@@ -448,20 +417,19 @@ class Network:
             'node_name': self.node_name,
             'api_url': self.api_url,
             'total_peers': len(self.peers),
-            'active_peers': sum(1 for p in self.peers.values() 
-                              if time.time() - p.get('last_seen', 0) < self.peer_timeout),
+            'active_peers': len(self.get_active_peers()),
             'peer_list': []
         }
         
-        for url, info in self.peers.items():
+        for peer in self.peers.records():
             stats['peer_list'].append({
-                'url': url,
-                'name': info.get('name'),
-                'source': info.get('source', 'unknown'),
-                'uptime': time.time() - info.get('first_seen', time.time()),
-                'last_contact': time.time() - info.get('last_seen', 0),
-                'latency': info.get('latency'),
-                'status': 'active' if time.time() - info.get('last_seen', 0) < self.peer_timeout else 'inactive'
+                'url': peer.url,
+                'name': peer.name,
+                'source': peer.source or 'unknown',
+                'uptime': time.time() - peer.first_seen,
+                'last_contact': time.time() - peer.last_seen,
+                'latency': peer.latency,
+                'status': 'active' if self.peers.is_active(peer.url) else 'inactive'
             })
         
         return stats
@@ -472,14 +440,13 @@ class Network:
         print(f"{'URL':<30} {'Name':<20} {'Source':<10} {'Status':<10} {'Latency':<8} {'Last Seen':<12}")
         print("-" * 80)
         
-        for url, info in self.peers.items():
-            status = 'ACTIVE' if time.time() - info.get('last_seen', 0) < self.peer_timeout else 'INACTIVE'
-            uptime = time.time() - info.get('first_seen', time.time())
-            last_seen = time.time() - info.get('last_seen', 0)
-            latency = f"{info.get('latency', 0)*1000:.1f}ms" if info.get('latency') else "N/A"
+        for peer in self.peers.records():
+            status = 'ACTIVE' if self.peers.is_active(peer.url) else 'INACTIVE'
+            last_seen = time.time() - peer.last_seen
+            latency = f"{peer.latency*1000:.1f}ms" if peer.latency else "N/A"
             
-            print(f"{url:<30} {info.get('name','unknown'):<20} "
-                  f"{info.get('source','unknown'):<10} {status:<10} "
+            print(f"{peer.url:<30} {peer.name or 'unknown':<20} "
+                  f"{peer.source or 'unknown':<10} {status:<10} "
                   f"{latency:<8} {last_seen:.1f}s ago")
 
     def _get_public_api_url(self):
@@ -489,32 +456,37 @@ class Network:
         return self.api_url
     
     def propagate_file_availability(self, cid):
-        """Notify peers that we have this file"""
-        for peer_url, peer_info in self.peers.items():
-            if time.time() - peer_info.get('last_seen', 0) > self.peer_timeout:
-                continue
-                
-            try:
-                requests.post(
-                    f"{peer_url}/api/files/availability",
-                    json={
-                        'cid': cid,
-                        'url': self.api_url
-                    },
-                    timeout=3
-                )
-            except Exception as e:
-                print(f"Failed to propagate file availability: {str(e)}")
+        """Publish a provider record for cid into the DHT"""
+        try:
+            self.dht.provide(cid)
+        except Exception as e:
+            print(f"Failed to propagate file availability: {str(e)}")
+
+    def announce_file(self, cid):
+        """propagate_file_availability in the background"""
+        threading.Thread(
+            target=self.propagate_file_availability,
+            args=(cid,),
+            daemon=True
+        ).start()
 
     def find_file_location(self, cid):
-        """Find which peers have this file"""
+        """Find which peers have this file.
+
+        Asks the DHT first (O(log N) hops); if no provider record turns up,
+        falls back to asking every active peer directly.
+        """
+        try:
+            providers = self.dht.find_providers(cid)
+            if providers:
+                return providers
+        except Exception as e:
+            print(f"DHT lookup for {cid[:8]} failed: {e}")
+
         locations = []
-        for peer_url, peer_info in self.peers.items():
-            if time.time() - peer_info.get('last_seen', 0) > self.peer_timeout:
-                continue
-                
+        for peer_url in self.get_active_peers():
             try:
-                response = requests.get(
+                response = self.http.get(
                     f"{peer_url}/api/files/{cid}/exists",
                     timeout=2
                 )
@@ -524,39 +496,12 @@ class Network:
                 continue
         return locations
 
-    def fetch_file_from_peer(self, cid, peer_url):
-        """Download file from another peer"""
-        try:
-            response = requests.get(
-                f"{peer_url}/api/files/{cid}",
-                stream=True,
-                timeout=30
-            )
-            if response.status_code == 200:
-                temp_path = os.path.join(self.storage.storage_path, f"{cid}")
-                with open(temp_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                # Store the file properly
-                root_cid = self.storage.store_file(temp_path)
-                os.remove(temp_path)
-                return root_cid
-        except Exception as e:
-            print(f"Failed to fetch file from peer: {str(e)}")
-        return None    
-    
     def get_files_from_peers(self):
         """Get file lists from all active peers"""
         all_files = []
-        active_peers = [
-            url for url, info in self.peers.items()
-            if time.time() - info.get('last_seen', 0) < self.peer_timeout
-        ]
-        
-        for peer_url in active_peers:
+        for peer_url in self.get_active_peers():
             try:
-                response = requests.get(
+                response = self.http.get(
                     f"{peer_url}/api/files",
                     timeout=3
                 )
@@ -0,0 +1,157 @@
+import heapq
+import threading
+import time
+
+
+def url_ip(url):
+    """Extract just the IP/hostname from a peer URL"""
+    try:
+        return url.split('://')[1].split(':')[0]
+    except (AttributeError, IndexError):
+        return None
+
+
+class PeerRecord:
+    """What we know about one peer"""
+
+    __slots__ = ('url', 'id', 'name', 'ip', 'source', 'first_seen', 'last_seen', 'latency')
+
+    FIELDS = ('id', 'name', 'ip', 'source', 'first_seen', 'last_seen', 'latency')
+
+    def __init__(self, url, id=None, name=None, ip=None, source=None,
+                 first_seen=None, last_seen=0.0, latency=None):
+        self.url = url
+        self.id = id
+        self.name = name
+        self.ip = ip or url_ip(url)
+        self.source = source
+        self.first_seen = first_seen if first_seen is not None else time.time()
+        self.last_seen = last_seen
+        self.latency = latency
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class PeerTable:
+    """Thread-safe peer table with O(1) lookups by URL, IP and node id.
+
+    The active set holds peers seen within timeout, with a heap of last_seen
+    times so expiring stale peers only looks at the oldest entries (superseded
+    heap entries are skipped when popped). Iteration helpers return snapshots,
+    so callers never see the table change underneath them.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._records = {}
+        self._by_ip = {}
+        self._by_id = {}
+        self._active = {}  # url -> last_seen
+        self._expiry = []  # heap of (last_seen, url)
+        self._lock = threading.RLock()
+
+    def __contains__(self, url):
+        return url in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, url):
+        return self._records.get(url)
+
+    def urls(self):
+        with self._lock:
+            return list(self._records)
+
+    def records(self):
+        with self._lock:
+            return list(self._records.values())
+
+    def by_ip(self, ip):
+        """URLs of peers at ip (several nodes can share a host)"""
+        with self._lock:
+            return list(self._by_ip.get(ip, ()))
+
+    def by_id(self, node_id):
+        with self._lock:
+            return self._by_id.get(node_id)
+
+    def upsert(self, url, **fields):
+        """Add or update a peer; returns its record"""
+        with self._lock:
+            record = self._records.get(url)
+            if record is None:
+                record = PeerRecord(url)
+                self._records[url] = record
+                self._by_ip.setdefault(record.ip, set()).add(url)
+            if 'id' in fields and fields['id'] != record.id:
+                if self._by_id.get(record.id) == url:
+                    del self._by_id[record.id]
+            for field, value in fields.items():
+                setattr(record, field, value)
+            if record.id:
+                self._by_id[record.id] = url
+            self._mark(record)
+            return record
+
+    def touch(self, url, latency=None):
+        """Record that url was just heard from"""
+        with self._lock:
+            record = self._records.get(url)
+            if record is None:
+                return False
+            record.last_seen = time.time()
+            if latency is not None:
+                record.latency = latency
+            self._mark(record)
+            return True
+
+    def remove(self, url):
+        with self._lock:
+            record = self._records.pop(url, None)
+            if record is None:
+                return None
+            urls = self._by_ip.get(record.ip)
+            if urls is not None:
+                urls.discard(url)
+                if not urls:
+                    del self._by_ip[record.ip]
+            if self._by_id.get(record.id) == url:
+                del self._by_id[record.id]
+            self._active.pop(url, None)
+            return record
+
+    def _mark(self, record):
+        if time.time() - record.last_seen >= self.timeout:
+            self._active.pop(record.url, None)
+            return
+        self._active[record.url] = record.last_seen
+        heapq.heappush(self._expiry, (record.last_seen, record.url))
+        if len(self._expiry) > 2 * len(self._active) + 64:
+            self._expiry = [(seen, url) for url, seen in self._active.items()]
+            heapq.heapify(self._expiry)
+
+    def active(self):
+        """URLs of peers seen within timeout"""
+        cutoff = time.time() - self.timeout
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= cutoff:
+                seen, url = heapq.heappop(self._expiry)
+                if self._active.get(url) == seen:
+                    del self._active[url]
+            return list(self._active)
+
+    def is_active(self, url):
+        with self._lock:
+            last_seen = self._active.get(url)
+        return last_seen is not None and time.time() - last_seen < self.timeout
+
+    def membership(self):
+        """url -> node id, to tell whether the set of members changed"""
+        with self._lock:
+            return {url: record.id for url, record in self._records.items()}
+
+    def to_json(self):
+        with self._lock:
+            return {url: record.to_dict() for url, record in self._records.items()}
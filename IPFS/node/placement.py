@@ -0,0 +1,19 @@
+import hashlib
+
+
+def rendezvous_rank(cid, nodes):
+    """Order nodes by highest-random-weight for cid.
+
+    nodes is a dict of key -> node_id. Every node computes the same order, and
+    adding or removing one node only moves the chunks that node was ranked for.
+    """
+    def score(item):
+        _, node_id = item
+        return hashlib.sha256(f"{node_id}:{cid}".encode('utf-8')).digest()
+
+    return [key for key, _ in sorted(nodes.items(), key=score, reverse=True)]
+
+
+def place(cid, nodes, count):
+    """Pick the count nodes responsible for cid"""
+    return rendezvous_rank(cid, nodes)[:count]
@@ -0,0 +1,385 @@
+import os
+import threading
+import time
+from .index import SQLiteStore
+from .placement import place, rendezvous_rank
+
+# Jobs are sent in this order for each peer: chunks before the manifest that
+# references them
+KIND_PRIORITY = {'chunk': 0, 'manifest': 1}
+
+
+class ReplicationLog(SQLiteStore):
+    """Persistent replication jobs, one row per (cid, peer, kind).
+
+    Kept at the default sync level: the blocks these jobs send aren't fsynced
+    either, so a power loss can only drop jobs along with their blocks.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS replication_jobs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            cid TEXT NOT NULL,
+            peer_url TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            updated REAL NOT NULL,
+            UNIQUE (cid, peer_url, kind)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS replication_due
+            ON replication_jobs (status, peer_url, priority, seq)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS replication_by_cid
+            ON replication_jobs (cid)
+        """,
+    )
+
+    def add(self, cid, kind, peers):
+        now = time.time()
+        with self.batch():
+            self._conn().executemany(
+                """
+                INSERT INTO replication_jobs
+                    (cid, peer_url, kind, priority, next_attempt, updated)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (cid, peer_url, kind) DO UPDATE SET
+                    status = 'pending', attempts = 0, next_attempt = excluded.next_attempt,
+                    last_error = NULL, updated = excluded.updated
+                WHERE status = 'failed'
+                """,
+                [(cid, peer, kind, KIND_PRIORITY[kind], now, now) for peer in peers]
+            )
+
+    def claim(self, busy_peers, limit):
+        """Mark up to limit due jobs of one peer and kind as inflight and return them.
+
+        Peers in busy_peers are being served by another worker and are skipped.
+        Returns (peer_url, kind, [(seq, cid), ...]) or None.
+        """
+        now = time.time()
+        placeholders = ','.join('?' * len(busy_peers))
+        exclude = f"AND peer_url NOT IN ({placeholders})" if busy_peers else ''
+        with self.batch():
+            conn = self._conn()
+            row = conn.execute(
+                f"""
+                SELECT peer_url, kind, priority FROM replication_jobs
+                WHERE status = 'pending' AND next_attempt <= ? {exclude}
+                ORDER BY priority, seq LIMIT 1
+                """,
+                (now, *busy_peers)
+            ).fetchone()
+            if row is None:
+                return None
+            peer_url, kind, priority = row
+            jobs = conn.execute(
+                """
+                SELECT seq, cid FROM replication_jobs
+                WHERE status = 'pending' AND next_attempt <= ? AND peer_url = ? AND priority = ?
+                ORDER BY seq LIMIT ?
+                """,
+                (now, peer_url, priority, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE replication_jobs SET status = 'inflight', updated = ? WHERE seq = ?",
+                [(now, seq) for seq, _ in jobs]
+            )
+        return peer_url, kind, jobs
+
+    def mark_done(self, seqs):
+        now = time.time()
+        with self.batch():
+            self._conn().executemany(
+                "UPDATE replication_jobs SET status = 'done', last_error = NULL, updated = ? WHERE seq = ?",
+                [(now, seq) for seq in seqs]
+            )
+
+    def mark_retry(self, seqs, error, max_attempts, base_delay, max_delay):
+        """Record a failed attempt and back off exponentially, or give up"""
+        now = time.time()
+        with self.batch():
+            conn = self._conn()
+            for seq in seqs:
+                attempts = conn.execute(
+                    'SELECT attempts FROM replication_jobs WHERE seq = ?', (seq,)
+                ).fetchone()[0] + 1
+                status = 'failed' if attempts >= max_attempts else 'pending'
+                delay = min(base_delay * 2 ** (attempts - 1), max_delay)
+                conn.execute(
+                    """
+                    UPDATE replication_jobs SET status = ?, attempts = ?, next_attempt = ?,
+                        last_error = ?, updated = ?
+                    WHERE seq = ?
+                    """,
+                    (status, attempts, now + delay, str(error)[:500], now, seq)
+                )
+
+    def cancel(self, cids):
+        """Drop the pending jobs of cids"""
+        with self.batch():
+            self._conn().executemany(
+                "DELETE FROM replication_jobs WHERE cid = ? AND status = 'pending'",
+                [(cid,) for cid in cids]
+            )
+
+    def reset_inflight(self):
+        """Jobs left inflight by a previous run go back to pending"""
+        self._conn().execute(
+            "UPDATE replication_jobs SET status = 'pending' WHERE status = 'inflight'"
+        )
+
+    def prune(self, older_than):
+        """Delete done jobs last updated before older_than; returns how many"""
+        return self._conn().execute(
+            "DELETE FROM replication_jobs WHERE status = 'done' AND updated < ?",
+            (older_than,)
+        ).rowcount
+
+    def status(self, cid):
+        rows = self._conn().execute(
+            """
+            SELECT peer_url, kind, status, attempts, last_error, updated
+            FROM replication_jobs WHERE cid = ? ORDER BY peer_url, priority
+            """,
+            (cid,)
+        )
+        return [
+            {
+                'peer': peer_url,
+                'kind': kind,
+                'status': status,
+                'attempts': attempts,
+                'last_error': last_error,
+                'updated': updated
+            }
+            for peer_url, kind, status, attempts, last_error, updated in rows
+        ]
+
+    def summary(self):
+        rows = self._conn().execute(
+            'SELECT status, COUNT(*) FROM replication_jobs GROUP BY status'
+        )
+        return dict(rows.fetchall())
+
+
+class ReplicationQueue:
+    """Background replication of chunks and manifests.
+
+    Uploads only enqueue jobs; a pool of worker threads sends them to peers in
+    batches, with per-peer rate limits and exponential backoff. Jobs are kept in
+    SQLite, so replication picks up where it left off after a restart; done
+    jobs are pruned after retention seconds. Whenever membership changes,
+    repair() queues chunks and manifests for peers that should have them.
+    """
+
+    def __init__(self, config, storage, network):
+        self.storage = storage
+        self.network = network
+        settings = config.get('replication', {})
+        self.workers = settings.get('workers', 4)
+        self.batch_size = settings.get('batch_size', config.get('propagation_batch_size', 16))
+        self.max_attempts = settings.get('max_attempts', 8)
+        self.base_delay = settings.get('retry_base_delay', 2)
+        self.max_delay = settings.get('retry_max_delay', 300)
+        self.peer_bytes_per_sec = settings.get('peer_bytes_per_sec', 0)  # 0 = unlimited
+        self.retention = settings.get('retention', 86400)
+        self.prune_interval = settings.get('prune_interval', 600)
+        # Number of peers that get a copy of each chunk; 0 means every active
+        # peer. Shards of erasure-coded groups get one peer each instead
+        self.factor = settings.get('factor', 0)
+        self.repair_interval = settings.get('repair_interval', 30)
+        # Uploads queue their jobs this many at a time, in one transaction
+        self.flush_window = settings.get('flush_window', 256)
+
+        self.log = ReplicationLog(os.path.join(storage.storage_path, 'replication.db'))
+        self._lock = threading.Lock()
+        self._busy_peers = set()
+        self._peer_next_send = {}
+        self._wakeup = threading.Event()
+        self._started = False
+        self._repaired_for = None
+        self._next_prune = 0
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self.log.reset_inflight()
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+        threading.Thread(target=self._repair_loop, daemon=True).start()
+
+    def chunk_targets(self, cid):
+        """Active peers that should hold cid under the placement policy.
+
+        A shard of an erasure-coded group goes to a single peer: the group's
+        shards take successive peers in the group's rendezvous order, so no
+        two share a peer while there are enough of them.
+        """
+        active = self.network.get_active_peers()
+        shard = self.storage.index.get_shard(cid)
+        if not self.factor and shard is None:
+            return active
+        nodes = {}
+        for url in active:
+            peer = self.network.peers.get(url)
+            nodes[url] = peer.id if peer and peer.id else url
+        if shard is not None:
+            group_key, position = shard
+            ranked = rendezvous_rank(group_key, nodes)
+            return [ranked[position % len(ranked)]] if ranked else []
+        return place(cid, nodes, self.factor)
+
+    def enqueue(self, cid, kind, peers=None):
+        """Queue cid for every peer in peers.
+
+        Chunks default to the placement targets, manifests to every active
+        peer so all nodes can list files.
+        """
+        if self._add(cid, kind, peers):
+            self._wakeup.set()
+
+    def enqueue_many(self, jobs):
+        """Queue several (cid, kind, peers) jobs in one transaction, see enqueue"""
+        with self.log.batch():
+            added = [self._add(cid, kind, peers) for cid, kind, peers in jobs]
+        if any(added):
+            self._wakeup.set()
+
+    def _add(self, cid, kind, peers):
+        if peers is None:
+            peers = self.chunk_targets(cid) if kind == 'chunk' else self.network.get_active_peers()
+        if not peers:
+            return False
+        self.log.add(cid, kind, peers)
+        return True
+
+    def cancel(self, cids):
+        """Stop replicating cids (e.g. blocks of an aborted upload)"""
+        self.log.cancel(cids)
+
+    def status(self, cid):
+        return self.log.status(cid)
+
+    def summary(self):
+        return self.log.summary()
+
+    def repair(self):
+        """Queue chunks and manifests for any target that doesn't have them yet.
+
+        Jobs already done or pending for a peer are left alone, so this only
+        adds work for peers that joined or became targets because others
+        went away. Manifests go to every active peer, chunks to their
+        placement targets.
+
+        Chunks come from the blockstore rather than the local manifests, so
+        replicas received from other nodes are re-placed too and any holder
+        can restore the factor after the uploader leaves.
+        """
+        queued = 0
+        manifests = {cid for cid, _ in self.storage.index.list_manifests()}
+        for cid, _ in self.storage.iter_blocks():
+            if cid in manifests:
+                continue
+            targets = self.chunk_targets(cid)
+            if targets:
+                self.log.add(cid, 'chunk', targets)
+                queued += 1
+        active = self.network.get_active_peers()
+        if active:
+            for cid in manifests:
+                if self.storage.has_chunk(cid):
+                    self.log.add(cid, 'manifest', active)
+                    queued += 1
+        self._wakeup.set()
+        return queued
+
+    def _repair_loop(self):
+        while True:
+            time.sleep(self.repair_interval)
+            # Placement only changes when membership does
+            active = frozenset(self.network.get_active_peers())
+            if active == self._repaired_for:
+                continue
+            try:
+                self.repair()
+                self._repaired_for = active
+            except Exception as e:
+                print(f"Replication repair failed: {e}")
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                claimed = self.log.claim(sorted(self._busy_peers), self.batch_size)
+                if claimed:
+                    self._busy_peers.add(claimed[0])
+            if not claimed:
+                self._prune()
+                self._wakeup.wait(1)
+                self._wakeup.clear()
+                continue
+
+            peer_url, kind, jobs = claimed
+            try:
+                self._process(peer_url, kind, jobs)
+            finally:
+                with self._lock:
+                    self._busy_peers.discard(peer_url)
+
+    def _prune(self):
+        """Drop done jobs past retention, at most once per prune_interval"""
+        now = time.time()
+        with self._lock:
+            if now < self._next_prune:
+                return
+            self._next_prune = now + self.prune_interval
+        try:
+            pruned = self.log.prune(now - self.retention)
+            if pruned:
+                print(f"Pruned {pruned} finished replication job(s)")
+        except Exception as e:
+            print(f"Pruning the replication log failed: {e}")
+
+    def _process(self, peer_url, kind, jobs):
+        seqs = [seq for seq, _ in jobs]
+        try:
+            if kind == 'chunk':
+                chunks = []
+                for seq, cid in jobs:
+                    # As stored, so compressed blocks aren't inflated just to be sent
+                    stored = self.storage.read_stored(cid)
+                    if stored is None:
+                        raise FileNotFoundError(f"Chunk {cid} no longer stored locally")
+                    chunks.append((cid, *stored))
+                self._throttle(peer_url, sum(len(d) for _, d, _ in chunks))
+                sent = self.network.send_chunks(peer_url, chunks)
+                print(f"Replicated {sent}/{len(chunks)} chunks to {peer_url}")
+            else:
+                for seq, cid in jobs:
+                    data = self.storage.read_chunk(cid)
+                    if data is None:
+                        raise FileNotFoundError(f"Manifest {cid} no longer stored locally")
+                    self._throttle(peer_url, len(data))
+                    self.network.send_manifest(peer_url, cid, data)
+            self.log.mark_done(seqs)
+        except Exception as e:
+            print(f"Replication of {len(jobs)} {kind} job(s) to {peer_url} failed: {e}")
+            self.log.mark_retry(seqs, e, self.max_attempts, self.base_delay, self.max_delay)
+
+    def _throttle(self, peer_url, size):
+        """Token-bucket style pacing of bytes sent to one peer"""
+        if not self.peer_bytes_per_sec:
+            return
+        now = time.time()
+        start = max(now, self._peer_next_send.get(peer_url, now))
+        self._peer_next_send[peer_url] = start + size / self.peer_bytes_per_sec
+        if start > now:
+            time.sleep(start - now)
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+import zlib
+
+from .compression import is_packed
+from .downloader import SwarmDownloader
+from .utils import cid_hasher, ensure_dir
+
+
+class Scrubber:
+    """Background re-hashing of every stored block.
+
+    Blocks are read straight from disk (not through the chunk cache) and
+    paced to bytes_per_sec, so a pass over a large store doesn't starve
+    downloads of disk bandwidth. A block whose bytes no longer hash to its CID
+    is moved to <storage_path>/quarantine, dropped from the chunk cache, and
+    re-fetched from a peer that holds it (see _candidates). Blocks no peer
+    could supply are retried at the start of each later pass. Quarantined CIDs are also appended to
+    quarantine/journal, so other worker processes can drop them from their
+    own caches (see read_journal).
+    """
+
+    def __init__(self, storage, network, config):
+        self.storage = storage
+        self.network = network
+        settings = config.get('scrub', {})
+        self.enabled = settings.get('enabled', True)
+        self.bytes_per_sec = settings.get('bytes_per_sec', 8 * 1024 * 1024)  # 0 = unlimited
+        self.interval = settings.get('interval', 24 * 3600)  # pause between passes
+        self.read_size = settings.get('read_size', 1024 * 1024)
+        self.quarantine_path = os.path.join(storage.storage_path, 'quarantine')
+        self.journal_path = os.path.join(self.quarantine_path, 'journal')
+        self.downloader = SwarmDownloader(storage, network) if network else None
+
+        self.passes = 0
+        self.pass_started = None
+        self.last_pass_completed = None
+        self.blocks_total = 0
+        self.blocks_scanned = 0
+        self.bytes_scanned = 0
+        self.corrupt = 0
+        self.repaired = 0
+        self.unrepaired = set()
+        self._next_read = 0.0
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        if self._started or not self.enabled:
+            return
+        self._started = True
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def trigger(self):
+        """Start a pass now instead of waiting for the interval"""
+        self._wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'running': self.pass_started is not None,
+                'passes': self.passes,
+                'pass_started': self.pass_started,
+                'last_pass_completed': self.last_pass_completed,
+                'blocks_total': self.blocks_total,
+                'blocks_scanned': self.blocks_scanned,
+                'bytes_scanned': self.bytes_scanned,
+                'progress': self.blocks_scanned / self.blocks_total if self.blocks_total else 1.0,
+                'bytes_per_sec': self.bytes_per_sec,
+                'corrupt': self.corrupt,
+                'repaired': self.repaired,
+                'unrepaired': sorted(self.unrepaired)
+            }
+
+    def _loop(self):
+        # Give startup traffic (peer discovery, pending replication) a head start
+        self._wakeup.wait(60)
+        while True:
+            self._wakeup.clear()
+            try:
+                self.scrub()
+            except Exception as e:
+                print(f"Scrub pass failed: {e}")
+            self._wakeup.wait(self.interval)
+
+    def scrub(self):
+        """Run one full pass; returns the number of corrupt blocks found"""
+        for cid in list(self.unrepaired):
+            self._repair(cid)
+
+        blocks = list(self.storage.iter_blocks())
+        with self._lock:
+            self.pass_started = time.time()
+            self.blocks_total = len(blocks)
+            self.blocks_scanned = 0
+            self.bytes_scanned = 0
+        found = 0
+        try:
+            for cid, path in blocks:
+                if not self._verify(cid, path):
+                    found += 1
+                    self._quarantine(cid, path)
+                    self._repair(cid)
+                with self._lock:
+                    self.blocks_scanned += 1
+        finally:
+            with self._lock:
+                self.passes += 1
+                self.pass_started = None
+                self.last_pass_completed = time.time()
+        if found:
+            print(f"Scrub found {found} corrupt block(s), {len(self.unrepaired)} still unrepaired")
+        return found
+
+    def _verify(self, cid, path):
+        hasher = cid_hasher()
+        inflater = zlib.decompressobj() if is_packed(path) else None
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(self.read_size), b''):
+                    self._pace(len(block))
+                    hasher.update(inflater.decompress(block) if inflater else block)
+                    with self._lock:
+                        self.bytes_scanned += len(block)
+            if inflater:
+                hasher.update(inflater.flush())
+        except FileNotFoundError:
+            return True  # Removed since the pass began
+        except zlib.error:
+            return False
+        return hasher.hexdigest() == cid
+
+    def _pace(self, size):
+        """Sleep as needed to keep reads under bytes_per_sec"""
+        if not self.bytes_per_sec:
+            return
+        now = time.time()
+        start = max(now, self._next_read)
+        self._next_read = start + size / self.bytes_per_sec
+        if start > now:
+            time.sleep(start - now)
+
+    def _quarantine(self, cid, path):
+        ensure_dir(self.quarantine_path)
+        try:
+            os.replace(path, os.path.join(self.quarantine_path, f"{cid}.{int(time.time())}"))
+        except FileNotFoundError:
+            pass
+        self.storage.cache.discard(cid)
+        with open(self.journal_path, 'a') as f:
+            f.write(f"{cid}\n")
+        with self._lock:
+            self.corrupt += 1
+        print(f"Quarantined corrupt block {cid[:8]}")
+
+    def journal_size(self):
+        try:
+            return os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return 0
+
+    def read_journal(self, offset):
+        """CIDs quarantined since byte offset of the journal, and the offset to read from next"""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b'\n') + 1  # A line still being written waits for the next read
+        return data[:end].decode('ascii').split(), offset + end
+
+    def _repair(self, cid):
+        """Fetch a good copy of cid from a peer that holds it; returns True on success"""
+        if self.storage.has_chunk(cid):
+            with self._lock:
+                self.unrepaired.discard(cid)
+            return True
+        data = None
+        if self.network:
+            try:
+                data = self.downloader.fetch_located(cid, self._candidates(cid))
+            except FileNotFoundError:
+                pass
+        if data is None:
+            with self._lock:
+                self.unrepaired.add(cid)
+            return False
+        with self._lock:
+            self.unrepaired.discard(cid)
+            self.repaired += 1
+        print(f"Re-fetched block {cid[:8]} after scrub")
+        return True
+
+    def _candidates(self, cid):
+        """Peers likely to hold cid, to be asked in one parallel round trip.
+
+        These are the DHT providers of the files it belongs to and its
+        placement targets, or every active peer if neither is known.
+        """
+        candidates = []
+        for root_cid in self.storage.index.get_chunk_roots(cid):
+            try:
+                candidates.extend(self.network.dht.find_providers(root_cid))
+            except Exception as e:
+                print(f"DHT lookup for {root_cid[:8]} failed: {e}")
+        if self.storage.replication:
+            candidates.extend(self.storage.replication.chunk_targets(cid))
+        candidates = [url for url in dict.fromkeys(candidates) if url != self.network.api_url]
+        return candidates or self.network.get_active_peers()
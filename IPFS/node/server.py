@@ -0,0 +1,240 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+import requests
+from flask import Response, request
+from werkzeug.serving import make_server
+
+from .api import API
+from .network import Network
+from .peers import PeerRecord
+from .storage import Storage
+from .utils import ensure_dir
+
+# Hop-by-hop headers (RFC 7230 6.1) are never forwarded
+HOP_HEADERS = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+               'te', 'trailer', 'transfer-encoding', 'upgrade', 'host'}
+
+
+class _RequestBody:
+    """File-like view of the incoming body that tells requests its length,
+    so forwarded uploads keep their Content-Length instead of being chunked"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.len = length
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+def build_node(config, migrate=True):
+    """Create the Network, Storage and API of one node process.
+
+    migrate=False leaves bringing an old store up to date to the caller.
+    """
+    network = Network(config)
+    storage = Storage(config, network, migrate=migrate)
+    api = API(config, storage, network)
+    return network, storage, api
+
+
+class WorkerRole:
+    """Splits a multi-process node into one primary and any number of followers.
+
+    Every worker serves the public port, but only one of them (whoever holds
+    the lock file) runs the background services: discovery, heartbeats, DHT
+    republishing, replication and scrubbing, and migrates an older store.
+    It also listens on a loopback
+    port. The other workers serve downloads, chunk and manifest reads straight
+    from the shared blockstore and index, and forward writes and peer traffic
+    to the primary so the node keeps a single membership view and writer.
+    Files a follower registers (after swarming them) are announced to the DHT
+    by the primary, and blocks the primary's scrubber quarantines are dropped
+    from every follower's chunk cache. If the primary dies its lock is
+    released and its replacement takes over.
+    """
+
+    def __init__(self, config, network, storage, api):
+        self.network = network
+        self.storage = storage
+        self.api = api
+        self.lock_path = os.path.join(storage.storage_path, 'primary.lock')
+        self.info_path = os.path.join(storage.storage_path, 'primary.json')
+        self.is_primary = False
+        self._lock_file = None
+        self._primary_url = None
+        self._info_mtime = None
+        self._sync_interval = config.get('peer_check_interval', 5)
+        self._journal_interval = 1
+
+    def start(self):
+        if self._acquire():
+            self.is_primary = True
+            self._start_primary()
+        else:
+            self.api.app.before_request(self._forward)
+            # Only the primary runs the DHT, so it provides (and republishes) for us
+            self.network.announce_file = self._announce_via_primary
+            threading.Thread(target=self._sync_peers, daemon=True).start()
+            threading.Thread(target=self._follow_quarantine, daemon=True).start()
+        print(f"Worker {os.getpid()} serving as {'primary' if self.is_primary else 'follower'}")
+
+    def _acquire(self):
+        import fcntl
+        self._lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def _start_primary(self):
+        control = make_server('127.0.0.1', 0, self.api.app, threaded=True)
+        threading.Thread(target=control.serve_forever, daemon=True).start()
+        temp_path = f"{self.info_path}.{os.getpid()}"
+        with open(temp_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'url': f"http://127.0.0.1:{control.server_port}"}, f)
+        os.replace(temp_path, self.info_path)
+
+        # Only one worker may import old indexes or move blocks around
+        self.storage.migrate()
+        threading.Thread(target=self.network.start, daemon=True).start()
+        self.storage.replication.start()
+        self.storage.scrubber.start()
+
+    def primary_url(self):
+        """Loopback URL of the current primary, re-read when primary.json changes"""
+        try:
+            mtime = os.stat(self.info_path).st_mtime_ns
+            if mtime != self._info_mtime:
+                with open(self.info_path) as f:
+                    self._primary_url = json.load(f)['url']
+                self._info_mtime = mtime
+        except (OSError, ValueError, KeyError):
+            self._primary_url = None
+        return self._primary_url
+
+    @staticmethod
+    def forwards(method, path):
+        """Whether a follower hands this request to the primary"""
+        return method not in ('GET', 'HEAD', 'OPTIONS') or path.startswith(('/api/peers', '/api/scrub'))
+
+    def _forward(self):
+        if not self.forwards(request.method, request.path):
+            return None
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS | {'content-length'}}
+        if request.content_length:
+            body = _RequestBody(request.stream, request.content_length)
+        elif request.headers.get('Transfer-Encoding'):
+            body = iter(lambda: request.stream.read(65536), b'')
+        else:
+            body = None
+        for attempt in range(3):
+            url = self.primary_url()
+            if url is None:
+                time.sleep(0.5)  # A new primary is starting up
+                continue
+            try:
+                upstream = self.network.http.request(
+                    request.method,
+                    f"{url}{request.full_path if request.query_string else request.path}",
+                    data=body,
+                    headers=headers,
+                    stream=True,
+                    allow_redirects=False,
+                    timeout=(3, 300)
+                )
+            except requests.ConnectionError:
+                if body is not None:
+                    break  # The body may be partly consumed, can't retry
+                time.sleep(0.5)
+                continue
+            return Response(
+                upstream.raw.stream(65536, decode_content=False),
+                status=upstream.status_code,
+                headers=[(k, v) for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS]
+            )
+        return Response('{"error": "primary worker unavailable"}', status=503, mimetype='application/json')
+
+    def _announce_via_primary(self, cid):
+        """announce_file for followers: the primary publishes the provider record"""
+        def _send():
+            for attempt in range(3):
+                url = self.primary_url()
+                if url is not None:
+                    try:
+                        self.network.http.post(f"{url}/api/files/{cid}/announce", timeout=5).raise_for_status()
+                        return
+                    except requests.RequestException as e:
+                        print(f"Handing {cid[:8]} to the primary for announcing failed: {e}")
+                time.sleep(0.5)
+        threading.Thread(target=_send, daemon=True).start()
+
+    def _follow_quarantine(self):
+        """Drop blocks the primary's scrubber quarantines from this worker's chunk cache"""
+        scrubber = self.storage.scrubber
+        offset = scrubber.journal_size()
+        while True:
+            time.sleep(self._journal_interval)
+            try:
+                cids, offset = scrubber.read_journal(offset)
+                for cid in cids:
+                    self.storage.cache.discard(cid)
+            except Exception as e:
+                print(f"Reading the quarantine journal failed: {e}")
+
+    def _sync_peers(self):
+        """Mirror the primary's peer table, which downloads and lookups read"""
+        while True:
+            url = self.primary_url()
+            if url:
+                try:
+                    response = self.network.http.get(f"{url}/api/peers", timeout=5)
+                    response.raise_for_status()
+                    current = set()
+                    for peer in response.json():
+                        info = {k: v for k, v in peer['info'].items() if k in PeerRecord.FIELDS}
+                        self.network.peers.upsert(peer['url'], **info)
+                        current.add(peer['url'])
+                    for gone in set(self.network.peers.urls()) - current:
+                        self.network.peers.remove(gone)
+                except Exception as e:
+                    print(f"Peer sync from primary failed: {e}")
+            time.sleep(self._sync_interval)
+
+
+def run_gunicorn(config):
+    """Serve the node with gunicorn: several processes, each with a thread pool"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("serving.server 'gunicorn' needs gunicorn installed (pip install gunicorn)")
+
+    serving = config.get('serving', {})
+    # Workers must agree on who this node is, so pick the identity up front
+    config = {**config, 'node_id': config.get('node_id') or str(uuid.uuid4())}
+    ensure_dir(config['storage_path'])
+
+    class NodeApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{config['host']}:{config['port']}")
+            self.cfg.set('workers', serving.get('workers', 4))
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', serving.get('threads', 8))
+            self.cfg.set('timeout', serving.get('worker_timeout', 120))
+            self.cfg.set('keepalive', serving.get('keepalive', 5))
+
+        def load(self):
+            network, storage, api = build_node(config, migrate=False)
+            # Keep the role (and with it the lock file) alive with the worker
+            self.role = WorkerRole(config, network, storage, api)
+            self.role.start()
+            return api.app
+
+    NodeApplication().run()
@@ -1,138 +1,615 @@
 import os, requests
 import json
-from .utils import generate_cid, ensure_dir
+import threading
+import zlib
+from collections import Counter
+from .utils import generate_cid, cid_hasher, ensure_dir, is_cid, shard_path
 from .chunker import Chunker
+from .index import LocationIndex
+from .replication import ReplicationQueue
+from .cache import ChunkCache
+from .scrub import Scrubber
+from .dag import FileLayout, ManifestBuilder, TREE_PREFIX
+from .compression import BlockCodec, PACKED_SUFFIX, is_packed, unpack
+from .erasure import ParityBuilder, ParityIndex, ReedSolomon, group_shards
+
+# Manifests are written with json.dumps({'chunks': ..., ...}), so this prefix
+# lets the layout migration spot them without parsing every chunk
+MANIFEST_PREFIX = b'{"chunks"'
+
+
+class IntegrityError(ValueError):
+    """Bytes received for a block don't hash to the CID they were sent under"""
 
 
 class Storage:
-    def __init__(self, config, network=None):  # Add network parameter
+    def __init__(self, config, network=None, migrate=True):  # Add network parameter
         self.storage_path = os.path.abspath(config['storage_path'])
         ensure_dir(self.storage_path)
         self.chunk_size = config['chunk_size']
-        self.chunker = Chunker(self.chunk_size)
+        self.chunker = Chunker.from_config(config)
+        # Files with more chunks than this get a Merkle-tree manifest, see dag.py
+        self.manifest_fanout = config.get('manifest', {}).get('fanout', 1024)
+        # Optional per-block compression on disk, see compression.py
+        self.codec = BlockCodec.from_config(config)
+        # Compressed blocks from peers may not inflate past this. Chunks stay
+        # within the chunker's bound, but tree nodes and parity indexes grow
+        # with the file, hence the floor
+        chunk_bound = self.chunker.max_size if self.chunker.mode == 'cdc' else self.chunk_size
+        self.max_block_size = config.get('max_block_size') or max(chunk_bound, 16 * 1024 * 1024)
+        # Reed-Solomon parity for new uploads, so peers can each hold one
+        # shard of a group instead of full copies (see erasure.py)
+        erasure = config.get('erasure', {})
+        self.erasure = ReedSolomon(erasure.get('k', 4), erasure.get('m', 2)) if erasure.get('enabled') else None
         self.network = network  # Store network reference
+        # Chunks and manifests live in <storage_path>/blocks/<cid[:2]>/<cid>
+        self.blocks_path = os.path.join(self.storage_path, 'blocks')
+        ensure_dir(self.blocks_path)
+        # Hot chunks stay in memory for downloads, chunk GETs and replication
+        self.cache = ChunkCache.from_config(config)
+        # Blocks referenced by uploads in progress, kept from delete_unreferenced
+        self._pinned = Counter()
+        self._pin_lock = threading.Lock()
         
-        self.chunk_locations_path = os.path.join(self.storage_path, 'chunk_locations.json')
-        self.file_locations_path = os.path.join(self.storage_path, 'file_locations.json')
-        if not os.path.exists(self.file_locations_path):
-            with open(self.file_locations_path, 'w') as f:
-                json.dump({}, f)
-        if not os.path.exists(self.chunk_locations_path):
-            with open(self.chunk_locations_path, 'w') as f:
-                json.dump({}, f)
-                
+        self.index = LocationIndex(os.path.join(self.storage_path, 'index.db'))
+        # Replication to peers runs in the background, see ReplicationQueue
+        self.replication = ReplicationQueue(config, self, network) if network else None
+        # Periodic re-hashing of stored blocks, see Scrubber
+        self.scrubber = Scrubber(self, network, config)
+
+        # Bring an older store up to date (migrate=False leaves it to the
+        # caller, like migrate_store.py or the primary of a gunicorn node)
+        if migrate:
+            self.migrate()
+
+    def migrate(self, background=True):
+        """Import the JSON-era indexes and move a flat store into the sharded layout.
 
+        The layout move runs on a background thread while we serve, unless
+        background=False; then it returns the number of blocks moved.
+        """
+        self.index.migrate_json(
+            os.path.join(self.storage_path, 'file_locations.json'),
+            os.path.join(self.storage_path, 'chunk_locations.json')
+        )
+        if not background:
+            return self.migrate_flat_layout()
+        if self.needs_layout_migration():
+            threading.Thread(target=self.migrate_flat_layout, daemon=True).start()
 
     def update_file_location(self, cid, peer_url):
         """Update which peers have which files"""
-        with open(self.file_locations_path, 'r') as f:
-            locations = json.load(f)
-            
-        if cid not in locations:
-            locations[cid] = []
-        if peer_url not in locations[cid]:
-            locations[cid].append(peer_url)
-            
-        with open(self.file_locations_path, 'w') as f:
-            json.dump(locations, f)
+        self.index.add_file_location(cid, peer_url)
+
+    def update_file_locations(self, pairs):
+        """Record several (cid, peer_url) pairs in one transaction"""
+        self.index.add_file_locations(pairs)
 
     def get_file_locations(self, cid):
         """Get all peers that have this file"""
-        with open(self.file_locations_path, 'r') as f:
-            locations = json.load(f)
-        return locations.get(cid, [])
+        return self.index.get_file_locations(cid)
+
+    def holds_file(self, root_cid):
+        """True if the whole file was registered here, not just its manifest.
+
+        With a replication factor below the peer count, most nodes receive
+        every manifest but only their share of the chunks.
+        """
+        if self.network is None:
+            return self.has_chunk(root_cid)
+        return self.network.api_url in self.get_file_locations(root_cid)
     
 
     def store_file(self, file_path):
-        """Store a file and automatically propagate to all active peers"""
+        """Store a file and queue it for replication to all active peers"""
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File {file_path} does not exist")
 
-        # Store chunks and get their CIDs
-        chunk_cids = self.chunker.store_chunks(file_path, self.storage_path)
+        upload = self.open_upload(os.path.basename(file_path))
+        try:
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    upload.write(block)
+            return upload.finish()
+        finally:
+            upload.abort()
 
-        # Create and store manifest
-        manifest = {
-            'chunks': chunk_cids,
-            'filename': os.path.basename(file_path)
-        }
-        manifest_data = json.dumps(manifest).encode('utf-8')
-        root_cid = generate_cid(manifest_data)
+    def open_upload(self, filename):
+        """Start a streaming upload; write() data to it, then call finish() (or abort() on failure)"""
+        return ChunkedUpload(self, filename)
 
-        manifest_path = os.path.join(self.storage_path, root_cid)
-        with open(manifest_path, 'wb') as f:
-            f.write(manifest_data)
+    def register_manifest(self, root_cid, manifest_data):
+        """Store a manifest whose blocks are all present and record it locally.
 
-        # Update tracking
-        self._update_chunk_locations(root_cid, chunk_cids)
-        self.update_file_location(root_cid, self.network.api_url)
+        Nothing is propagated to peers.
+        """
+        layout = FileLayout.parse(manifest_data, self.load_node)
+        self.store_chunk(root_cid, manifest_data)
+        with self.index.batch():
+            self.index.add_manifest(root_cid, layout.filename)
+            self._update_chunk_locations(root_cid, layout.blocks())
+            if 'parity' in layout.manifest:
+                self._register_parity(root_cid, layout.manifest['parity'])
+            if self.network:
+                self.update_file_location(root_cid, self.network.api_url)
+        # We can serve it now, let the DHT know
+        if self.network:
+            self.network.announce_file(root_cid)
 
-        # Propagate to all active peers
-        if hasattr(self, 'network') and self.network:
-            # First propagate manifest
-            self.network.propagate_manifest(root_cid, manifest_data)
+    def _register_parity(self, root_cid, index_cid):
+        """Record the shard groups of an erasure-coded file, if we have its parity index"""
+        parity = self.load_parity(index_cid)
+        if parity is None:
+            return
+        blocks = [index_cid]
+        for group in parity.groups:
+            self.index.add_shards(group['parity'][0], group_shards(group, parity.coder.k))
+            blocks.extend(group['parity'])
+        self._update_chunk_locations(root_cid, blocks)
 
-            # Then propagate all chunks
-            for cid in chunk_cids:
-                chunk_path = os.path.join(self.storage_path, cid)
-                with open(chunk_path, 'rb') as f:
-                    chunk_data = f.read()
-                self.network.propagate_chunk(cid, chunk_data)
+    def load_parity(self, index_cid):
+        """ParityIndex stored under index_cid, or None"""
+        data = self.read_chunk(index_cid)
+        return None if data is None else ParityIndex.parse(data)
 
-        return root_cid
+    def store_manifest(self, cid, manifest_data):
+        """Store a manifest received from a peer and add it to the catalogue"""
+        return self.store_manifest_stream(cid, iter([manifest_data]))
+
+    def store_manifest_stream(self, cid, blocks):
+        """Store a root manifest from a request body and add it to the catalogue.
+
+        It is parsed before anything is written; raises ValueError if it
+        isn't a manifest (IntegrityError if it doesn't match cid).
+        """
+        manifest_data = b''.join(blocks)
+        try:
+            layout = FileLayout.parse(manifest_data)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Manifest {cid[:8]} is not valid: {e}") from e
+        if not layout.is_tree and not isinstance(layout.manifest.get('chunks'), list):
+            raise ValueError(f"Manifest {cid[:8]} lists no chunks")
+        stored = self.store_chunk_stream(cid, [manifest_data])
+        self.index.add_manifest(cid, layout.filename)
+        return stored
 
     def retrieve_file(self, root_cid):
         """Retrieve file data from chunks without creating temp file"""
-        manifest_path = os.path.join(self.storage_path, root_cid)
-        if not os.path.exists(manifest_path):
+        layout = self.open_file(root_cid)
+        if layout is None:
             raise FileNotFoundError(f"Manifest {root_cid} not found")
-        
-        with open(manifest_path, 'rb') as f:
-            manifest = json.loads(f.read().decode('utf-8'))
-        
-        # Generator that yields file data by reading chunks sequentially
-        def generate():
-            for cid in manifest['chunks']:
-                chunk_path = os.path.join(self.storage_path, cid)
-                if not os.path.exists(chunk_path):
+        return self.read_chunks(layout.chunk_cids()), layout.filename
+
+    def load_manifest(self, cid):
+        """Return the parsed manifest stored under cid, or None"""
+        manifest_data = self.read_chunk(cid)
+        if manifest_data is None:
+            return None
+        return json.loads(manifest_data.decode('utf-8'))
+
+    def load_node(self, cid):
+        """Parsed Merkle-tree node cid; raises FileNotFoundError if not stored"""
+        manifest = self.load_manifest(cid)
+        if manifest is None:
+            raise FileNotFoundError(f"Manifest node {cid} not found")
+        return manifest
+
+    def open_file(self, root_cid, load_node=None):
+        """FileLayout of a stored root manifest, or None.
+
+        load_node defaults to local tree nodes only. Older flat manifests
+        without 'sizes' get them from the local blocks when all are stored.
+        """
+        manifest = self.load_manifest(root_cid)
+        if manifest is None:
+            return None
+        if 'chunks' in manifest and 'sizes' not in manifest:
+            sizes = [self.chunk_length(cid) for cid in manifest['chunks']]
+            if None not in sizes:
+                manifest['sizes'] = sizes
+        return FileLayout(manifest, load_node or self.load_node)
+
+    def read_chunks(self, cids):
+        """Generator yielding the bytes of each chunk in cids, in order"""
+        for cid in cids:
+            data = self.read_chunk(cid)
+            if data is None:
+                raise FileNotFoundError(f"Chunk {cid} not found")
+            yield data
+
+    def read_extents(self, extents, fetch_missing=None):
+        """Generator yielding the bytes of (cid, offset, length) extents, in order.
+
+        fetch_missing(cid) is called for chunks not stored here; without it
+        they raise FileNotFoundError. length None means the rest of the chunk.
+        """
+        for cid, offset, length in extents:
+            data = self.read_chunk(cid)
+            if data is None:
+                if fetch_missing is None:
                     raise FileNotFoundError(f"Chunk {cid} not found")
-                with open(chunk_path, 'rb') as chunk_file:
-                    yield chunk_file.read()
-        
-        return generate(), manifest['filename']
-    
+                data = fetch_missing(cid)
+            if offset == 0 and length in (None, len(data)):
+                yield data
+            else:
+                yield data[offset:None if length is None else offset + length]
+
     def has_chunk(self, cid):
-        return os.path.exists(os.path.join(self.storage_path, cid))
+        return self.locate_chunk(cid) is not None
+
+    def chunk_path(self, cid):
+        """Where cid is (or will be) stored in the sharded layout"""
+        return shard_path(self.blocks_path, cid)
+
+    def locate_chunk(self, cid):
+        """Return the on-disk path of cid, or None.
+
+        Compressed blocks are at the sharded path plus PACKED_SUFFIX. Blocks
+        not yet moved by migrate_flat_layout are still found at their old
+        flat path. The sharded path is checked again last, in case the
+        migration moved the file between the two checks.
+        """
+        if not is_cid(cid):
+            return None
+        sharded = self.chunk_path(cid)
+        for path in (sharded, sharded + PACKED_SUFFIX, os.path.join(self.storage_path, cid), sharded):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def iter_blocks(self):
+        """(cid, path) of every block in the sharded layout, received replicas included"""
+        for shard in os.scandir(self.blocks_path):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                cid = entry.name[:-len(PACKED_SUFFIX)] if is_packed(entry.name) else entry.name
+                if is_cid(cid):
+                    yield cid, entry.path
+
+    def read_chunk(self, cid):
+        """Return the stored bytes for cid, or None if we don't have it"""
+        data = self.cache.get(cid)
+        if data is not None:
+            return data
+        for _ in range(2):
+            path = self.locate_chunk(cid)
+            if path is None:
+                return None
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if is_packed(path):
+                    data = unpack(data)
+                self.cache.put(cid, data)
+                return data
+            except FileNotFoundError:
+                continue  # Moved by a concurrent migration, look again
+        return None
+
+    def read_stored(self, cid):
+        """(bytes, packed) of cid as kept on disk, or None if we don't have it.
+
+        packed means the bytes are zlib-compressed, so they can go to peers
+        that accept compressed blocks without inflating them first.
+        """
+        path = self.locate_chunk(cid)
+        if path is not None and is_packed(path):
+            try:
+                with open(path, 'rb') as f:
+                    return f.read(), True
+            except FileNotFoundError:
+                return None  # Quarantined by the scrubber
+        data = self.read_chunk(cid)
+        return None if data is None else (data, False)
+
+    def stored_size(self, cid):
+        """(size, packed) of cid as kept on disk, or None; read_stored without the read"""
+        path = self.locate_chunk(cid)
+        if path is None:
+            return None
+        try:
+            return os.path.getsize(path), is_packed(path)
+        except FileNotFoundError:
+            return None  # Quarantined by the scrubber
+
+    def chunk_length(self, cid):
+        """Size of block cid (uncompressed), or None if we don't have it"""
+        path = self.locate_chunk(cid)
+        if path is None:
+            return None
+        if is_packed(path):
+            data = self.read_chunk(cid)
+            return None if data is None else len(data)
+        return os.path.getsize(path)
+
+    def pin_block(self, cid):
+        with self._pin_lock:
+            self._pinned[cid] += 1
+
+    def unpin_blocks(self, cids):
+        with self._pin_lock:
+            for cid in cids:
+                self._pinned[cid] -= 1
+                if self._pinned[cid] <= 0:
+                    del self._pinned[cid]
+
+    def delete_unreferenced(self, cids):
+        """Delete blocks no registered file or upload in progress refers to; returns how many"""
+        deleted = 0
+        with self._pin_lock:
+            for cid in cids:
+                if self._pinned[cid] or self.index.get_chunk_roots(cid):
+                    continue
+                path = self.locate_chunk(cid)
+                if path is None:
+                    continue
+                try:
+                    os.remove(path)
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+                self.cache.discard(cid)
+        return deleted
+
+    def missing_chunks(self, cids):
+        """Return the subset of cids that are not stored locally, in order"""
+        return [cid for cid in cids if not self.has_chunk(cid)]
+
+    def store_chunk(self, cid, data, verified=False):
+        """Store raw bytes under cid, skipping chunks we already have.
+
+        verified=True skips re-hashing, for callers that just computed or
+        checked the CID themselves.
+        """
+        stored = self.store_chunk_stream(cid, iter([data]), verify=not verified)
+        # Freshly written chunks are about to be replicated, keep them handy
+        self.cache.put(cid, data)
+        return stored
+
+    def store_chunk_stream(self, cid, blocks, verify=True, packed=False):
+        """Write an iterable of byte blocks to disk under cid.
+
+        Data goes to a temp file first and is renamed into place, so readers
+        never see a partially written chunk. The data is hashed on the way
+        and IntegrityError raised (nothing stored) if it doesn't match cid.
+        packed=True means the blocks are zlib-compressed (as sent by a peer);
+        they are stored as is and verified by inflating them, and rejected
+        if they inflate past max_block_size. Otherwise, with
+        compression on, the chunk is held in memory and stored compressed if
+        that pays off. Returns False if already stored.
+        """
+        if not is_cid(cid):
+            raise ValueError(f"Invalid CID: {cid!r}")
+        if self.has_chunk(cid):
+            for _ in blocks:
+                pass
+            return False
+
+        chunk_path = self.chunk_path(cid)
+        ensure_dir(os.path.dirname(chunk_path))
+        temp_path = f"{chunk_path}.{os.getpid()}.{threading.get_ident()}.part"
+        final_path = chunk_path + PACKED_SUFFIX if packed else chunk_path
+        hasher = cid_hasher() if verify else None
+        inflater = zlib.decompressobj() if packed and verify else None
+        room = self.max_block_size
+        packer = None if packed else self.codec.packer()
+        held = []
+        try:
+            with open(temp_path, 'wb') as f:
+                for block in blocks:
+                    if inflater:
+                        # One byte past the limit is enough to know it's too big
+                        block_data = inflater.decompress(block, room + 1)
+                        room -= len(block_data)
+                        if room < 0:
+                            raise IntegrityError(
+                                f"Compressed data sent as {cid[:8]} inflates past {self.max_block_size} bytes")
+                        hasher.update(block_data)
+                    elif hasher:
+                        hasher.update(block)
+                    if packer:
+                        packer.update(block)
+                        held.append(block)
+                    else:
+                        f.write(block)
+                if packer:
+                    data = packer.finish()
+                    if data is None:
+                        data = b''.join(held)
+                    else:
+                        final_path = chunk_path + PACKED_SUFFIX
+                    f.write(data)
+            if inflater:
+                tail = inflater.flush()
+                if len(tail) > room:
+                    raise IntegrityError(
+                        f"Compressed data sent as {cid[:8]} inflates past {self.max_block_size} bytes")
+                hasher.update(tail)
+            if hasher and hasher.hexdigest() != cid:
+                raise IntegrityError(f"Data sent as {cid[:8]} hashes to {hasher.hexdigest()[:8]}")
+            os.replace(temp_path, final_path)
+        except zlib.error as e:
+            raise IntegrityError(f"Compressed data sent as {cid[:8]} is corrupt: {e}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return True
 
     def _update_chunk_locations(self, root_cid, chunk_cids):
-        with open(self.chunk_locations_path, 'r') as f:
-            locations = json.load(f)
-            
-        for cid in chunk_cids:
-            if cid not in locations:
-                locations[cid] = []
-            if root_cid not in locations[cid]:
-                locations[cid].append(root_cid)
-                
-        with open(self.chunk_locations_path, 'w') as f:
-            json.dump(locations, f)
+        self.index.add_chunk_locations(root_cid, chunk_cids)
             
     def get_all_files(self):
         """Get all files with their names and CIDs"""
-        files = []
-        for filename in os.listdir(self.storage_path):
-            filepath = os.path.join(self.storage_path, filename)
-            if os.path.isfile(filepath):
-                # Skip chunk files and metadata files
-                if (len(filename) == 64 and  # Assuming CIDs are 64 chars
-                    not filename.endswith('.json')):
-                    try:
-                        with open(filepath, 'rb') as f:
-                            manifest = json.loads(f.read().decode('utf-8'))
-                            files.append({
-                                'cid': filename,
-                                'name': manifest.get('filename', 'unknown')
-                            })
-                    except:
-                        continue
-        return files
\ No newline at end of file
+        return [
+            {'cid': cid, 'name': filename}
+            for cid, filename in self.index.list_manifests()
+        ]
+
+    def needs_layout_migration(self):
+        """True if blocks are still sitting flat in storage_path"""
+        with os.scandir(self.storage_path) as entries:
+            return any(is_cid(entry.name) and entry.is_file() for entry in entries)
+
+    def migrate_flat_layout(self):
+        """Move flat blocks into the sharded layout and catalogue their manifests.
+
+        Safe to run while the node is serving: reads fall back to the flat path
+        until a block has been moved, and each move is a single rename.
+        """
+        moved = 0
+        with os.scandir(self.storage_path) as entries:
+            for entry in entries:
+                if not (is_cid(entry.name) and entry.is_file()):
+                    continue
+                cid = entry.name
+                try:
+                    with open(entry.path, 'rb') as f:
+                        head = f.read(len(MANIFEST_PREFIX))
+                        if head.startswith((MANIFEST_PREFIX, TREE_PREFIX)):
+                            try:
+                                manifest = json.loads((head + f.read()).decode('utf-8'))
+                                # Internal tree nodes carry no filename, only roots are files
+                                if 'chunks' in manifest or 'filename' in manifest:
+                                    self.index.add_manifest(cid, manifest.get('filename', 'unknown'))
+                            except ValueError:
+                                pass  # A chunk that happens to start like a manifest
+
+                    target = self.chunk_path(cid)
+                    ensure_dir(os.path.dirname(target))
+                    if os.path.exists(target):
+                        os.remove(entry.path)
+                    else:
+                        os.replace(entry.path, target)
+                    moved += 1
+                except FileNotFoundError:
+                    continue  # Another migration got to it first
+        if moved:
+            print(f"Migrated {moved} blocks into the sharded layout")
+        return moved
+
+
+class ChunkedUpload:
+    """Writable sink for an incoming file.
+
+    Data is chunked as it arrives, and each chunk is hashed and written to the
+    blockstore once (on the chunker's hash pool), so there is no temp copy of
+    the whole file. The manifest is built as chunks land (see ManifestBuilder),
+    so a large file's chunk list isn't held in memory either. The chunk cache
+    keeps the bytes for the replication workers.
+    """
+
+    def __init__(self, storage, filename):
+        self.storage = storage
+        self.filename = filename
+        self._builder = ManifestBuilder(self._store_node, storage.manifest_fanout)
+        self._parity = None
+        if storage.erasure:
+            self._parity = ParityBuilder(storage.erasure, self._store, self._on_group)
+        self._pipeline = storage.chunker.pipeline(self._store_chunk, self._on_stored)
+        self._sink = storage.chunker.sink(self._pipeline.submit)
+        self._held = {}  # Chunk bytes for the parity builder, until _on_stored
+        self._pinned = []  # Every block this upload refers to
+        self._written = []  # Blocks this upload stored; abort() deletes them again
+        self._jobs = []  # Replication jobs not yet queued, see _replicate
+        self._done = False
+
+    def write(self, data):
+        return self._sink.write(data)
+
+    def seek(self, *args):
+        # Werkzeug rewinds file parts after parsing, nothing to do here
+        return 0
+
+    def _store(self, cid, chunk):
+        # The pipeline (or the parity builder) just hashed it
+        self.storage.pin_block(cid)
+        self._pinned.append(cid)
+        if self.storage.store_chunk(cid, chunk, verified=True):
+            self._written.append(cid)
+
+    def _store_chunk(self, cid, chunk):
+        if self._parity:
+            self._held[cid] = chunk
+        self._store(cid, chunk)
+
+    def _on_stored(self, cid, size):
+        self._builder.add(cid, size)
+        if self._parity:
+            # Replicated with the rest of its group, see _on_group. A chunk
+            # repeated within the pipeline window was popped already
+            data = self._held.pop(cid, None)
+            self._parity.add(cid, data if data is not None else self.storage.read_chunk(cid))
+        else:
+            self._replicate(cid, 'chunk')
+
+    def _on_group(self, group):
+        # Placement spreads the group's shards over distinct peers
+        shards = group_shards(group, self.storage.erasure.k)
+        self.storage.index.add_shards(group['parity'][0], shards)
+        for _, cid in shards:
+            self._replicate(cid, 'chunk')
+
+    def _store_node(self, cid, node):
+        # Internal tree nodes go out with the chunks, ahead of the root, but
+        # to every peer like manifests: they are small and any reader needs them
+        self._store(cid, node)
+        if self.storage.replication:
+            self._replicate(cid, 'chunk', self.storage.network.get_active_peers())
+
+    def _replicate(self, cid, kind, peers=None):
+        # Jobs are queued a flush window at a time, one transaction each
+        replication = self.storage.replication
+        if replication is None:
+            return
+        self._jobs.append((cid, kind, peers))
+        if len(self._jobs) >= replication.flush_window:
+            self._flush()
+
+    def _flush(self):
+        jobs, self._jobs = self._jobs, []
+        if jobs:
+            self.storage.replication.enqueue_many(jobs)
+
+    def finish(self):
+        """Store the last chunk and the manifest, queue replication, and return the root CID.
+
+        Returns as soon as everything is stored locally; peers are updated in
+        the background.
+        """
+        self._sink.close()
+        self._pipeline.close()
+
+        extra = None
+        if self._parity:
+            index_data = self._parity.finish()
+            index_cid = generate_cid(index_data)
+            self._store_node(index_cid, index_data)
+            extra = {'parity': index_cid}
+        manifest_data = self._builder.finish(self.filename, extra)
+        root_cid = generate_cid(manifest_data)
+        self.storage.register_manifest(root_cid, manifest_data)
+
+        self._replicate(root_cid, 'manifest')
+        self._flush()
+        self._done = True
+        self.storage.unpin_blocks(self._pinned)
+        return root_cid
+
+    def abort(self):
+        """Clean up after a failed upload (no-op once finished).
+
+        Replication of its blocks is cancelled and the blocks it wrote are
+        deleted, unless a registered file or another upload uses them.
+        """
+        if self._done:
+            return
+        self._done = True
+        self._pipeline.drain()  # Let in-flight chunks land before removing them
+        self._held.clear()
+        self._jobs.clear()
+        if self.storage.replication:
+            self.storage.replication.cancel(self._written)
+        self.storage.unpin_blocks(self._pinned)
+        deleted = self.storage.delete_unreferenced(self._written)
+        print(f"Upload of {self.filename} aborted, removed {deleted} block(s)")
@@ -0,0 +1,78 @@
+import struct
+
+# Binary multi-chunk frame used by POST /api/chunks/batch.
+# Each frame is: 64-byte ASCII cid | 8-byte big-endian length | raw payload
+CID_LENGTH = 64
+FRAME_HEADER = struct.Struct('>64sQ')
+FRAME_CONTENT_TYPE = 'application/x-dshare-chunks'
+
+# Flagged frames add a flags byte after the cid, for peers that said they
+# accept them: 64-byte cid | 1-byte flags | 8-byte length | payload
+FLAGGED_FRAME_HEADER = struct.Struct('>64sBQ')
+FLAGGED_CONTENT_TYPE = 'application/x-dshare-chunks-flagged'
+FLAG_PACKED = 1  # Payload is zlib-compressed
+
+
+def encode_frame(cid, data, flags=None):
+    """Encode a single chunk as a frame (a flagged frame if flags is given)"""
+    if flags is None:
+        return FRAME_HEADER.pack(cid.encode('ascii'), len(data)) + data
+    return FLAGGED_FRAME_HEADER.pack(cid.encode('ascii'), flags, len(data)) + data
+
+
+def encode_frames(chunks):
+    """Encode an iterable of (cid, data) pairs into one frame body"""
+    return b''.join(encode_frame(cid, data) for cid, data in chunks)
+
+
+def encode_flagged_frames(chunks):
+    """Encode an iterable of (cid, data, flags) into one flagged frame body"""
+    return b''.join(encode_frame(cid, data, flags) for cid, data, flags in chunks)
+
+
+def iter_frames(stream, read_size=65536, flagged=False):
+    """Read frames from a file-like stream.
+
+    Yields (cid, length, reader, flags) where reader(n) returns up to n bytes
+    of the current payload; flags is 0 unless flagged. The payload must be
+    fully consumed before the next frame.
+    """
+    header_format = FLAGGED_FRAME_HEADER if flagged else FRAME_HEADER
+    while True:
+        header = _read_exact(stream, header_format.size)
+        if not header:
+            return
+        if len(header) != header_format.size:
+            raise ValueError("Truncated frame header")
+        if flagged:
+            raw_cid, flags, length = header_format.unpack(header)
+        else:
+            (raw_cid, length), flags = header_format.unpack(header), 0
+        cid = raw_cid.decode('ascii')
+
+        remaining = [length]
+
+        def reader(n=read_size):
+            if remaining[0] <= 0:
+                return b''
+            data = stream.read(min(n, remaining[0]))
+            if not data:
+                raise ValueError(f"Truncated payload for chunk {cid[:8]}")
+            remaining[0] -= len(data)
+            return data
+
+        yield cid, length, reader, flags
+
+        # Drain anything the consumer left unread
+        while reader():
+            pass
+
+
+def _read_exact(stream, size):
+    buf = b''
+    while len(buf) < size:
+        data = stream.read(size - len(buf))
+        if not data:
+            break
+        buf += data
+    return buf
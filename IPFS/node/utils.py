@@ -1,17 +1,31 @@
 import hashlib
 import os
 import json
-from Crypto.Hash import SHA256
 
 def generate_cid(data):
-    """Generate Content ID using SHA-256"""
+    """Generate Content ID using SHA-256.
+
+    hashlib releases the GIL while hashing buffers, so chunks can be hashed
+    on several threads at once (see chunker.HashPipeline).
+    """
     if isinstance(data, str):
         data = data.encode('utf-8')
-    sha256 = SHA256.new()
-    sha256.update(data)
-    return sha256.hexdigest()
+    return hashlib.sha256(data).hexdigest()
+
+def cid_hasher():
+    """Incremental counterpart of generate_cid: update() it, then hexdigest()"""
+    return hashlib.sha256()
+
+def is_cid(value):
+    """Check that value looks like a CID (64 lowercase hex chars)"""
+    return (isinstance(value, str) and len(value) == 64
+            and all(c in '0123456789abcdef' for c in value))
+
+def shard_path(base, cid):
+    """Path of a block in the sharded layout: <base>/<first 2 hex chars>/<cid>"""
+    return os.path.join(base, cid[:2], cid)
 
 def ensure_dir(path):
     """Ensure directory exists"""
     if not os.path.exists(path):
-        os.makedirs(path)
\ No newline at end of file
+        os.makedirs(path, exist_ok=True)
\ No newline at end of file
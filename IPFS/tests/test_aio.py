@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from node.aio import AsyncNetworkCore
+
+
+class KeepAliveServer:
+    """Loopback HTTP/1.1 server answering every request with {} on a kept-alive connection"""
+
+    def __init__(self, core):
+        self.connections = []
+        self.server = core.run(asyncio.start_server(self._serve, '127.0.0.1', 0))
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def _serve(self, reader, writer):
+        self.connections.append(writer)
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            length = [int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                      if line.lower().startswith(b'content-length:')]
+            if length:
+                await reader.readexactly(length[0])
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}')
+            await writer.drain()
+
+
+def test_requests_to_a_peer_reuse_one_connection():
+    core = AsyncNetworkCore(idle_timeout=0.5)
+    server = KeepAliveServer(core)
+    for _ in range(3):
+        assert core.run(core.get_json(f"{server.url}/api/ping")) == {}
+        assert core.run(core.post_json(f"{server.url}/api/peers/heartbeat", {'members': {}})) == {}
+    assert len(server.connections) == 1
+    # Idle connections are closed after idle_timeout
+    time.sleep(1)
+    assert core._idle == {}
+    core.run(core.get_json(f"{server.url}/api/ping"))
+    assert len(server.connections) == 2
+
+
+def test_a_connection_the_peer_dropped_is_replaced():
+    core = AsyncNetworkCore()
+    server = KeepAliveServer(core)
+    core.run(core.get_json(f"{server.url}/api/ping"))
+    # The peer closes the idle connection behind our back
+    core.loop.call_soon_threadsafe(server.connections[0].close)
+    time.sleep(0.1)
+    assert core.run(core.get_json(f"{server.url}/api/ping")) == {}
+    assert len(server.connections) == 2
+
+
+def test_connection_close_from_the_server_is_honoured(cluster):
+    api = cluster.start_node()
+    core = AsyncNetworkCore()
+    # The werkzeug dev server closes every connection
+    assert core.run(core.get_json(f"{api.network.api_url}/api/ping"))['status'] == 'alive'
+    assert core._idle == {}
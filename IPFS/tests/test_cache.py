@@ -0,0 +1,83 @@
+import os
+
+import pytest
+import requests
+
+from node.cache import ARCCache, ChunkCache, LRUCache, NullCache
+
+
+def _block(i, size=100):
+    return f"cid-{i}", bytes([i % 256]) * size
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(300)
+    for i in range(3):
+        cache.put(*_block(i))
+    assert cache.get('cid-0') is not None  # 0 is now the most recent
+    cache.put(*_block(3))
+    assert cache.get('cid-1') is None
+    assert [cache.get(f"cid-{i}") is not None for i in (0, 2, 3)] == [True, True, True]
+    assert cache.size == 300 and cache.evictions == 1
+
+
+def test_oversized_items_and_discards():
+    cache = LRUCache(1000, max_item_bytes=200)
+    cache.put('big', b'x' * 201)
+    assert cache.get('big') is None
+    cache.put(*_block(1))
+    cache.discard('cid-1')
+    assert cache.get('cid-1') is None and cache.size == 0
+    stats = cache.stats()
+    assert stats['hits'] == 0 and stats['misses'] == 2 and stats['entries'] == 0
+
+
+def test_arc_keeps_hot_chunks_through_a_scan():
+    capacity = 1000
+    arc, lru = ARCCache(capacity), LRUCache(capacity)
+    for cache in (arc, lru):
+        for i in range(5):
+            cache.put(*_block(i))
+            cache.get(f"cid-{i}")  # Seen twice: frequent
+        for i in range(100, 130):  # One-off scan three times the capacity
+            cache.put(*_block(i))
+    assert all(arc.get(f"cid-{i}") is not None for i in range(5))
+    assert all(lru.get(f"cid-{i}") is None for i in range(5))
+    assert arc.size <= capacity
+
+
+def test_arc_ghost_hits_adapt_the_target():
+    cache = ARCCache(500)
+    for i in range(5):
+        cache.put(*_block(i))
+    for i in range(3):
+        cache.get(f"cid-{i}")
+    cache.put(*_block(5))
+    cache.put(*_block(6))
+    assert 'cid-3' in cache._b1 and cache.p == 0
+    cache.put(*_block(3))  # Evicted from t1 too early
+    assert cache.p > 0
+    assert 'cid-3' in cache._t2
+    assert cache.size <= 500
+    assert cache._t1_bytes + cache._b1_bytes <= 500
+    assert cache.size + cache._b1_bytes + cache._b2_bytes <= 1000
+
+
+def test_from_config():
+    assert isinstance(ChunkCache.from_config({}), LRUCache)
+    assert isinstance(ChunkCache.from_config({'cache': {'policy': 'arc'}}), ARCCache)
+    assert isinstance(ChunkCache.from_config({'cache': {'capacity_bytes': 0}}), NullCache)
+    with pytest.raises(ValueError):
+        ChunkCache.from_config({'cache': {'policy': 'fifo'}})
+
+
+@pytest.mark.parametrize('policy', ['lru', 'arc'])
+def test_a_node_with_a_small_cache_serves_whole_files(cluster, policy):
+    api = cluster.start_node(cache={'policy': policy, 'capacity_bytes': 5000})
+    data = os.urandom(30_000)
+    cid = requests.post(f"{api.network.api_url}/api/files", files={'file': ('c.bin', data)}).json()['cid']
+    for _ in range(2):
+        assert requests.get(f"{api.network.api_url}/api/files/{cid}").content == data
+    stats = api.storage.cache.stats()
+    assert stats['policy'] == policy
+    assert stats['evictions'] > 0 and stats['bytes'] <= 5000
@@ -0,0 +1,38 @@
+import io
+import random
+
+import pytest
+
+import node.chunker as chunker
+from node.chunker import Chunker
+
+
+def _cuts(c, data):
+    return [len(chunk) for chunk in c.iter_chunks(io.BytesIO(data))]
+
+
+@pytest.mark.parametrize('sizes', [
+    dict(chunk_size=64, min_size=4, avg_size=16, max_size=64),
+    dict(chunk_size=4096),
+    dict(chunk_size=100, min_size=100, avg_size=100, max_size=100),
+])
+def test_vectorized_cuts_match_the_gear_loop(monkeypatch, sizes):
+    if chunker.numpy is None:
+        pytest.skip('numpy not installed')
+    c = Chunker(mode='cdc', **sizes)
+    rng = random.Random(7)
+    data = rng.randbytes(200_000) + b'ab' * 50_000 + rng.randbytes(3)
+    vectorized = _cuts(c, data)
+    monkeypatch.setattr(chunker, '_GEAR_ARRAY', None)
+    assert _cuts(c, data) == vectorized
+    assert sum(vectorized) == len(data)
+
+
+def test_cdc_cuts_survive_an_insert():
+    c = Chunker(4096, mode='cdc')
+    rng = random.Random(3)
+    data = rng.randbytes(200_000)
+    edited = data[:100_000] + b'inserted' + data[100_000:]
+    before = {chunk for chunk in c.iter_chunks(io.BytesIO(data))}
+    after = {chunk for chunk in c.iter_chunks(io.BytesIO(edited))}
+    assert len(before & after) >= len(before) - 2
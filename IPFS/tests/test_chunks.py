@@ -0,0 +1,22 @@
+import requests
+
+
+def test_head_reports_the_length_get_would_send(cluster):
+    api = cluster.start_node(compression={'codec': 'zlib'})
+    data = b'compressible line of text\n' * 2000
+    cid = requests.post(f"{api.network.api_url}/api/files", files={'file': ('t.txt', data)}).json()['cid']
+    chunk = next(api.storage.open_file(cid).chunk_cids())
+    assert api.storage.stored_size(chunk)[1], "expected the chunk to be stored compressed"
+    url = f"{api.network.api_url}/api/chunks/{chunk}"
+
+    for encoding in ('deflate', 'identity'):
+        head = requests.head(url, headers={'Accept-Encoding': encoding})
+        get = requests.get(url, headers={'Accept-Encoding': encoding}, stream=True)
+        body = get.raw.read(decode_content=False)
+        assert head.status_code == get.status_code == 200
+        assert int(head.headers['Content-Length']) == len(body)
+        assert head.headers.get('Content-Encoding') == get.headers.get('Content-Encoding')
+    assert len(body) == len(api.storage.read_chunk(chunk))
+
+    missing = requests.head(f"{api.network.api_url}/api/chunks/{'0' * 64}")
+    assert missing.status_code == 404
@@ -0,0 +1,45 @@
+from node.dht import cid_key, node_key
+from node.utils import generate_cid
+
+
+def _star(cluster, count, k=3):
+    """A hub that knows every node, and leaves that only know the hub"""
+    nodes = [cluster.start_node(node_id=f"node-{i}", dht={'k': k}) for i in range(count)]
+    hub, leaves = nodes[0], nodes[1:]
+    for leaf in leaves:
+        cluster.link(hub, leaf)
+    # Routing tables are seeded from the peer table, as on a node's first lookup
+    for api in nodes:
+        api.network.dht.sync_peers()
+    return hub, leaves
+
+
+def test_a_leaf_finds_another_leafs_file_through_the_hub(cluster):
+    hub, leaves = _star(cluster, 8)
+    provider = leaves[0].network
+    for name in (b'one', b'two', b'three'):
+        cid = generate_cid(name)
+        provider.dht.provide(cid)
+        for api in [hub] + leaves[1:]:
+            assert api.network.dht.find_providers(cid) == [provider.api_url]
+        # The provider doesn't count itself
+        assert provider.dht.find_providers(cid) == []
+
+
+def test_records_land_on_the_nodes_closest_to_the_cid(cluster):
+    hub, leaves = _star(cluster, 8)
+    provider = leaves[-1].network
+    cid = generate_cid(b'closest')
+    provider.dht.provide(cid)
+
+    holders = {api.network.node_id for api in [hub] + leaves if api.network.dht.local_providers(cid)}
+    others = sorted((api.network.node_id for api in [hub] + leaves[:-1]),
+                    key=lambda node_id: node_key(node_id) ^ cid_key(cid))
+    assert provider.node_id in holders
+    assert set(others[:2]) <= holders
+    assert len(holders - {provider.node_id}) <= 3
+
+
+def test_unknown_cid_has_no_providers(cluster):
+    hub, leaves = _star(cluster, 4)
+    assert leaves[0].network.dht.find_providers(generate_cid(b'nobody has this')) == []
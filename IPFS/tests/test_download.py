@@ -0,0 +1,85 @@
+import os
+
+import pytest
+import requests
+
+
+def _drop(api, cid):
+    """Lose cid the way the scrubber does"""
+    api.storage.scrubber._quarantine(cid, api.storage.locate_chunk(cid))
+
+
+def _upload(cluster, count=5, factor=2, size=30_000):
+    nodes = [cluster.start_node(replication={'factor': factor, 'repair_interval': 3600}) for _ in range(count)]
+    cluster.link(*nodes)
+    data = os.urandom(size)
+    cid = requests.post(f"{nodes[0].network.api_url}/api/files", files={'file': ('d.bin', data)}).json()['cid']
+    cluster.wait_replicated(nodes[0])
+    return nodes, cid, data
+
+
+def test_lost_chunk_is_fetched_from_its_holders(cluster):
+    # Six nodes at factor 2: more non-holders than fetch_chunk's attempts
+    nodes, cid, data = _upload(cluster, count=6)
+    origin = nodes[0]
+    chunk = list(origin.storage.open_file(cid).chunk_cids())[3]
+    holders = [api for api in nodes[1:] if api.storage.has_chunk(chunk)]
+    # Every peer that lacks the chunk is cheaper than its holders
+    for api in nodes[1:]:
+        origin.network.peers.touch(api.network.api_url, latency=5.0 if api in holders else 0.001)
+    _drop(origin, chunk)
+
+    response = requests.get(f"{origin.network.api_url}/api/files/{cid}")
+    assert response.status_code == 200
+    assert response.content == data
+    assert origin.storage.has_chunk(chunk)
+
+
+def test_unavailable_chunk_is_never_a_silent_short_200(cluster):
+    nodes, cid, data = _upload(cluster)
+    chunk = list(nodes[0].storage.open_file(cid).chunk_cids())[2]
+    for api in nodes:
+        if api.storage.has_chunk(chunk):
+            _drop(api, chunk)
+
+    # Swarming: the chunk is in the first located batch, so the request fails up front
+    response = requests.get(f"{nodes[1].network.api_url}/api/files/{cid}")
+    assert response.status_code == 500
+    assert 'error' in response.json()
+
+    # Local file: chunks are only looked at as the stream reaches them, so
+    # the response is cut short of its Content-Length
+    with pytest.raises(requests.exceptions.RequestException):
+        requests.get(f"{nodes[0].network.api_url}/api/files/{cid}")
+
+    # A range that avoids the lost chunk is still served
+    response = requests.get(f"{nodes[1].network.api_url}/api/files/{cid}", headers={'Range': 'bytes=0-999'})
+    assert response.status_code == 206
+    assert response.content == data[:1000]
+
+
+def test_swarm_locates_one_batch_at_a_time(cluster):
+    nodes, cid, data = _upload(cluster, count=2, factor=1, size=600_000)
+    reader = cluster.start_node()
+    cluster.link(reader, *nodes)
+    batches = []
+    query = reader.network.query_missing_chunks
+    reader.network.query_missing_chunks = lambda peer, cids: batches.append(len(cids)) or query(peer, cids)
+
+    response = requests.get(f"{reader.network.api_url}/api/files/{cid}")
+    assert response.content == data
+    assert max(batches) <= reader.downloader.locate_batch
+    assert sum(batches) == 600 * len(nodes)
+
+
+def test_local_file_is_not_walked_before_the_first_byte(cluster, monkeypatch):
+    nodes, cid, data = _upload(cluster, count=1, size=600_000)
+    api = nodes[0]
+    calls = []
+    has_chunk = api.storage.has_chunk
+    monkeypatch.setattr(api.storage, 'has_chunk', lambda c: calls.append(c) or has_chunk(c))
+
+    with requests.get(f"{api.network.api_url}/api/files/{cid}", stream=True) as response:
+        first = next(response.iter_content(1000))
+        assert len(calls) < 50
+        assert first + b''.join(response.iter_content(65536)) == data
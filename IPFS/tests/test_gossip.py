@@ -0,0 +1,46 @@
+import time
+
+
+def _wait(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_an_exchange_merges_both_peer_lists(cluster):
+    a, b, c = (cluster.start_node() for _ in range(3))
+    # a only knows b, and b only knows c; b hasn't heard of a yet
+    a.network.peers.upsert(b.network.api_url, id=b.network.node_id, last_seen=time.time())
+    cluster.link(b, c)
+
+    a.network.core.run(a.network.gossip._exchange(b.network.api_url))
+    assert _wait(lambda: c.network.api_url in a.network.peers)
+    assert _wait(lambda: a.network.api_url in b.network.peers)
+
+
+def test_an_exchange_never_adds_ourselves(cluster):
+    a, b = cluster.start_node(), cluster.start_node()
+    cluster.link(a, b)
+    a.network.core.run(a.network.gossip._exchange(b.network.api_url))
+    time.sleep(0.5)
+    assert a.network.api_url not in a.network.peers
+    assert sorted(a.network.peers.urls()) == [b.network.api_url]
+    assert not a.network.gossip._pending
+
+
+def test_heartbeat_tables_merge_newer_counters_only(cluster):
+    a, b, c = (cluster.start_node() for _ in range(3))
+    cluster.link(a, b, c)
+    membership = a.network.membership
+    url = c.network.api_url
+    membership.merge({url: {'id': c.network.node_id, 'incarnation': 1, 'heartbeat': 5}})
+    # An older counter relayed by another peer is ignored
+    membership.merge({url: {'id': c.network.node_id, 'incarnation': 1, 'heartbeat': 3}})
+    assert membership.counters[url] == (1, 5)
+    # A restart (new incarnation) wins even with a lower heartbeat
+    membership.merge({url: {'id': c.network.node_id, 'incarnation': 2, 'heartbeat': 1}})
+    assert membership.counters[url] == (2, 1)
+    assert membership.table()[url]['heartbeat'] == 1
@@ -0,0 +1,30 @@
+import json
+
+import requests
+
+from node.utils import generate_cid
+
+
+def test_invalid_manifest_is_rejected_before_it_is_stored(cluster):
+    api = cluster.start_node()
+    for body in (b'not json at all', b'[1, 2, 3]', json.dumps({'filename': 'x'}).encode(),
+                 json.dumps({'links': ['a'], 'sizes': [1], 'depth': 1}).encode()):
+        cid = generate_cid(body)
+        response = requests.put(f"{api.network.api_url}/api/manifests/{cid}", data=body)
+        assert response.status_code == 400, body
+        assert not api.storage.has_chunk(cid)
+    assert api.storage.get_all_files() == []
+
+
+def test_manifest_under_the_wrong_cid_is_rejected(cluster):
+    api = cluster.start_node()
+    body = json.dumps({'chunks': [], 'sizes': [], 'filename': 'empty'}).encode()
+    wrong = generate_cid(b'something else')
+    response = requests.post(f"{api.network.api_url}/api/manifests",
+                             json={'cid': wrong, 'data': body.decode('latin1')})
+    assert response.status_code == 400
+    assert not api.storage.has_chunk(wrong)
+
+    response = requests.put(f"{api.network.api_url}/api/manifests/{generate_cid(body)}", data=body)
+    assert response.status_code == 200
+    assert [f['name'] for f in api.storage.get_all_files()] == ['empty']
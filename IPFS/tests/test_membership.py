@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from node.membership import Membership, PhiAccrualDetector
+from node.peers import PeerTable
+
+
+class FakeNetwork:
+    api_url = 'http://127.0.0.1:1'
+    node_id = 'self'
+    peer_timeout = 15
+
+    def __init__(self):
+        self.peers = PeerTable(self.peer_timeout)
+        self.core = FakeCore()
+
+
+class FakeCore:
+    delay = 0.05
+
+    async def post_json(self, url, payload, timeout=None):
+        await asyncio.sleep(self.delay)
+        return {'members': {}}
+
+
+def _membership():
+    network = FakeNetwork()
+    return network, Membership(network, {'liveness': {'mode': 'heartbeat'}})
+
+
+def test_peer_heard_from_once_is_evicted_after_the_timeout():
+    network, membership = _membership()
+    url = 'http://127.0.0.1:2'
+    network.peers.upsert(url, id='peer', last_seen=time.time())
+    membership.merge({url: {'id': 'peer', 'incarnation': 1, 'heartbeat': 1}})
+
+    assert membership.sweep() == []
+    network.peers.get(url).last_seen -= network.peer_timeout + 1
+    assert membership.sweep() == [url]
+    assert network.peers.get(url) is None
+
+
+def test_regular_heartbeats_use_the_detector():
+    network, membership = _membership()
+    url = 'http://127.0.0.1:2'
+    network.peers.upsert(url, id='peer', last_seen=time.time())
+    detector = membership.detectors.setdefault(url, PhiAccrualDetector())
+    now = time.time()
+    for i in range(10):
+        detector.heartbeat(now - 9 + i)
+    assert membership.sweep() == []
+    # Far past the timeout phi saturates rather than failing the sweep
+    network.peers.get(url).last_seen = now
+    assert membership._suspected(network.peers.get(url), now + 600)
+
+
+def test_phi_is_finite_and_monotonic():
+    detector = PhiAccrualDetector()
+    for t in range(0, 600, 60):
+        detector.heartbeat(float(t))
+    values = [detector.phi(540.0 + delay) for delay in (0, 30, 60, 120, 3600)]
+    assert values == sorted(values)
+    assert values[0] < 1 and values[-1] > 8
+
+
+def test_heartbeats_keep_a_smoothed_rtt():
+    network, membership = _membership()
+    url = 'http://127.0.0.1:2'
+    network.peers.upsert(url, id='peer', last_seen=time.time())
+
+    asyncio.run(membership._push(url))
+    first = network.peers.get(url).latency
+    assert 0.05 <= first < 0.5
+    # One slow round trip only moves the estimate part of the way
+    network.core.delay = 0.5
+    asyncio.run(membership._push(url))
+    assert first < network.peers.get(url).latency < 0.5
@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+
+from node.peers import PeerTable
+
+
+def _check_indexes(table):
+    records = {record.url: record for record in table.records()}
+    by_ip = {url for urls in table._by_ip.values() for url in urls}
+    assert by_ip == set(records)
+    for node_id, url in table._by_id.items():
+        assert records[url].id == node_id
+    assert set(table.active()) <= set(records)
+
+
+def test_lookups_by_ip_and_id_follow_updates():
+    table = PeerTable(timeout=15)
+    table.upsert('http://10.0.0.1:5000', id='a', last_seen=time.time())
+    table.upsert('http://10.0.0.1:5001', id='b', last_seen=time.time())
+    assert sorted(table.by_ip('10.0.0.1')) == ['http://10.0.0.1:5000', 'http://10.0.0.1:5001']
+
+    # A restarted node comes back with a new id on the same URL
+    table.upsert('http://10.0.0.1:5000', id='c')
+    assert table.by_id('a') is None
+    assert table.by_id('c') == 'http://10.0.0.1:5000'
+
+    table.remove('http://10.0.0.1:5000')
+    assert table.by_ip('10.0.0.1') == ['http://10.0.0.1:5001']
+    assert table.by_id('c') is None
+    table.remove('http://10.0.0.1:5001')
+    assert table.by_ip('10.0.0.1') == []
+    _check_indexes(table)
+
+
+def test_active_set_expires_and_revives():
+    table = PeerTable(timeout=0.3)
+    table.upsert('http://10.0.0.1:5000', last_seen=time.time())
+    table.upsert('http://10.0.0.2:5000', last_seen=time.time() - 1)
+    assert table.active() == ['http://10.0.0.1:5000']
+
+    time.sleep(0.4)
+    assert table.active() == []
+    assert not table.is_active('http://10.0.0.1:5000')
+
+    assert table.touch('http://10.0.0.2:5000')
+    assert table.active() == ['http://10.0.0.2:5000']
+    assert not table.touch('http://10.0.0.3:5000')
+
+
+def test_expiry_heap_stays_bounded():
+    table = PeerTable(timeout=15)
+    for i in range(10):
+        table.upsert(f"http://10.0.0.{i}:5000", last_seen=time.time())
+    for _ in range(1000):
+        table.touch(f"http://10.0.0.{random.randrange(10)}:5000")
+    assert len(table._expiry) <= 2 * len(table._active) + 65
+
+
+def test_concurrent_updates_keep_the_indexes_consistent():
+    table = PeerTable(timeout=15)
+    urls = [f"http://10.0.{i % 4}.{i}:5000" for i in range(50)]
+    errors = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(2000):
+                url = rng.choice(urls)
+                action = rng.random()
+                if action < 0.4:
+                    table.upsert(url, id=f"id-{rng.randrange(60)}", last_seen=time.time())
+                elif action < 0.8:
+                    table.touch(url, latency=rng.random())
+                else:
+                    table.remove(url)
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(2000):
+                for url in table.active():
+                    table.is_active(url)
+                table.to_json()
+                table.membership()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(4)]
+    threads += [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    _check_indexes(table)
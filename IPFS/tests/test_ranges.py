@@ -0,0 +1,79 @@
+import os
+
+import pytest
+import requests
+
+SIZE = 30_000
+
+
+@pytest.fixture
+def file_urls(cluster):
+    """URL of one file on the node that stored it and on a node that swarms it"""
+    nodes = [cluster.start_node(replication={'factor': 1, 'repair_interval': 3600}) for _ in range(3)]
+    cluster.link(*nodes)
+    data = os.urandom(SIZE)
+    cid = requests.post(f"{nodes[0].network.api_url}/api/files", files={'file': ('r.bin', data)}).json()['cid']
+    cluster.wait_replicated(nodes[0])
+    return cid, data, [f"{api.network.api_url}/api/files/{cid}" for api in (nodes[0], nodes[2])]
+
+
+SATISFIABLE = [
+    ('bytes=-500', SIZE - 500, SIZE),        # Suffix range
+    ('bytes=-99999', 0, SIZE),               # Suffix longer than the file
+    ('bytes=29000-', 29000, SIZE),           # Open-ended
+    ('bytes=1500-99999', 1500, SIZE),        # End past the file is clamped
+    ('bytes=999-1000', 999, 1001),           # Across a chunk boundary
+]
+
+
+def test_ranges(file_urls):
+    _, data, urls = file_urls
+    for url in urls:
+        for spec, start, end in SATISFIABLE:
+            response = requests.get(url, headers={'Range': spec})
+            assert response.status_code == 206, spec
+            assert response.headers['Content-Range'] == f"bytes {start}-{end - 1}/{SIZE}"
+            assert response.content == data[start:end]
+        for spec in (f'bytes={SIZE}-', f'bytes={SIZE + 5}-{SIZE + 10}'):
+            response = requests.get(url, headers={'Range': spec})
+            assert response.status_code == 416, spec
+            assert response.headers['Content-Range'] == f"bytes */{SIZE}"
+
+
+def test_if_range(file_urls):
+    cid, data, urls = file_urls
+    for url in urls:
+        response = requests.get(url, headers={'Range': 'bytes=0-99', 'If-Range': f'"{cid}"'})
+        assert response.status_code == 206 and response.content == data[:100]
+        # A stale validator, a weak one or a date gets the whole file
+        for validator in ('"0000"', f'W/"{cid}"', 'Sun, 18 Oct 2026 10:00:00 GMT'):
+            response = requests.get(url, headers={'Range': 'bytes=0-99', 'If-Range': validator})
+            assert response.status_code == 200 and response.content == data
+
+
+def test_multiple_ranges_get_the_whole_file(file_urls):
+    _, data, urls = file_urls
+    response = requests.get(urls[0], headers={'Range': 'bytes=0-9,20-29'})
+    assert response.status_code == 200 and response.content == data
+
+
+IF_NONE_MATCH = [
+    ('"{cid}"', 304),
+    ('"aaaa", "{cid}"', 304),      # A list of tags
+    ('W/"{cid}"', 304),            # Weak comparison
+    ('*', 304),
+    ('"{prefix}"', 200),           # Part of the tag is not a match
+    ('"x{cid}"', 200),
+]
+
+
+def test_if_none_match(file_urls):
+    cid, data, urls = file_urls
+    for url in urls:
+        for header, status in IF_NONE_MATCH:
+            header = header.format(cid=cid, prefix=cid[:16])
+            response = requests.get(url, headers={'If-None-Match': header})
+            assert response.status_code == status, header
+            assert response.headers['ETag'] == f'"{cid}"'
+            if status == 200:
+                assert response.content == data
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+
+def test_nodes_with_only_the_manifest_swarm_the_chunks(cluster):
+    # Factor 2 over 5 nodes: every node gets the manifest, most of them only
+    # some of the chunks, so they must not serve the file as if it were local
+    nodes = [cluster.start_node(replication={'factor': 2, 'repair_interval': 3600}) for _ in range(5)]
+    uploader = nodes[0]
+    cluster.link(*nodes)
+    # The uploader is the most expensive peer for everyone else
+    for api in nodes[1:]:
+        api.network.peers.touch(uploader.network.api_url, latency=5.0)
+
+    data = os.urandom(40_000)
+    response = requests.post(f"{uploader.network.api_url}/api/files", files={'file': ('f.bin', data)})
+    cid = response.json()['cid']
+    cluster.wait_replicated(uploader)
+
+    partial = [api for api in nodes[1:]
+               if api.storage.has_chunk(cid) and api.storage.missing_chunks(api.storage.open_file(cid).chunk_cids())]
+    assert partial, "expected nodes holding the manifest without all chunks"
+    for api in nodes[1:]:
+        response = requests.get(f"{api.network.api_url}/api/files/{cid}")
+        assert response.status_code == 200
+        assert response.content == data
+    for api in partial:
+        assert api.storage.holds_file(cid)
+
+
+def test_range_from_a_node_with_only_the_manifest(cluster):
+    nodes = [cluster.start_node(replication={'factor': 1, 'repair_interval': 3600}) for _ in range(4)]
+    cluster.link(*nodes)
+    data = os.urandom(25_000)
+    cid = requests.post(f"{nodes[0].network.api_url}/api/files", files={'file': ('r.bin', data)}).json()['cid']
+    cluster.wait_replicated(nodes[0])
+
+    response = requests.get(f"{nodes[1].network.api_url}/api/files/{cid}", headers={'Range': 'bytes=1500-20499'})
+    assert response.status_code == 206
+    assert response.content == data[1500:20500]
+    # A range doesn't make the node a holder of the whole file
+    assert not nodes[1].storage.holds_file(cid)
+
+
+def _wait(condition, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def test_late_joiner_gets_manifests_and_its_share_of_chunks(cluster):
+    settings = {'replication': {'factor': 1, 'repair_interval': 0.5}}
+    a, b = cluster.start_node(**settings), cluster.start_node(**settings)
+    cluster.link(a, b)
+    data = os.urandom(12_000)
+    cid = requests.post(f"{a.network.api_url}/api/files", files={'file': ('late.bin', data)}).json()['cid']
+    cluster.wait_replicated(a)
+
+    c = cluster.start_node(**settings)
+    cluster.link(a, b, c)
+    assert _wait(lambda: c.storage.has_chunk(cid))
+    assert _wait(lambda: any(f['cid'] == cid for f in c.storage.get_all_files()))
+    response = requests.get(f"{c.network.api_url}/api/files/{cid}")
+    assert response.content == data
+
+
+def test_done_jobs_are_pruned(cluster):
+    settings = {'replication': {'factor': 0, 'retention': 0, 'prune_interval': 0}}
+    a, b = cluster.start_node(**settings), cluster.start_node(**settings)
+    cluster.link(a, b)
+    requests.post(f"{a.network.api_url}/api/files", files={'file': ('p.bin', os.urandom(5000))})
+    log = a.storage.replication.log
+    # Same durability as the blocks, which aren't fsynced either
+    assert log._conn().execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert _wait(lambda: log.summary().get('done', 0) == 0 and not log.summary().get('pending'))
+    assert log.summary() == {}
+
+
+def test_any_holder_restores_the_factor_after_the_uploader_leaves(cluster):
+    settings = {'replication': {'factor': 2, 'repair_interval': 3600}}
+    nodes = [cluster.start_node(**settings) for _ in range(3)]
+    uploader, holders = nodes[0], nodes[1:]
+    cluster.link(*nodes)
+    data = os.urandom(20_000)
+    cid = requests.post(f"{uploader.network.api_url}/api/files", files={'file': ('h.bin', data)}).json()['cid']
+    cluster.wait_replicated(uploader)
+
+    # The uploader goes away and a new node takes its place; the holders only
+    # received replicas, neither of them registered the file
+    newcomer = cluster.start_node(**settings)
+    for api in holders:
+        assert not api.storage.holds_file(cid)
+        api.network.peers.remove(uploader.network.api_url)
+    cluster.link(newcomer, *holders)
+    for api in holders:
+        api.storage.replication.repair()
+    chunks = list(holders[0].storage.open_file(cid).chunk_cids())
+    assert _wait(lambda: not newcomer.storage.missing_chunks(chunks))
+
+
+def test_an_upload_queues_its_jobs_a_window_at_a_time(cluster):
+    settings = {'replication': {'factor': 1, 'repair_interval': 3600, 'flush_window': 64}}
+    a, b = cluster.start_node(**settings), cluster.start_node(**settings)
+    cluster.link(a, b)
+    log = a.storage.replication.log
+    adders, transactions = set(), []
+    add, batch = log.add, log.batch
+
+    def counting_add(*args):
+        adders.add(threading.current_thread().name)
+        return add(*args)
+
+    @contextmanager
+    def counting_batch():
+        if not getattr(log._local, 'depth', 0):
+            transactions.append(threading.current_thread().name)
+        with batch():
+            yield log
+
+    log.add, log.batch = counting_add, counting_batch
+    requests.post(f"{a.network.api_url}/api/files", files={'file': ('w.bin', os.urandom(150_000))})
+    # 150 chunks plus the manifest: three windows instead of 151 commits
+    assert len([name for name in transactions if name in adders]) == 3
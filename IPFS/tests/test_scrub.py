@@ -0,0 +1,42 @@
+import os
+
+import requests
+
+
+def test_corrupt_block_is_fetched_from_its_holder_only(cluster):
+    nodes = [cluster.start_node(replication={'factor': 1, 'repair_interval': 3600}) for _ in range(4)]
+    uploader = nodes[0]
+    cluster.link(*nodes)
+    data = os.urandom(5000)
+    cid = requests.post(f"{uploader.network.api_url}/api/files", files={'file': ('s.bin', data)}).json()['cid']
+    cluster.wait_replicated(uploader)
+
+    chunk = next(uploader.storage.open_file(cid).chunk_cids())
+    with open(uploader.storage.locate_chunk(chunk), 'r+b') as f:
+        f.write(b'corrupt')
+    uploader.storage.cache.discard(chunk)
+    asked = []
+    query = uploader.network.query_missing_chunks
+    uploader.network.query_missing_chunks = lambda peer_url, cids: asked.append(peer_url) or query(peer_url, cids)
+
+    scrubber = uploader.storage.scrubber
+    assert scrubber.scrub() == 1
+    assert scrubber.stats()['repaired'] == 1 and scrubber.stats()['unrepaired'] == []
+    assert uploader.storage.read_chunk(chunk) == data[:1000]
+    # Only the peer placement put the chunk on was asked, not every peer
+    assert asked == uploader.storage.replication.chunk_targets(chunk)
+    assert len(asked) == 1
+
+
+def test_block_nobody_holds_stays_unrepaired(cluster):
+    a, b = cluster.start_node(), cluster.start_node()
+    upload = a.storage.open_upload('alone.bin')
+    upload.write(os.urandom(1000))
+    chunk = next(a.storage.open_file(upload.finish()).chunk_cids())
+    cluster.link(a, b)  # b never got a copy
+    with open(a.storage.locate_chunk(chunk), 'r+b') as f:
+        f.write(b'corrupt')
+
+    scrubber = a.storage.scrubber
+    assert scrubber.scrub() == 1
+    assert scrubber.stats()['unrepaired'] == [chunk]
@@ -0,0 +1,88 @@
+import fcntl
+import json
+import os
+import time
+
+from node.server import WorkerRole, build_node
+
+
+def _follower(primary):
+    """A follower worker sharing primary's storage, as gunicorn would start it"""
+    network, storage, api = build_node(dict(primary.config), migrate=False)
+    network.api_url = primary.network.api_url
+    with open(os.path.join(storage.storage_path, 'primary.json'), 'w') as f:
+        json.dump({'pid': os.getpid(), 'url': primary.network.api_url}, f)
+    role = WorkerRole(primary.config, network, storage, api)
+    role._journal_interval = 0.1
+    role.start()
+    assert not role.is_primary
+    return storage
+
+
+def _wait(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def _hold_primary_lock(storage_path):
+    lock = open(os.path.join(storage_path, 'primary.lock'), 'a')
+    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return lock
+
+
+def test_files_registered_by_a_follower_are_provided_by_the_primary(cluster):
+    primary = cluster.start_node()
+    lock = _hold_primary_lock(primary.storage.storage_path)
+    follower = _follower(primary)
+
+    upload = follower.open_upload('f.bin')
+    upload.write(os.urandom(3000))
+    cid = upload.finish()
+    assert _wait(lambda: cid in primary.network.dht.provided)
+    lock.close()
+
+
+def test_quarantine_reaches_follower_caches(cluster):
+    primary = cluster.start_node(scrub={'enabled': True, 'bytes_per_sec': 0})
+    lock = _hold_primary_lock(primary.storage.storage_path)
+    follower = _follower(primary)
+
+    upload = primary.storage.open_upload('q.bin')
+    upload.write(os.urandom(1000))
+    chunk = next(primary.storage.open_file(upload.finish()).chunk_cids())
+    path = primary.storage.locate_chunk(chunk)
+    with open(path, 'r+b') as f:
+        f.write(b'corrupt')
+    assert follower.read_chunk(chunk) is not None  # Now cached by the follower
+
+    primary.storage.scrubber.scrub()
+    assert primary.storage.scrubber.stats()['corrupt'] == 1
+    assert _wait(lambda: follower.cache.get(chunk) is None)
+    assert follower.read_chunk(chunk) is None
+    lock.close()
+
+
+def test_only_the_primary_imports_old_indexes(cluster, monkeypatch):
+    node = cluster.start_node()
+    storage_path = node.storage.storage_path
+    old_index = os.path.join(storage_path, 'file_locations.json')
+    with open(old_index, 'w') as f:
+        json.dump({'a' * 64: ['http://127.0.0.1:1']}, f)
+
+    lock = _hold_primary_lock(storage_path)
+    _follower(node)
+    assert os.path.exists(old_index)
+    lock.close()
+
+    network, storage, api = build_node(dict(node.config), migrate=False)
+    assert os.path.exists(old_index)
+    monkeypatch.setattr(network, 'start', lambda: None)
+    role = WorkerRole(node.config, network, storage, api)
+    role.start()
+    assert role.is_primary
+    assert not os.path.exists(old_index)
+    assert storage.get_file_locations('a' * 64) == ['http://127.0.0.1:1']
@@ -0,0 +1,63 @@
+import json
+import os
+import sys
+import threading
+import zlib
+
+import pytest
+import requests
+
+import migrate_store
+from node.storage import IntegrityError, Storage
+from node.transfer import FLAG_PACKED, FLAGGED_CONTENT_TYPE, encode_flagged_frames
+from node.utils import generate_cid
+
+
+def test_migrate_store_moves_each_block_once(tmp_path, monkeypatch, capsys):
+    storage_path = tmp_path / 'store'
+    storage_path.mkdir()
+    chunk = os.urandom(500)
+    manifest = json.dumps({'chunks': [generate_cid(chunk)], 'sizes': [500], 'filename': 'old.bin'}).encode()
+    for data in (chunk, manifest):
+        (storage_path / generate_cid(data)).write_bytes(data)
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps({'storage_path': str(storage_path), 'chunk_size': 1000}))
+
+    threads = threading.active_count()
+    monkeypatch.setattr(sys, 'argv', ['migrate_store.py', '--config', str(config_path)])
+    migrate_store.main()
+    assert threading.active_count() == threads
+    assert 'Done, 2 blocks moved, 1 files catalogued' in capsys.readouterr().out
+    for data in (chunk, manifest):
+        cid = generate_cid(data)
+        assert not (storage_path / cid).exists()
+        assert (storage_path / 'blocks' / cid[:2] / cid).read_bytes() == data
+
+
+def test_packed_blocks_may_not_inflate_past_the_limit(tmp_path):
+    storage = Storage({'storage_path': str(tmp_path), 'chunk_size': 1000, 'max_block_size': 4096})
+    fine = os.urandom(100) * 40
+    cid = generate_cid(fine)
+    packed = zlib.compress(fine)
+    assert storage.store_chunk_stream(cid, [packed[:50], packed[50:]], packed=True)
+    assert storage.read_chunk(cid) == fine
+
+    # A tiny body that would inflate to 64 MB is stopped at the limit
+    bomb = bytes(64 * 1024 * 1024)
+    with pytest.raises(IntegrityError, match='inflates past 4096'):
+        storage.store_chunk_stream(generate_cid(bomb), [zlib.compress(bomb, 9)], packed=True)
+    assert not storage.has_chunk(generate_cid(bomb))
+
+
+def test_batch_endpoint_rejects_a_packed_frame_that_inflates_too_far(cluster):
+    api = cluster.start_node(max_block_size=4096)
+    fine, big = os.urandom(1000), bytes(100_000)
+    body = encode_flagged_frames([
+        (generate_cid(big), zlib.compress(big), FLAG_PACKED),
+        (generate_cid(fine), zlib.compress(fine), FLAG_PACKED),
+    ])
+    response = requests.post(f"{api.network.api_url}/api/chunks/batch", data=body,
+                             headers={'Content-Type': FLAGGED_CONTENT_TYPE})
+    assert response.json() == {'status': 'ok', 'stored': 1, 'rejected': 1}
+    assert api.storage.read_chunk(generate_cid(fine)) == fine
+    assert not api.storage.has_chunk(generate_cid(big))
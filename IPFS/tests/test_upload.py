@@ -0,0 +1,56 @@
+import os
+
+import requests
+
+
+def _blocks(api):
+    return sorted(name for _, _, names in os.walk(api.storage.blocks_path) for name in names)
+
+
+def test_only_the_file_field_is_chunked(cluster):
+    api = cluster.start_node()
+    data = os.urandom(5000)
+    response = requests.post(f"{api.network.api_url}/api/files", files=[
+        ('notes', ('notes.txt', os.urandom(3000))),
+        ('file', ('f.bin', data)),
+    ])
+    assert response.status_code == 200
+    cid = response.json()['cid']
+    assert _blocks(api) == sorted([cid, *api.storage.open_file(cid).chunk_cids()])
+
+    response = requests.post(f"{api.network.api_url}/api/files", files={'other': ('o.bin', data)})
+    assert response.status_code == 400
+
+
+def test_broken_upload_leaves_no_chunks(cluster):
+    api = cluster.start_node()
+    body = (b'--xyz\r\nContent-Disposition: form-data; name="file"; filename="f.bin"\r\n'
+            b'Content-Type: application/octet-stream\r\n\r\n' + os.urandom(20_000))
+    response = requests.post(f"{api.network.api_url}/api/files", data=body,
+                             headers={'Content-Type': 'multipart/form-data; boundary=xyz'})
+    assert response.status_code >= 400
+    assert _blocks(api) == []
+
+
+def test_abort_keeps_blocks_other_uploads_use(cluster):
+    api = cluster.start_node()
+    shared = os.urandom(1000)  # One chunk at chunk_size 1000
+    first = api.storage.open_upload('a')
+    first.write(shared + os.urandom(1000))
+    second = api.storage.open_upload('b')
+    second.write(shared + os.urandom(1000))
+    first._sink.close()
+    first.abort()
+    cid = second.finish()
+    assert all(api.storage.has_chunk(c) for c in api.storage.open_file(cid).chunk_cids())
+    assert len(_blocks(api)) == 3  # shared chunk, second's own chunk, its manifest
+
+
+def test_parity_uses_the_chunks_in_memory(cluster, monkeypatch):
+    api = cluster.start_node(erasure={'enabled': True, 'k': 2, 'm': 1})
+    monkeypatch.setattr(api.storage, 'read_chunk', lambda cid: (_ for _ in ()).throw(AssertionError(cid)))
+    upload = api.storage.open_upload('p')
+    upload.write(os.urandom(4500))
+    upload._sink.close()
+    upload._pipeline.close()
+    assert len(upload._parity.groups) == 2